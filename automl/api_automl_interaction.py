@@ -1,39 +1,338 @@
 import os
-import matplotlib
+import atexit
+import importlib
+import multiprocessing
+import re
+import shutil
+import tempfile
 import threading
-from flask import Flask, request, jsonify, send_from_directory, url_for
-from utils import preprocess_data, generate_ml_pipeline
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context, url_for
+from utils import workspaces, model_store
+from utils.scheduler import CoreScheduler, available_cores
+from utils.jobs import JobManager, RUNNING, FINISHED, FAILED, CANCELLED, TIMED_OUT
+from utils.events import format_sse
+from utils.engine import ProcessEngine, PRELOAD_MODULES, STOP_GRACE_SECONDS
+from utils.preprocessed_cache import PreprocessedCache, compute_file_hash
+from utils.search_cache import SearchResultCache
+from utils.artifacts import ArtifactRenderer, READY, FAILED as RENDER_FAILED, job_directory
+from utils.tpot_checkpoints import is_warm_start, search_checkpoint_path
 import json
 
 app = Flask(__name__)
 
-# Ensure the uploads directory exists
-UPLOAD_FOLDER = './data/uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Ensure the workspaces directory exists
+os.makedirs(workspaces.WORKSPACES_FOLDER, exist_ok=True)
 
-# Lock for controlling access to shared resources
-lock = threading.Lock()
+# Bounded pool running the Hyperopt and TPOT searches in the background. With AUTOML_JOB_TIME_LIMIT
+# (seconds), a job still running that long after it started is stopped with its best-so-far result.
+AUTOML_WORKERS = int(os.environ.get('AUTOML_WORKERS', 2))
+AUTOML_JOB_TIME_LIMIT = float(os.environ['AUTOML_JOB_TIME_LIMIT']) if os.environ.get('AUTOML_JOB_TIME_LIMIT') else None
 
-# Set the Matplotlib backend
-matplotlib.use('Agg')  # Use 'Agg' for non-interactive backend
+# Core budget of the searches (AUTOML_CORES, default is all the CPUs of the process): every job runs on
+# AUTOML_JOB_CORES cores of its own (default is an equal share per worker, or the 'cores' of the
+# request) and waits in the queue while they are not free, so concurrent searches do not oversubscribe
+AUTOML_CORES = available_cores()[:int(os.environ['AUTOML_CORES'])] if os.environ.get('AUTOML_CORES') else available_cores()
+AUTOML_JOB_CORES = int(os.environ.get('AUTOML_JOB_CORES', 0)) or max(1, len(AUTOML_CORES) // AUTOML_WORKERS)
+job_manager = JobManager(max_workers=AUTOML_WORKERS, time_limit=AUTOML_JOB_TIME_LIMIT,
+                         scheduler=CoreScheduler(AUTOML_CORES), cores_per_job=AUTOML_JOB_CORES)
 
-def read_working_request():
+# The service starts without the data and AutoML libraries: they are imported by the code paths using
+# them (the AutoML engines only by the worker processes). With AUTOML_PRELOAD (the default), they are
+# preloaded in the background after startup so the first requests do not wait for them.
+AUTOML_PRELOAD = os.environ.get('AUTOML_PRELOAD', '1') != '0'
+DEFERRED_MODULES = ('pandas', 'joblib', 'utils.dtype_planner', 'utils.preprocess_data',
+                    'matplotlib.backends.backend_agg', 'seaborn', 'graphviz')
+
+def preload_deferred_modules():
+    for module in DEFERRED_MODULES:
+        importlib.import_module(module)
+
+# Worker processes executing the searches, one per concurrent job
+engine = ProcessEngine(
+    max_workers=AUTOML_WORKERS,
+    preload=PRELOAD_MODULES if AUTOML_PRELOAD else (),
+    max_jobs_per_worker=int(os.environ.get('AUTOML_JOBS_PER_WORKER', 5)),
+    process_memory_limit_mb=int(os.environ['AUTOML_MEMORY_LIMIT_MB']) if os.environ.get('AUTOML_MEMORY_LIMIT_MB') else None,
+    cpu_time_limit=int(os.environ['AUTOML_CPU_TIME_LIMIT']) if os.environ.get('AUTOML_CPU_TIME_LIMIT') else None,
+    stop_grace_seconds=float(os.environ.get('AUTOML_STOP_GRACE_SECONDS', STOP_GRACE_SECONDS))
+)
+# Run as a script, the module is also executed by the watcher process of the debug reloader, which only
+# restarts the server process (the one with WERKZEUG_RUN_MAIN set) and never runs a job
+RELOADER_WATCHER = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+# Neither when imported by a spawned worker
+if multiprocessing.current_process().name == 'MainProcess' and not RELOADER_WATCHER:
+    engine.start()
+    atexit.register(engine.shutdown)
+    if AUTOML_PRELOAD:
+        threading.Thread(target=preload_deferred_modules, name='automl-preload', daemon=True).start()
+
+# Preprocessed datasets, reused when the same file is uploaded again
+preprocessed_cache = PreprocessedCache(max_bytes=int(os.environ.get('PREPROCESSED_CACHE_MAX_MB', 1024)) * 1024 * 1024)
+
+# Uploads larger than this are preprocessed out of core, PREPROCESS_CHUNK_ROWS rows at a time
+PREPROCESS_CHUNKED_BYTES = int(os.environ.get('PREPROCESS_CHUNKED_MB', 256)) * 1024 * 1024
+PREPROCESS_CHUNK_ROWS = int(os.environ.get('PREPROCESS_CHUNK_ROWS', 100000))
+
+# Results of finished searches, returned at once when the same search is requested again
+search_cache = SearchResultCache()
+
+# Plots and dataflows of finished searches, rendered in the background after their result is returned
+renderer = ArtifactRenderer(max_workers=int(os.environ.get('AUTOML_RENDER_WORKERS', 1)))
+
+# Models loaded by /predict, kept in memory for repeated scoring calls
+model_cache = model_store.ModelCache(max_bytes=int(os.environ.get('MODEL_CACHE_MAX_MB', 512)) * 1024 * 1024)
+
+# Rows of a /predict batch read, transformed and scored at a time
+PREDICT_CHUNK_ROWS = int(os.environ.get('PREDICT_CHUNK_ROWS', 10000))
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def run_hyperopt(config, progress=None, job_id=None):
+    """
+    Runs the Hyperopt search of a job and returns its result files and values. Its image and dataflow
+    are rendered in the background and exist once the render state of the job is 'ready'.
+    """
+    model_path = model_store.model_path(config['results_dir'], job_id)
+    config = dict(config, model_path=model_path, job_id=job_id)
+    artifacts, metric_name, metric_value, results_json = engine.run('utils.generate_ml_pipeline', 'hyperopt_pipeline_generator', config, progress=progress)
+    renderer.submit(job_id, artifacts)
+    return {
+        "results": results_json,
+        "image": artifacts['image'],
+        "graph": artifacts['graph'],
+        "plot_data": artifacts.get('plot_data'),
+        "model": model_path
+    }
+
+def run_tpot(config, progress=None, job_id=None):
+    """
+    Runs the TPOT search of a job and returns its result files and values (image and dataflow rendered
+    in the background).
     """
-    Reads and returns the configuration data from the 'working_request.json' file located in the preprocessed data directory.
+    model_path = model_store.model_path(config['results_dir'], job_id)
+    config = dict(config, model_path=model_path, job_id=job_id)
+    artifacts, metric_name, metric_value, multi_fidelity, checkpoint, search = engine.run('utils.generate_ml_pipeline', 'tpot_pipeline_generator', config, progress=progress)
+    renderer.submit(job_id, artifacts)
+    return {
+        "image": artifacts['image'],
+        "graph": artifacts['graph'],
+        "plot_data": artifacts.get('plot_data'),
+        "metric_name": metric_name,
+        "metric_value": metric_value,
+        "multi_fidelity": multi_fidelity,
+        "checkpoint": checkpoint,
+        "search": search,
+        "model": model_path
+    }
+
+def get_workspace_id():
+    """
+    Returns the workspace id given in the JSON body, form data or query string of the request.
+    """
+    data = request.get_json(silent=True) or {}
+    return data.get('workspace_id') or request.form.get('workspace_id') or request.args.get('workspace_id')
+
+def request_flag(name):
+    """
+    Checks a boolean flag of the request (JSON body, form data or query string).
+    """
+    data = request.get_json(silent=True) or {}
+    value = data.get(name, request.form.get(name, request.args.get(name)))
+    return value is True or str(value).lower() in ('1', 'true', 'yes')
+
+def requested_cores():
+    """
+    Returns the number of cores asked for in the request ('cores'), or None.
+
+    Raises:
+    - ValueError: If it is not a positive integer.
+    """
+    data = request.get_json(silent=True) or {}
+    value = data.get('cores', request.form.get('cores', request.args.get('cores')))
+    if value is None or value == '':
+        return None
+    if not str(value).isdigit() or int(value) < 1:
+        raise ValueError(f"'cores' must be a positive integer, got {value}.")
+    return int(value)
+
+def is_forced():
+    """
+    Checks the 'force' flag of the request.
+    """
+    return request_flag('force')
+
+def cache_result(run, cache_key):
     """
-    working_request = './data/preprocessed/working_request.json'
-    if not os.path.exists(working_request):
-        raise FileNotFoundError(f"{working_request} does not exist.")
-    with open(working_request, 'r') as f:
-        config = json.load(f)
-    return config
+    Wraps the run function of a search so that its result is cached once the search finishes and its
+    artifacts are rendered. The best-so-far results of stopped searches are not cached.
+    """
+    def run_search(config, progress=None, job_id=None):
+        result = run(config, progress=progress, job_id=job_id)
+        if getattr(progress, 'stop_reason', None):
+            return result
+
+        def store(state):
+            if state == READY:
+                search_cache.store(cache_key, result)
+
+        renderer.add_done_callback(job_id, store)
+        return result
+    return run_search
+
+def link_file(source, destination):
+    """
+    Hard-links source to destination (copies it across file systems), returns destination.
+    """
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+    return destination
+
+def reuse_result(kind, result, config, progress=None, job_id=None):
+    """
+    Job function of a cached search: links the cached model and artifacts into the workspace, so the
+    result only refers to files of the workspace, and returns the cached result.
+    """
+    result = dict(result, cached=True)
+    output_dir = job_directory(os.path.join(config['results_dir'], f'{kind}-results'), job_id)
+    for name in ('image', 'graph', 'plot_data'):
+        if result.get(name):
+            result[name] = link_file(result[name], os.path.join(output_dir, os.path.basename(result[name])))
+    if result.get('model'):
+        result['model'] = link_file(result['model'], model_store.model_path(config['results_dir'], job_id))
+    return result
+
+def artifact_status(job_id, result):
+    """
+    Returns the render state of the image and dataflow of a finished job.
+    """
+    status = renderer.status(job_id)
+    if status is None:  # cached results, and jobs rendered too long ago to be tracked
+        missing = [name for name in ('image', 'graph', 'plot_data') if result.get(name) and not os.path.exists(result[name])]
+        status = {'state': RENDER_FAILED, 'error': f"Missing {', '.join(missing)}."} if missing else {'state': READY, 'error': None}
+    return status
+
+def with_file_urls(result):
+    """
+    Returns a copy of a job result with the URLs of its image, dataflow and plot data files.
+    """
+    result = dict(result)
+    for name in ('image', 'graph', 'plot_data'):
+        if result.get(name):
+            result[name] = url_for('download_file', filename=result[name], _external=True)
+    return result
+
+def submit_search(kind, run):
+    """
+    Validates the working request of the workspace and submits its search as a background job. A search
+    already run on the same data with the same configuration is answered from the cache unless forced.
+    """
+    workspace_id = get_workspace_id()
+    if not workspaces.workspace_exists(workspace_id):
+        return jsonify({"error": "Missing or unknown workspace_id."}), 400
+    try:
+        cores = requested_cores()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        config = workspaces.read_working_request(workspace_id)
+
+        intent = config.get('intent')
+
+        if intent not in ['classification', 'regression']:
+            return jsonify({"error": "Invalid intent. Please use 'classification' or 'regression'."}), 400
+
+        # A warm-started TPOT search continues from the checkpoint of its dataset, its result depends
+        # on that checkpoint and is neither looked up in nor added to the search cache
+        if kind == 'tpot' and request_flag('warm_start'):
+            config['warmStart'] = True
+        warm_start = kind == 'tpot' and is_warm_start(config)
+
+        dataset_hash = config.get('dataset_hash') or compute_file_hash(config['dataset'])
+        cache_key = search_cache.key(kind, dataset_hash, config)
+        cached = None if is_forced() or warm_start else search_cache.get(cache_key)
+        if cached is not None:
+            job = job_manager.run_inline(kind, reuse_result, kind, cached, config)
+            if job['status'] == FINISHED:
+                return jsonify({
+                    "workspace_id": workspace_id,
+                    "job_id": job['id'],
+                    "status": job['status'],
+                    "status_url": url_for('job_route', job_id=job['id'], _external=True),
+                    "cached": True,
+                    "result": with_file_urls(job['result'])
+                }), 200
+
+        job = job_manager.submit(kind, run if warm_start else cache_result(run, cache_key), config, cores=cores)
+        return jsonify({
+            "workspace_id": workspace_id,
+            "job_id": job['id'],
+            "status": job['status'],
+            "status_url": url_for('job_route', job_id=job['id'], _external=True),
+            "cached": False,
+            "warm_start": warm_start,
+            "slots": job['slots']
+        }), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def read_batches(stream, ndjson, encoder):
+    """
+    Reads a CSV or NDJSON batch in chunks of PREDICT_CHUNK_ROWS rows, categorical columns as strings.
+    """
+    import pandas as pd
+
+    dtype = {column: str for column in encoder.categories} if encoder is not None else None
+    if ndjson:
+        return pd.read_json(stream, lines=True, dtype=dtype, chunksize=PREDICT_CHUNK_ROWS)
+    return pd.read_csv(stream, dtype=dtype, chunksize=PREDICT_CHUNK_ROWS)
+
+def predict_chunk(model, chunk):
+    """
+    Encodes a chunk of raw rows with the encoders of the training data and returns the decoded predictions.
+    """
+    encoder = model['encoder']
+    pipeline = model['pipeline']
+    if encoder is not None:
+        missing = [column for column in encoder.feature_columns if column not in chunk]
+        if missing:
+            raise ValueError(f"missing columns {missing}")
+        chunk = encoder.transform(chunk)
+    features = chunk.drop(columns=['target'], errors='ignore')
+    # Pipelines fitted on a DataFrame (TPOT) check the feature names, the others were fitted on arrays
+    predictions = pipeline.predict(features if hasattr(pipeline, 'feature_names_in_') else features.to_numpy())
+    return encoder.decode_target(predictions) if encoder is not None else predictions
+
+def format_predictions(predictions, ndjson):
+    import pandas as pd
+
+    if ndjson:
+        return ''.join(json.dumps({"prediction": value}) + '\n' for value in predictions.tolist())
+    return pd.Series(predictions).to_csv(header=False, index=False)
+
+def format_prediction_error(message, ndjson):
+    if ndjson:
+        return json.dumps({"error": message}) + '\n'
+    return f'"error: {message.replace(chr(34), chr(39))}"\n'
 
 @app.route('/', methods=['GET'])
 def base_route():
     return jsonify({
             "/send_and_preprocess": "POST - Upload a file and preprocess the data.",
-            "/hyperopt": "GET - Run the Hyperopt pipeline and get results.",
-            "/tpot": "GET - Run the TPOT pipeline and get results.",
+            "/hyperopt": "POST - Submit a Hyperopt pipeline search, returns a job id.",
+            "/tpot": "POST - Submit a TPOT pipeline search, returns a job id.",
+            "/jobs": "GET - Job queue metrics.",
+            "/jobs/<job_id>": "GET - Status, progress and results of a job.",
+            "/jobs/<job_id>/events": "GET - Live events of a job (state, progress, trials) as Server-Sent Events.",
+            "/jobs/<job_id>/cancel": "POST - Cancel a queued or running job, a running search ends with its best-so-far result.",
+            "/jobs/<job_id>/resume": "POST - Resume an interrupted TPOT search from its checkpoint.",
+            "/cache": "GET - Preprocessed-data cache statistics.",
+            "/export_preprocessed": "GET - Download the preprocessed dataset of a workspace as CSV.",
+            "/predict": "POST - Score a CSV or NDJSON batch with the model of a finished job, streams the predictions.",
             "/<path:filename>": "GET - Download a file from the server."
     })
 
@@ -47,11 +346,17 @@ def preprocess():
         return jsonify({"message": "No file selected"}), 400
     
     if file:
-        data_file_path = os.path.join(UPLOAD_FOLDER, file.filename)
+        # Every upload is processed in its own workspace, uploads of different users run in parallel
+        workspace_id = workspaces.create_workspace()
+        upload_folder = workspaces.workspace_path(workspace_id, 'uploads')
+        preprocessed_folder = workspaces.workspace_path(workspace_id, 'preprocessed')
+        results_folder = workspaces.workspace_path(workspace_id, 'results')
+
+        data_file_path = os.path.join(upload_folder, os.path.basename(file.filename))
         file_name = os.path.basename(file.filename).rsplit('.', 1)[0]
 
         workflow_request_filename = f'{file_name}_workflow_request.json'
-        workflow_request_path = os.path.join(UPLOAD_FOLDER, workflow_request_filename)
+        workflow_request_path = os.path.join(upload_folder, workflow_request_filename)
 
         file.save(data_file_path)
         data = request.form.to_dict()
@@ -59,73 +364,217 @@ def preprocess():
         with open(workflow_request_path, 'w') as json_file:
             json.dump(data, json_file, indent=4)
 
-        # Ensure preprocessing functions are thread-safe
-        with lock:
-            preprocess_data.preprocess_dataset(data_file_path)
-            preprocess_data.preprocess_json(workflow_request_path)
+        from utils import preprocess_data, dtype_planner
+
+        try:
+            preprocessed_file_path = preprocess_data.preprocessed_dataset_path(preprocessed_folder, file.filename)
+            encoder_file_path = preprocess_data.encoder_path(preprocessed_file_path)
+            cache_key = preprocessed_cache.key(data_file_path, preprocess_data.PREPROCESSING_VERSION)
+            if not preprocessed_cache.fetch(cache_key, preprocessed_file_path, encoder_file_path):
+                if os.path.getsize(data_file_path) > PREPROCESS_CHUNKED_BYTES:
+                    preprocess_data.preprocess_dataset_chunked(data_file_path, preprocessed_folder, PREPROCESS_CHUNK_ROWS)
+                else:
+                    preprocess_data.preprocess_dataset(data_file_path, preprocessed_folder)
+                preprocessed_cache.store(cache_key, preprocessed_file_path, encoder_file_path)
+            preprocess_data.preprocess_json(workflow_request_path, preprocessed_folder, results_folder, cache_key)
+            memory = dtype_planner.preprocessed_memory_report(preprocessed_file_path)
+            with open(os.path.join(preprocessed_folder, 'memory_report.json'), 'w') as json_file:
+                json.dump(memory, json_file, indent=4)
+        except preprocess_data.EmptyDatasetError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
 
         print('Received data:', data)
         print('File saved to:', data_file_path)
         print('Workflow request saved to:', workflow_request_path)
 
-        return jsonify({"message": "File and data received successfully", "file_path": data_file_path}), 200
+        return jsonify({"message": "File and data received successfully", "file_path": data_file_path, "workspace_id": workspace_id, "memory": memory}), 200
     else:
         return jsonify({"message": "File not received"}), 400
 
-@app.route('/hyperopt', methods=['GET'])
+@app.route('/hyperopt', methods=['POST'])
 def hyperopt_route():
+    return submit_search('hyperopt', run_hyperopt)
+
+@app.route('/tpot', methods=['POST'])
+def tpot_route():
+    return submit_search('tpot', run_tpot)
+
+@app.route('/jobs', methods=['GET'])
+def jobs_route():
+    metrics = job_manager.metrics()
+    metrics['engine'] = engine.stats()
+    metrics['rendering'] = renderer.stats()
+    return jsonify(metrics), 200
+
+@app.route('/cache', methods=['GET'])
+def cache_route():
+    stats = preprocessed_cache.stats()
+    stats['models'] = model_cache.stats()
+    stats['searches'] = search_cache.stats()
+    return jsonify(stats), 200
+
+@app.route('/export_preprocessed', methods=['GET'])
+def export_preprocessed_route():
+    workspace_id = get_workspace_id()
+    if not workspaces.workspace_exists(workspace_id):
+        return jsonify({"error": "Missing or unknown workspace_id."}), 400
+
     try:
-        config = read_working_request()
-       
-        intent = config.get('intent')
-        
-        if intent not in ['classification', 'regression']:
-            return jsonify({"error": "Invalid intent. Please use 'classification' or 'regression'."}), 400
-        
-        # Ensure ML pipeline functions are thread-safe
-        with lock:
-            img_filename, graph_filename, metric_name, metric_value, results_json = generate_ml_pipeline.hyperopt_pipeline_generator(config)
-        
-        # Construct file URLs
-        img_url = url_for('download_file', filename=img_filename, _external=True)
-        graph_url = url_for('download_file', filename=graph_filename, _external=True)
-        
-        return jsonify({
-            "results": results_json,
-            "image": img_url,
-            "graph": graph_url
-        }), 200
+        preprocessed_file_path = workspaces.read_working_request(workspace_id)['dataset']
+        csv_file_path = preprocessed_file_path.rsplit('.', 1)[0] + '.csv'
+        if not os.path.exists(csv_file_path):
+            from utils import preprocess_data
+            preprocess_data.export_preprocessed_csv(preprocessed_file_path, csv_file_path)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    return send_from_directory(os.path.dirname(csv_file_path), os.path.basename(csv_file_path), as_attachment=True)
+
+@app.route('/predict', methods=['POST'])
+def predict_route():
+    workspace_id = get_workspace_id()
+    job_id = request.form.get('job_id') or request.args.get('job_id')
+    if not workspaces.workspace_exists(workspace_id):
+        return jsonify({"error": "Missing or unknown workspace_id."}), 400
+    if not job_id or not JOB_ID_PATTERN.match(job_id):
+        return jsonify({"error": "Missing or invalid job_id."}), 400
+
+    model_path = model_store.model_path(workspaces.workspace_path(workspace_id, 'results'), job_id)
+    if not os.path.exists(model_path):
+        return jsonify({"error": "No model for this job, it is unknown or has not finished."}), 404
+
+    # The batch is an uploaded file or the request body, NDJSON if named or sent as such and CSV otherwise
+    if 'file' in request.files:
+        stream = request.files['file'].stream
+        ndjson = request.files['file'].filename.endswith(('.ndjson', '.jsonl'))
+    else:
+        stream = request.stream
+        ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl')
+    ndjson = request.args.get('format', 'ndjson' if ndjson else 'csv') == 'ndjson'
+
+    # The request stream is closed once the view returns, the predictions are streamed from a copy
+    fd, batch_path = tempfile.mkstemp(prefix='predict-', suffix='.batch', dir=workspaces.workspace_path(workspace_id, 'uploads'))
+    batch_file = os.fdopen(fd, 'w+b')
+
+    def remove_batch():
+        batch_file.close()
+        if os.path.exists(batch_path):
+            os.remove(batch_path)
 
-@app.route('/tpot', methods=['GET'])
-def tpot_route():
     try:
-        config = read_working_request()
-       
-        intent = config.get('intent')
-        
-        if intent not in ['classification', 'regression']:
-            return jsonify({"error": "Invalid intent. Please use 'classification' or 'regression'."}), 400
-        
-        
-        # Ensure ML pipeline functions are thread-safe
-        with lock:
-            img_filename, graph_filename, metric_name, metric_value = generate_ml_pipeline.tpot_pipeline_generator(config)
-        
-        print(img_filename)
-        # Construct file URLs
-        img_url = url_for('download_file', filename=img_filename, _external=True)
-        graph_url = url_for('download_file', filename=graph_filename, _external=True)
-        
-        return jsonify({
-            "image": img_url,
-            "graph": graph_url,
-            "metric_name": metric_name,
-            "metric_value": metric_value
-        }),200
+        shutil.copyfileobj(stream, batch_file)
+        batch_file.seek(0)
+        model = model_cache.get(model_path)
+        batches = iter(read_batches(batch_file, ndjson, model['encoder']))
+        # The first chunk is scored before responding, so a malformed batch gets an error status
+        first = next(batches, None)
+        first_predictions = predict_chunk(model, first) if first is not None else None
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        remove_batch()
+        return jsonify({"error": f"Invalid batch: {str(e)}"}), 400
+
+    def generate():
+        if not ndjson:
+            yield 'prediction\n'
+        if first_predictions is not None:
+            yield format_predictions(first_predictions, ndjson)
+        try:
+            for chunk in batches:
+                yield format_predictions(predict_chunk(model, chunk), ndjson)
+        except Exception as e:
+            # The status is already sent: the body ends with the error and the response is aborted,
+            # so it is not mistaken for the complete predictions
+            print(f"Prediction of a batch failed: {str(e)}")
+            yield format_prediction_error(f"Invalid batch: {str(e)}", ndjson)
+            raise
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson' if ndjson else 'text/csv')
+    response.call_on_close(remove_batch)
+    return response
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_route(job_id):
+    job = job_manager.snapshot(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+
+    # Stopped jobs (cancelled or timed out) may have a best-so-far result
+    result = job['result']
+    artifacts = None
+    if result:
+        artifacts = artifact_status(job_id, result)
+        result = with_file_urls(result)
+
+    return jsonify({
+        "job_id": job['id'],
+        "kind": job['kind'],
+        "status": job['status'],
+        "progress": job['progress'],
+        "submitted_at": job['submitted_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at'],
+        "slots": job['slots'],
+        "cores": job['cores'],
+        "result": result,
+        "artifacts": artifacts,
+        "error": job['error']
+    }), 200
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events_route(job_id):
+    if job_manager.snapshot(job_id) is None and not job_manager.events.has_job(job_id):
+        return jsonify({"error": "Job not found."}), 404
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or '0'
+    if not last_event_id.isdigit():
+        return jsonify({"error": "Invalid Last-Event-ID."}), 400
+
+    def generate():
+        for event in job_manager.events.subscribe(job_id, after=int(last_event_id)):
+            yield format_sse(event)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job_route(job_id):
+    try:
+        job = job_manager.cancel(job_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+
+    return jsonify({
+        "job_id": job['id'],
+        "status": 'cancelling' if job['status'] == RUNNING else job['status'],
+        "status_url": url_for('job_route', job_id=job['id'], _external=True),
+        "events_url": url_for('job_events_route', job_id=job['id'], _external=True)
+    }), 202
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job_route(job_id):
+    job = job_manager.snapshot(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    if job['kind'] != 'tpot':
+        return jsonify({"error": "Only TPOT searches can be resumed."}), 400
+    if job['status'] not in (FAILED, CANCELLED, TIMED_OUT):
+        return jsonify({"error": f"Only interrupted (failed, cancelled or timed out) jobs can be resumed, the job is {job['status']}."}), 409
+
+    config = dict(job['args'][0], warmStart=True)
+    checkpoint = search_checkpoint_path(config)
+    if checkpoint is None or not os.path.exists(checkpoint):
+        return jsonify({"error": "The job left no checkpoint to resume from."}), 409
+
+    resumed = job_manager.submit('tpot', run_tpot, config, cores=job['slots'])
+    return jsonify({
+        "job_id": resumed['id'],
+        "resumed_from": job_id,
+        "status": resumed['status'],
+        "status_url": url_for('job_route', job_id=resumed['id'], _external=True),
+        "warm_start": True
+    }), 202
 
 @app.route('/<path:filename>', methods=['GET'])
 def download_file(filename):
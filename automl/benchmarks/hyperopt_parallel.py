@@ -0,0 +1,70 @@
+"""
+Benchmark of the parallel Hyperopt trials: best loss versus wall-clock time for 1, 2, 4 and 8 workers.
+
+Run from the automl directory:
+
+    python -m benchmarks.hyperopt_parallel [dataset.csv] [--workers 1 2 4 8] [--evals-per-worker 5]
+
+Without a dataset, scikit-learn's digits dataset is used. Every search gets
+evals-per-worker x workers evaluations.
+"""
+import argparse
+import time
+
+import pandas as pd
+from hpsklearn import HyperoptEstimator, any_classifier
+from hyperopt import STATUS_OK, tpe
+from sklearn.datasets import load_digits
+from sklearn.metrics import accuracy_score
+
+from utils.parallel_trials import fit_parallel
+
+
+def load_dataset(path):
+    if path:
+        df = pd.read_csv(path)
+        return df.iloc[:, :-1], df.iloc[:, -1]
+    return load_digits(return_X_y=True)
+
+
+def run(X, y, workers, evals_per_worker, trial_timeout, seed):
+    """
+    Runs one search and returns its curve as a list of (elapsed seconds, best loss so far).
+    """
+    start = time.time()
+    curve = []
+    best = float('inf')
+
+    estim = HyperoptEstimator(classifier=any_classifier('clf'), preprocessing=[], loss_fn=accuracy_score,
+                              algo=tpe.suggest, max_evals=evals_per_worker * workers,
+                              trial_timeout=trial_timeout, seed=seed)
+
+    def on_result(trial, result):
+        nonlocal best
+        if result.get('status') == STATUS_OK:
+            best = min(best, float(result['loss']))
+        curve.append((time.time() - start, best))
+
+    fit_parallel(estim, X, y, parallelism=workers, result_callback=on_result)
+    return curve
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Best loss versus wall-clock time of parallel Hyperopt searches.')
+    parser.add_argument('dataset', nargs='?', help='CSV file whose last column is the target')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--evals-per-worker', type=int, default=5)
+    parser.add_argument('--trial-timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.dataset)
+    print(f"{'workers':>7} {'evals':>5} {'wall-clock (s)':>14} {'best loss':>9}   best loss over time")
+    for workers in args.workers:
+        curve = run(X, y, workers, args.evals_per_worker, args.trial_timeout, args.seed)
+        steps = ', '.join(f'{elapsed:.1f}s:{loss:.4f}' for elapsed, loss in curve)
+        print(f'{workers:>7} {len(curve):>5} {curve[-1][0]:>14.1f} {curve[-1][1]:>9.4f}   {steps}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark of the storage of preprocessed datasets: load time and memory of CSV versus memory-mapped Feather.
+
+Run from the automl directory:
+
+    python -m benchmarks.preprocessed_storage [--sizes 10 100 1000] [--columns 20]
+
+For every size (in MB of CSV), a synthetic preprocessed dataset is written in both formats. Each file
+is then loaded in a fresh process, which reports the load time, the time to load and scan every
+column once, and its resident memory (RSS) above the interpreter baseline after the scan.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from utils.preprocess_data import load_preprocessed_dataset
+
+CSV_BYTES_PER_VALUE = 20  # approximate size of a float64 formatted by to_csv
+
+
+def rss_mb():
+    """Returns the current resident memory of this process (peak resident memory if /proc is unavailable)."""
+    if os.path.exists('/proc/self/statm'):
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(path):
+    """Loads path in this process and returns the timings and resident memory as a dict."""
+    baseline = rss_mb()
+    start = time.perf_counter()
+    df = load_preprocessed_dataset(path)
+    loaded = time.perf_counter()
+    df.sum(numeric_only=True)
+    scanned = time.perf_counter()
+    return {
+        'load_s': loaded - start,
+        'load_and_scan_s': scanned - start,
+        'rss_mb': rss_mb() - baseline
+    }
+
+
+def write_dataset(folder, size_mb, n_columns):
+    """Writes a synthetic preprocessed dataset of about size_mb MB of CSV in both formats."""
+    n_rows = int(size_mb * 1024 * 1024 / (CSV_BYTES_PER_VALUE * (n_columns + 1)))
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.standard_normal((n_rows, n_columns)), columns=[f'feature_{i}' for i in range(n_columns)])
+    df['target'] = rng.integers(0, 5, n_rows)
+
+    csv_path = os.path.join(folder, f'{size_mb}mb.csv')
+    feather_path = os.path.join(folder, f'{size_mb}mb.feather')
+    df.to_csv(csv_path, index=False)
+    feather.write_feather(df, feather_path, compression='uncompressed')
+    return n_rows, csv_path, feather_path
+
+
+def run_in_fresh_process(path):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.preprocessed_storage', '--measure', path],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load time and memory of CSV versus Feather preprocessed datasets.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='dataset sizes in MB of CSV')
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return
+
+    print(f"{'size':>7} {'rows':>10} {'format':>8} {'file (MB)':>9} {'load (s)':>8} {'load+scan (s)':>13} {'RSS (MB)':>8}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size_mb in args.sizes:
+            n_rows, csv_path, feather_path = write_dataset(folder, size_mb, args.columns)
+            for name, path in (('csv', csv_path), ('feather', feather_path)):
+                result = run_in_fresh_process(path)
+                print(f"{size_mb:>5}MB {n_rows:>10} {name:>8} {os.path.getsize(path) / 1024 / 1024:>9.1f} "
+                      f"{result['load_s']:>8.3f} {result['load_and_scan_s']:>13.3f} {result['rss_mb']:>8.1f}")
+            os.remove(csv_path)
+            os.remove(feather_path)
+
+
+if __name__ == '__main__':
+    main()
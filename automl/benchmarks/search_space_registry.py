@@ -0,0 +1,64 @@
+"""
+Benchmark of the search-space registry: time and memory of building every hyperopt-sklearn search space
+up front (as the mappings of generate_ml_pipeline used to at import) versus building one on lookup.
+
+Run from the automl directory:
+
+    python -m benchmarks.search_space_registry [--lookups SVC RandomForestClassifier]
+
+Each mode runs in a fresh process with hpsklearn already imported, and reports the time spent and the
+resident memory (RSS) added by building the spaces.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.preprocessed_storage import rss_mb
+
+
+def measure(mode, lookups):
+    """Builds the spaces of mode in this process and returns the time and resident memory it took."""
+    import hpsklearn  # noqa: F401, imported before measuring, the services import it anyway
+    from utils.search_spaces import ALGORITHM_SPACES, PREPROCESSING_SPACES, SearchSpaceRegistry
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    preprocessing = SearchSpaceRegistry(PREPROCESSING_SPACES)
+    algorithms = SearchSpaceRegistry(ALGORITHM_SPACES)
+    names = list(ALGORITHM_SPACES) + list(PREPROCESSING_SPACES) if mode == 'eager' else lookups
+    for name in names:
+        (algorithms if name in algorithms else preprocessing)[name]
+    return {
+        'spaces': len(preprocessing.built()) + len(algorithms.built()),
+        'seconds': time.perf_counter() - start,
+        'rss_mb': rss_mb() - baseline
+    }
+
+
+def run_in_fresh_process(mode, lookups):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.search_space_registry', '--measure', mode,
+                             '--lookups', *lookups], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Eager versus lazy construction of the hyperopt-sklearn search spaces.')
+    parser.add_argument('--lookups', nargs='+', default=['RandomForestClassifier'],
+                        help='spaces looked up by a request in lazy mode')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.lookups)))
+        return
+
+    print(f"{'mode':>6} {'spaces':>6} {'time (ms)':>9} {'RSS (MB)':>8}")
+    for mode in ('eager', 'lazy'):
+        result = run_in_fresh_process(mode, args.lookups)
+        print(f"{mode:>6} {result['spaces']:>6} {result['seconds'] * 1000:>9.1f} {result['rss_mb']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
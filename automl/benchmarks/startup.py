@@ -0,0 +1,110 @@
+"""
+Benchmark of the startup of the automl service: time to import the application, resident memory (RSS)
+after the import and latency of the first requests, with and without the background preload of the
+deferred modules (AUTOML_PRELOAD).
+
+Run from the automl directory:
+
+    python -m benchmarks.startup [--idle 10] [--max-import-seconds 0.5] [--max-first-request-seconds 5]
+
+Each mode runs in a fresh process, in a temporary working directory: the application is imported, then
+after --idle seconds (the time before the first request reaches a freshly started service) GET / and a
+POST /send_and_preprocess of a small synthetic dataset are sent through the Flask test client. With the
+thresholds set, the benchmark exits with status 1 when a measure exceeds them, as a regression guard.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+AUTOML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic_csv(n_rows=150, n_columns=4):
+    """Returns a small classification dataset as CSV bytes."""
+    rng = random.Random(0)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([f'feature_{i}' for i in range(n_columns)] + ['species'])
+    for _ in range(n_rows):
+        writer.writerow([round(rng.gauss(0, 1), 3) for _ in range(n_columns)] + [rng.choice('abc')])
+    return buffer.getvalue().encode()
+
+
+def measure(idle):
+    """Starts the application in this process and returns the import time and first-request latencies."""
+    # Nothing beyond the standard library is imported before the application
+    start = time.perf_counter()
+    import api_automl_interaction
+    imported = time.perf_counter()
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    import_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+    time.sleep(idle)
+    client = api_automl_interaction.app.test_client()
+    start_index = time.perf_counter()
+    client.get('/')
+    start_upload = time.perf_counter()
+    form = {'dataset': 'startup.csv', 'intent': 'Classification', 'metric': 'Accuracy', 'preprocessing': 'No', 'timeLimit': '30',
+            'file': (io.BytesIO(synthetic_csv()), 'startup.csv')}
+    response = client.post('/send_and_preprocess', data=form, content_type='multipart/form-data')
+    uploaded = time.perf_counter()
+    api_automl_interaction.engine.shutdown()
+    if response.status_code != 200:
+        raise RuntimeError(f'/send_and_preprocess failed: {response.get_json()}')
+    return {
+        'import_s': imported - start,
+        'rss_mb': import_rss,
+        'index_s': start_upload - start_index,
+        'preprocess_s': uploaded - start_upload
+    }
+
+
+def run_in_fresh_process(preload, idle):
+    env = dict(os.environ, AUTOML_PRELOAD='1' if preload else '0',
+               PYTHONPATH=os.pathsep.join(filter(None, [AUTOML_DIR, os.environ.get('PYTHONPATH')])))
+    with tempfile.TemporaryDirectory() as folder:
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--measure', '--idle', str(idle)],
+                                cwd=folder, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time and first-request latency of the automl service.')
+    parser.add_argument('--idle', type=float, default=10.0, help='seconds between startup and the first request')
+    parser.add_argument('--max-import-seconds', type=float, help='fail when importing the application takes longer')
+    parser.add_argument('--max-first-request-seconds', type=float,
+                        help='fail when the first /send_and_preprocess takes longer')
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.idle)))
+        return
+
+    failures = []
+    print(f"{'preload':>7} {'import (s)':>10} {'RSS (MB)':>8} {'GET / (s)':>9} {'preprocess (s)':>14}")
+    for preload in (True, False):
+        result = run_in_fresh_process(preload, args.idle)
+        print(f"{'on' if preload else 'off':>7} {result['import_s']:>10.3f} {result['rss_mb']:>8.1f} "
+              f"{result['index_s']:>9.3f} {result['preprocess_s']:>14.3f}")
+        if args.max_import_seconds is not None and result['import_s'] > args.max_import_seconds:
+            failures.append(f"import took {result['import_s']:.3f}s > {args.max_import_seconds}s")
+        if args.max_first_request_seconds is not None and result['preprocess_s'] > args.max_first_request_seconds:
+            failures.append(f"first /send_and_preprocess took {result['preprocess_s']:.3f}s "
+                            f"> {args.max_first_request_seconds}s")
+
+    for failure in failures:
+        print('FAIL:', failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+from hyperopt import STATUS_OK, fmin, hp, tpe
+
+from utils.parallel_trials import ParallelTrials
+
+# As in the hpsklearn spaces, some weighted choices are in branches that none of TPE's candidates take
+SPACE = hp.choice('branch', [(i, hp.pchoice(f'offset_{i}', [(0.5, 0), (0.5, 1)])) for i in range(30)])
+
+
+def test_budgeted_search_runs_past_the_startup_trials():
+    # TPE suggests from the past observations once the first 20 (random) trials are done
+    trials = ParallelTrials(parallelism=1)
+    fmin(sum, SPACE, algo=tpe.suggest, max_evals=30, timeout=300, trials=trials,
+         rstate=None, show_progressbar=False)
+    assert trials.stopped_by == 'max_evals'
+    assert len(trials.trials) == 30
+    assert all(result['status'] == STATUS_OK for result in trials.results)
+
+
+def test_failed_suggestion_ends_the_search_with_its_best_trial():
+    def algo(new_ids, domain, trials, seed):
+        if len(trials.trials) >= 3:
+            raise TypeError('suggestion failed')
+        return tpe.rand.suggest(new_ids, domain, trials, seed)
+
+    trials = ParallelTrials(parallelism=1)
+    best = fmin(sum, SPACE, algo=algo, max_evals=10, timeout=300, trials=trials, show_progressbar=False)
+    assert trials.stopped_by == 'suggest_failed'
+    assert len(trials.trials) == 3
+    assert best == trials.argmin
@@ -0,0 +1,283 @@
+import functools
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# The plots and dataflows of a search are rendered after its result is returned, each job writing
+# into its own directory: <results_dir>/<kind>-results/jobs/<job_id>/
+JOBS_FOLDER = 'jobs'
+TEMPLATES_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# Render states
+PENDING = 'pending'
+READY = 'ready'
+FAILED = 'failed'
+
+MAX_TRACKED_JOBS = 200  # render states kept in memory for polling
+
+# Regression test sets larger than this are plotted as a 2D histogram of actual versus predicted
+# values (DENSITY_BINS x DENSITY_BINS bins) instead of one point per row
+SCATTER_MAX_POINTS = int(os.environ.get('AUTOML_SCATTER_MAX_POINTS', 10000))
+DENSITY_BINS = int(os.environ.get('AUTOML_DENSITY_BINS', 100))
+
+
+def job_directory(output_dir, job_id=None):
+    """
+    Returns the artifact directory of a job (of a fresh id when the search does not run in a job).
+    """
+    return os.path.join(output_dir, JOBS_FOLDER, job_id or uuid.uuid4().hex)
+
+
+def bin_predictions(y_true, y_pred, bins=DENSITY_BINS):
+    """
+    Counts actual versus predicted values in a bins x bins 2D histogram over their common range, so
+    the diagonal of the plot is the perfect prediction. Non-finite values are left out.
+    """
+    import numpy as np
+
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    finite = np.isfinite(y_true) & np.isfinite(y_pred)
+    y_true, y_pred = y_true[finite], y_pred[finite]
+    low = min(y_true.min(), y_pred.min()) if len(y_true) else 0.0
+    high = max(y_true.max(), y_pred.max()) if len(y_true) else 1.0
+    if high <= low:
+        high = low + 1.0
+    counts, edges, _ = np.histogram2d(y_true, y_pred, bins=bins, range=[[low, high], [low, high]])
+    return counts.astype(np.int64), edges
+
+
+def plan_artifacts(output_dir, job_id, dataset_name, intent, y_true, y_pred, algorithm, preprocessing=None):
+    """
+    Returns the render spec of the plot and dataflow of a search: where they will be written and what
+    they show. The spec is picklable, so it can be rendered by another process than the search.
+
+    Regression plots keep every point up to SCATTER_MAX_POINTS rows, larger test sets are binned here
+    so the spec stays small. Their data is also written as JSON, for client-side rendering.
+    """
+    import numpy as np
+
+    directory = job_directory(output_dir, job_id)
+    spec = {
+        'dataset_name': dataset_name,
+        'algorithm': algorithm,
+        'preprocessing': preprocessing,
+        'graph': os.path.join(directory, f'{dataset_name}-dataflow.svg'),
+        'dot': os.path.join(directory, f'{dataset_name}-dataflow.gv')
+    }
+    if intent == 'classification':
+        from sklearn.metrics import confusion_matrix
+        spec.update(plot='confusion_matrix', visualisation='Confusion Matrix',
+                    image=os.path.join(directory, f'{dataset_name}-conf_matrix.png'),
+                    matrix=confusion_matrix(y_true, y_pred).tolist())
+    else:
+        spec.update(visualisation='Scatter Plot',
+                    image=os.path.join(directory, f'{dataset_name}-scatter_plot.png'),
+                    plot_data=os.path.join(directory, f'{dataset_name}-scatter_plot.json'))
+        if len(y_true) > SCATTER_MAX_POINTS:
+            counts, edges = bin_predictions(y_true, y_pred)
+            spec.update(plot='density', counts=counts, edges=edges)
+        else:
+            spec.update(plot='scatter', y_true=np.asarray(y_true), y_pred=np.asarray(y_pred))
+    return spec
+
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@functools.lru_cache(maxsize=None)
+def load_template(name):
+    """Returns the content of a dataflow SVG template, read once."""
+    with open(os.path.join(TEMPLATES_FOLDER, name), 'rt') as f:
+        return f.read()
+
+
+def render_plot(spec):
+    """
+    Draws the confusion matrix, the actual-versus-predicted scatter plot or its 2D histogram of spec
+    into its image file. Figures are drawn without pyplot, so several can be rendered at the same time.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    if spec['plot'] == 'confusion_matrix':
+        import seaborn as sns
+
+        figure = Figure()
+        ax = figure.subplots()
+        sns.heatmap(spec['matrix'], annot=True, cmap='Blues', fmt='d', cbar=False, ax=ax)
+        ax.set_xlabel('Predicted')
+        ax.set_ylabel('True')
+        ax.set_title('Confusion Matrix')
+    elif spec['plot'] == 'density':
+        import numpy as np
+        from matplotlib.colors import LogNorm
+
+        counts, edges = spec['counts'], spec['edges']
+        figure = Figure(figsize=(8, 6))
+        ax = figure.subplots()
+        mesh = ax.pcolormesh(edges, edges, np.ma.masked_equal(counts, 0).T, cmap='Blues',
+                             norm=LogNorm(vmin=1, vmax=max(int(counts.max()), 1)))
+        figure.colorbar(mesh, ax=ax, label='Rows')
+        ax.plot([edges[0], edges[-1]], [edges[0], edges[-1]], 'k--', lw=2)
+        ax.set_xlabel('Actual')
+        ax.set_ylabel('Predicted')
+        ax.set_title(f'Actual vs. Predicted Values ({int(counts.sum())} rows)')
+    else:
+        y_true, y_pred = spec['y_true'], spec['y_pred']
+        figure = Figure(figsize=(8, 6))
+        ax = figure.subplots()
+        ax.scatter(y_true, y_pred, color='blue', alpha=0.5)
+        ax.plot([y_true.min(), y_true.max()], [y_true.min(), y_true.max()], 'k--', lw=2)
+        ax.set_xlabel('Actual')
+        ax.set_ylabel('Predicted')
+        ax.set_title('Actual vs. Predicted Values')
+    FigureCanvasAgg(figure)
+    _write_atomic(spec['image'], lambda path: figure.savefig(path, format='png'))
+
+
+def render_plot_data(spec):
+    """
+    Writes the data of a regression plot as JSON: the points of a scatter plot, or the bin edges
+    (shared by both axes) and counts, indexed [actual bin][predicted bin], of a 2D histogram.
+    """
+    if spec['plot'] == 'density':
+        data = {'mode': 'histogram2d', 'edges': spec['edges'].tolist(), 'counts': spec['counts'].tolist()}
+    else:
+        data = {'mode': 'scatter', 'actual': spec['y_true'].tolist(), 'predicted': spec['y_pred'].tolist()}
+
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    _write_atomic(spec['plot_data'], write)
+
+
+def render_dataflow(spec):
+    """
+    Writes the dataflow SVG of spec from its template, and its Graphviz source.
+    """
+    from graphviz import Digraph
+
+    dataset_name, visualisation = spec['dataset_name'], spec['visualisation']
+    algorithm, preprocessing = spec['algorithm'], spec['preprocessing']
+
+    graph = Digraph('DataFlow')
+    graph.attr(rankdir='LR')
+    graph.node('Dataset', fillcolor='orange', label=f'Dataset:\n{dataset_name}.csv')
+    graph.node('Visualization', fillcolor='lightgreen', label=f'Visualization:\n{visualisation}')
+    graph.node('Algorithm', fillcolor='lightblue', label=f'Algorithm:\n{algorithm}')
+    if preprocessing:
+        graph.node('Preprocessing', fillcolor='lightblue', label=f'Preprocessing:\n{preprocessing}')
+        graph.edge('Dataset', 'Preprocessing')
+        graph.edge('Preprocessing', 'Algorithm')
+        data = load_template('template-4-dataflow.svg').replace('methodX', preprocessing)
+    else:
+        graph.edge('Dataset', 'Algorithm')
+        data = load_template('template-3-dataflow.svg')
+    graph.edge('Algorithm', 'Visualization')
+
+    data = data.replace('dataset_name.csv', dataset_name + '.csv')
+    data = data.replace('Scatter Plot/Confusion Matrix', visualisation)
+    data = data.replace('Classifier/Regressor', algorithm)
+
+    def write_text(text):
+        def write(path):
+            with open(path, 'wt') as f:
+                f.write(text)
+        return write
+
+    _write_atomic(spec['graph'], write_text(data))
+    _write_atomic(spec['dot'], write_text(graph.source))
+
+
+def render_artifacts(spec):
+    """Renders the plot (and its data for regressions) and dataflow of spec."""
+    render_plot(spec)
+    if spec.get('plot_data'):
+        render_plot_data(spec)
+    render_dataflow(spec)
+
+
+class ArtifactRenderer:
+    """
+    Renders the artifacts of finished searches on a small pool of background threads.
+
+    Submitting returns at once; the render state of a job ('pending', 'ready' or 'failed') can then be
+    polled, and callbacks run once its artifacts are written.
+    """
+
+    def __init__(self, max_workers=1):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='automl-render')
+        self.lock = threading.Lock()
+        self.renders = OrderedDict()
+        self.rendered = 0
+        self.failed = 0
+        self.render_seconds = 0.0
+
+    def submit(self, job_id, spec):
+        """Queues the rendering of the artifacts of a job."""
+        with self.lock:
+            self.renders[job_id] = {'state': PENDING, 'error': None, 'future': None}
+            while len(self.renders) > MAX_TRACKED_JOBS:
+                self.renders.popitem(last=False)
+            future = self.executor.submit(self._render, job_id, spec)
+            self.renders[job_id]['future'] = future
+
+    def _render(self, job_id, spec):
+        start = time.time()
+        try:
+            render_artifacts(spec)
+            state, error = READY, None
+        except Exception as e:
+            traceback.print_exc()
+            state, error = FAILED, str(e)
+        with self.lock:
+            if state == READY:
+                self.rendered += 1
+                self.render_seconds += time.time() - start
+            else:
+                self.failed += 1
+            if job_id in self.renders:
+                self.renders[job_id].update(state=state, error=error)
+        return state
+
+    def add_done_callback(self, job_id, callback):
+        """Calls callback(state) once the artifacts of job_id are rendered (at once if they already are)."""
+        with self.lock:
+            render = self.renders.get(job_id)
+        if render is None:
+            return
+        render['future'].add_done_callback(lambda future: callback(future.result()))
+
+    def status(self, job_id):
+        """Returns the render state and error of a job, or None if it is not tracked."""
+        with self.lock:
+            render = self.renders.get(job_id)
+            return {'state': render['state'], 'error': render['error']} if render else None
+
+    def stats(self):
+        """Returns the number of pending, rendered and failed renders and the average render time."""
+        with self.lock:
+            return {
+                'pending': sum(1 for render in self.renders.values() if render['state'] == PENDING),
+                'rendered': self.rendered,
+                'failed': self.failed,
+                'average_render_seconds': round(self.render_seconds / self.rendered, 3) if self.rendered else 0.0
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
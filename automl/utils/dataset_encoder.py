@@ -0,0 +1,176 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from utils import dtype_planner
+
+ENCODER_EXTENSION = '.encoders.json'
+
+
+class DatasetEncoder:
+    """
+    Encoder stage of the preprocessing: label-encodes the categorical columns (categories sorted, as
+    LabelEncoder does) and standard-scales the features.
+
+    It is fitted in one pass over the data, all at once (fit) or chunk by chunk (partial_fit, then
+    finish_fit), and persisted as JSON next to the preprocessed dataset so the same transform can be
+    replayed on new data without refitting. Categories unseen during fitting, and missing categories,
+    are encoded as the mean of their column (0 once scaled).
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.feature_columns = None
+        self.target_column = None
+        self.categories = {}
+        self.target_classes = None
+        self.mean = None
+        self.scale = None
+        self.features_dtype = None
+        self.target_dtype = None
+        # Fitting statistics
+        self._category_counts = {}
+        self._scaler = StandardScaler()
+        self._target_is_float = False
+        self._target_range = [0, 0]
+
+    @property
+    def categorical_columns(self):
+        return [column for column, planned in self.plan.items() if planned == 'category']
+
+    def partial_fit(self, df):
+        """
+        Updates the category counts and the scaling statistics of the numeric features with a chunk of the dataset.
+        """
+        if self.feature_columns is None:
+            self.feature_columns = list(df.columns[:-1])
+            self.target_column = df.columns[-1]
+            self._category_counts = {column: pd.Series(dtype='int64') for column in self.categorical_columns}
+
+        for column in self._category_counts:
+            self._category_counts[column] = self._category_counts[column].add(df[column].value_counts(), fill_value=0)
+
+        numeric_features = self._numeric_features()
+        try:
+            if numeric_features:
+                self._scaler.partial_fit(df[numeric_features].to_numpy(dtype=np.float64))
+        except ValueError as e:
+            raise ValueError(f"Non-numeric values in a numeric column: {str(e)}")
+
+        target = df[self.target_column]
+        if self.target_column not in self._category_counts:
+            self._target_is_float = self._target_is_float or pd.api.types.is_float_dtype(target)
+            if len(target) and not self._target_is_float:
+                self._target_range = [min(self._target_range[0], target.min()), max(self._target_range[1], target.max())]
+        return self
+
+    def _numeric_features(self):
+        return [column for column in self.feature_columns if column not in self._category_counts]
+
+    def finish_fit(self):
+        """
+        Builds the category dictionaries and the scaling of every feature from the gathered statistics.
+        The mean and variance of the encoded categorical columns follow from their category counts.
+        """
+        numeric_features = self._numeric_features()
+        self.mean = np.zeros(len(self.feature_columns))
+        self.scale = np.ones(len(self.feature_columns))
+        for i, column in enumerate(self.feature_columns):
+            if column in self._category_counts:
+                counts = self._category_counts[column].sort_index()
+                self.categories[column] = counts.index
+                codes = np.arange(len(counts), dtype=np.float64)
+                weights = counts.to_numpy(dtype=np.float64)
+                if weights.sum():
+                    self.mean[i] = np.average(codes, weights=weights)
+                    variance = np.average((codes - self.mean[i]) ** 2, weights=weights)
+                    self.scale[i] = np.sqrt(variance) if variance > 0 else 1.0
+            else:
+                position = numeric_features.index(column)
+                self.mean[i] = self._scaler.mean_[position]
+                self.scale[i] = self._scaler.scale_[position]
+
+        if self.target_column in self._category_counts:
+            self.target_classes = self._category_counts[self.target_column].sort_index().index
+            self.target_dtype = dtype_planner.smallest_integer_dtype(-1, len(self.target_classes))
+        elif self._target_is_float:
+            self.target_dtype = 'float32' if self.plan.get(self.target_column) == 'float32' else 'float64'
+        else:
+            self.target_dtype = dtype_planner.smallest_integer_dtype(*self._target_range)
+        self.features_dtype = np.dtype(dtype_planner.features_dtype(self.plan, self.feature_columns)).name
+        return self
+
+    def fit(self, df):
+        """Fits the encoder on a whole dataset."""
+        return self.partial_fit(df).finish_fit()
+
+    def transform(self, df):
+        """
+        Encodes and scales a dataset (or a chunk of it). The target is transformed too when present;
+        its column is named 'target' in the result.
+        """
+        features = np.empty((len(df), len(self.feature_columns)), dtype=np.float64)
+        for i, column in enumerate(self.feature_columns):
+            if column in self.categories:
+                values = df[column]
+                if not (pd.api.types.is_object_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype)):
+                    values = values.astype(str)
+                codes = pd.Categorical(values, categories=self.categories[column]).codes
+                features[:, i] = np.where(codes < 0, self.mean[i], codes)
+            else:
+                features[:, i] = df[column].to_numpy(dtype=np.float64)
+        features -= self.mean
+        features /= self.scale
+
+        res = pd.DataFrame(features.astype(self.features_dtype, copy=False), columns=self.feature_columns)
+        if self.target_column in df:
+            target = df[self.target_column]
+            if self.target_classes is not None:
+                res['target'] = pd.Categorical(target, categories=self.target_classes).codes.astype(self.target_dtype)
+            else:
+                res['target'] = target.to_numpy(dtype=self.target_dtype)
+        return res
+
+    def decode_target(self, values):
+        """Maps encoded target values (e.g. predictions) back to the original classes."""
+        if self.target_classes is None:
+            return np.asarray(values)
+        return np.asarray(self.target_classes)[np.asarray(values, dtype=np.int64)]
+
+    def save(self, path):
+        """Persists the fitted encoder as JSON."""
+        state = {
+            'feature_columns': self.feature_columns,
+            'target_column': self.target_column,
+            'categories': {column: categories.tolist() for column, categories in self.categories.items()},
+            'target_classes': self.target_classes.tolist() if self.target_classes is not None else None,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'features_dtype': self.features_dtype,
+            'target_dtype': self.target_dtype,
+            'plan': self.plan
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=4)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Loads an encoder persisted with save, ready to transform."""
+        with open(path, 'r') as f:
+            state = json.load(f)
+        encoder = cls(state['plan'])
+        encoder.feature_columns = state['feature_columns']
+        encoder.target_column = state['target_column']
+        encoder.categories = {column: pd.Index(categories) for column, categories in state['categories'].items()}
+        encoder.target_classes = pd.Index(state['target_classes']) if state['target_classes'] is not None else None
+        encoder.mean = np.array(state['mean'])
+        encoder.scale = np.array(state['scale'])
+        encoder.features_dtype = state['features_dtype']
+        encoder.target_dtype = state['target_dtype']
+        return encoder
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+# Rows of the file read to plan the dtypes of its columns
+SAMPLE_ROWS = 10000
+
+INTEGER_DTYPES = ('int8', 'int16', 'int32', 'int64')
+NUMERIC_DTYPES = INTEGER_DTYPES + ('float32', 'float64', 'bool')
+
+
+def smallest_integer_dtype(minimum, maximum):
+    """
+    Returns the name of the smallest signed integer dtype holding all values between minimum and maximum.
+    """
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= minimum and maximum <= info.max:
+            return dtype
+    return 'int64'
+
+
+def float32_keeps_precision(values):
+    """
+    Checks that every value prints the same as a float32 as it does as a float64, i.e. that storing
+    the column in single precision does not lose any of the digits it was written with.
+    """
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return True
+    if np.abs(values).max() >= np.finfo(np.float32).max:
+        return False
+    return bool(np.array_equal(values.astype(np.float32).astype(str), values.astype(str)))
+
+
+def read_sample(data_file_path, sample_rows=SAMPLE_ROWS):
+    """
+    Reads the first rows of a CSV file with the default pandas dtypes.
+    """
+    return pd.read_csv(data_file_path, nrows=sample_rows)
+
+
+def plan_dtypes(sample):
+    """
+    Plans compact dtypes for the columns of a CSV file from a sample of its rows: `category` for
+    strings, the smallest integer width for integers and float32 for floats where precision allows.
+    """
+    plan = {}
+    for column in sample.columns:
+        values = sample[column]
+        if pd.api.types.is_object_dtype(values):
+            plan[column] = 'category'
+        elif pd.api.types.is_bool_dtype(values):
+            plan[column] = 'bool'
+        elif pd.api.types.is_integer_dtype(values):
+            plan[column] = smallest_integer_dtype(values.min(), values.max()) if len(values) else 'int64'
+        elif pd.api.types.is_float_dtype(values):
+            plan[column] = 'float32' if float32_keeps_precision(values.to_numpy()) else 'float64'
+    return plan
+
+
+def downcast_integers(df):
+    """
+    Downcasts the integer columns of a DataFrame to the smallest width holding their values.
+    """
+    for column in df.select_dtypes(include=['integer']).columns:
+        df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+
+def plan_strings_as_categories(plan, df):
+    """
+    Plans as `category` the columns planned as numbers (from a sample) that hold strings in df, as
+    the string columns of the sample are. Returns the names of these columns.
+    """
+    columns = [column for column, dtype in plan.items()
+               if dtype in NUMERIC_DTYPES and column in df and pd.api.types.is_object_dtype(df[column])]
+    for column in columns:
+        plan[column] = 'category'
+    return columns
+
+
+def cast_planned_floats(df, plan):
+    """
+    Casts the float columns of a DataFrame read with the default dtypes to their planned precision.
+    """
+    for column, dtype in plan.items():
+        if dtype in ('float32', 'float64') and column in df and pd.api.types.is_float_dtype(df[column]):
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def read_csv_planned(data_file_path, plan=None, **kwargs):
+    """
+    Reads a CSV file with the dtypes planned by plan_dtypes. The plan comes from a sample, so if later
+    rows do not fit it, the numeric columns are read with the default dtypes: those holding strings
+    become categories (plan is updated), the integer columns are downcast once loaded and the float
+    columns keep their planned precision.
+    """
+    plan = plan_dtypes(read_sample(data_file_path)) if plan is None else plan
+    try:
+        return pd.read_csv(data_file_path, dtype=plan, **kwargs)
+    except (ValueError, OverflowError):
+        pass
+    kwargs.setdefault('low_memory', False)  # strings and numbers of a column are not mixed
+    df = pd.read_csv(data_file_path, dtype={column: dtype for column, dtype in plan.items()
+                                            if dtype not in NUMERIC_DTYPES}, **kwargs)
+    for column in plan_strings_as_categories(plan, df):
+        df[column] = df[column].astype('category')
+    return downcast_integers(cast_planned_floats(df, plan))
+
+
+def features_dtype(plan, feature_columns):
+    """
+    Returns the dtype of the scaled features: float32 unless a feature column needs double precision.
+    """
+    return np.float64 if any(plan.get(column) == 'float64' for column in feature_columns) else np.float32
+
+
+def compact_target(target, plan_dtype=None):
+    """
+    Stores a (possibly label-encoded) target in the smallest dtype that keeps its values exactly.
+    """
+    values = np.asarray(target)
+    if np.issubdtype(values.dtype, np.integer) and len(values):
+        return values.astype(smallest_integer_dtype(values.min(), values.max()))
+    if np.issubdtype(values.dtype, np.floating) and plan_dtype == 'float32':
+        return values.astype(np.float32)
+    return values
+
+
+def estimated_default_bytes(df, sample=None):
+    """
+    Estimates the memory a DataFrame would take with default pandas dtypes (int64/float64 numerics and
+    object strings), using a default-dtype sample of the file for the size of the strings.
+    """
+    total = 0
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype) and sample is not None and column in sample:
+            per_row = sample[column].memory_usage(deep=True, index=False) / max(len(sample), 1)
+            total += int(per_row * len(df))
+        else:
+            total += 8 * len(df)
+    return total
+
+
+def memory_report(planned_bytes, default_bytes, rows, dtypes):
+    """
+    Returns the memory saved by the compact dtypes of a dataset.
+    """
+    return {
+        'rows': rows,
+        'default_bytes': int(default_bytes),
+        'planned_bytes': int(planned_bytes),
+        'saved_bytes': int(default_bytes - planned_bytes),
+        'saved_ratio': round(1 - planned_bytes / default_bytes, 3) if default_bytes else 0.0,
+        'dtypes': {str(column): str(dtype) for column, dtype in dtypes.items()}
+    }
+
+
+def preprocessed_memory_report(preprocessed_file_path):
+    """
+    Reports the memory a preprocessed dataset takes when loaded, against the float64 columns the
+    preprocessing used to produce. Only the schema of the file is read.
+    """
+    table = feather.read_table(preprocessed_file_path, memory_map=True)
+    dtypes = {field.name: field.type.to_pandas_dtype() for field in table.schema}
+    planned_bytes = sum(np.dtype(dtype).itemsize for dtype in dtypes.values()) * table.num_rows
+    default_bytes = 8 * len(dtypes) * table.num_rows
+    return memory_report(planned_bytes, default_bytes, table.num_rows,
+                         {name: np.dtype(dtype).name for name, dtype in dtypes.items()})
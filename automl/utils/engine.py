@@ -0,0 +1,402 @@
+import importlib
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+# Heavy modules imported once by every worker before it accepts jobs
+PRELOAD_MODULES = ('sklearn', 'hyperopt', 'hpsklearn', 'tpot', 'utils.generate_ml_pipeline')
+
+# Workers are spawned (not forked) so they never inherit the threads and locks of the Flask process
+mp_context = multiprocessing.get_context('spawn')
+
+# A job is stopped (cancelled or out of time) by interrupting its worker (SIGINT): the searches end
+# with their best-so-far result. A worker still busy STOP_GRACE_SECONDS later is killed with every
+# process it started.
+STOP_GRACE_SECONDS = 20
+POLL_SECONDS = 0.5
+
+# The CPU time of a job is the CPU time of its worker and of every process the worker starts (Hyperopt
+# trials, TPOT's joblib processes), checked every CPU_CHECK_SECONDS
+CPU_CHECK_SECONDS = 1.0
+
+# State of the job running on a worker process. The engine numbers the jobs it sends to a worker and
+# writes the number of the job to stop to _stop_job before interrupting the worker, so an interruption
+# arriving late never stops the next job of the worker.
+_job_running = threading.Event()
+_stop_requested = threading.Event()
+_current_job = None
+_stop_job = None
+
+
+def stop_requested():
+    """Checks, on a worker, whether the running job was asked to stop."""
+    return _stop_requested.is_set()
+
+
+def _interrupt(signum, frame):
+    """SIGINT handler of the workers: stops the running job if it is the one to stop, ignored otherwise."""
+    if _job_running.is_set() and _stop_job is not None and _stop_job.value == _current_job:
+        _stop_requested.set()
+        raise KeyboardInterrupt
+
+
+def _limit_process_memory(process_memory_limit_mb):
+    """
+    Bounds the address space of the worker process. It is a per-process limit: every process the
+    worker starts inherits it, for its own address space.
+    """
+    if process_memory_limit_mb:
+        import resource
+        limit = int(process_memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def process_group_cpu_time(pgid):
+    """
+    Returns the CPU time, in seconds, used by the processes of a process group and by their children
+    that have exited, or None where /proc is not available.
+    """
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return None
+    ticks = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:  # the process exited meanwhile
+            continue
+        # Fields after the command name: state, ppid, pgrp, ..., utime, stime, cutime, cstime
+        fields = stat[stat.rindex(b')') + 2:].split()
+        if int(fields[2]) == pgid:
+            ticks += sum(int(value) for value in fields[11:15])
+    return ticks / os.sysconf('SC_CLK_TCK')
+
+
+def _limit_cores(cores, all_cores):
+    """
+    Pins the worker (and the processes it starts) to the cores of the job, all_cores without any, and
+    caps the BLAS/OpenMP thread pools of the worker to as many threads. Returns the thread limiter.
+    """
+    from threadpoolctl import threadpool_limits
+
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores or all_cores)
+    return threadpool_limits(limits=len(cores)) if cores else None
+
+
+def _shutdown_loky():
+    """
+    Stops the reusable process pool of joblib (TPOT's n_jobs), whose processes keep the cores of the
+    job that started them.
+    """
+    executor = getattr(sys.modules.get('joblib.externals.loky.reusable_executor'), '_executor', None)
+    if executor is not None:
+        executor.shutdown(wait=True, kill_workers=True)
+
+
+class WorkerProgress:
+    """
+    Progress callback of a job running on a worker: progress(stage, fraction) reports its stage and
+    progress.event(event_type, data) the events of its search, both sent back to the engine.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __call__(self, stage, fraction):
+        self.conn.send(('progress', stage, fraction))
+
+    def event(self, event_type, data):
+        self.conn.send(('event', event_type, data))
+
+
+def _worker_main(conn, preload, process_memory_limit_mb, stop_job):
+    """
+    Entry point of a worker process: pre-warms the heavy imports, then runs the jobs it receives
+    and sends back progress messages and the result (or the error).
+    """
+    global _current_job, _stop_job
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    _stop_job = stop_job
+    # Own process group, so the worker can be killed with the processes it starts
+    os.setsid()
+    signal.signal(signal.SIGINT, _interrupt)
+    _limit_process_memory(process_memory_limit_mb)
+    all_cores = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else None
+    last_cores = None
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"Worker {os.getpid()} could not preload {module}: {str(e)}")
+    conn.send(('ready',))
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        module_name, func_name, args, kwargs, cores, job = task
+        if cores != last_cores:
+            _shutdown_loky()
+            last_cores = cores
+        limiter = _limit_cores(cores, all_cores)
+
+        _stop_requested.clear()
+        _current_job = job
+        _job_running.set()
+        try:
+            func = getattr(importlib.import_module(module_name), func_name)
+            result = func(*args, progress=WorkerProgress(conn), **kwargs)
+            _job_running.clear()
+            conn.send(('result', result))
+        except KeyboardInterrupt:
+            _job_running.clear()
+            conn.send(('error', 'The job was stopped before it had a result.'))
+        except MemoryError:
+            _job_running.clear()
+            conn.send(('error', 'The job exceeded the memory limit of the worker.'))
+        except Exception as e:
+            _job_running.clear()
+            traceback.print_exc()
+            conn.send(('error', f'{type(e).__name__}: {str(e)}'))
+        finally:
+            if limiter is not None:
+                limiter.restore_original_limits()
+
+
+class Worker:
+    """
+    Handle of a worker process and the parent end of its pipe.
+    """
+
+    def __init__(self, preload, process_memory_limit_mb):
+        self.conn, child_conn = mp_context.Pipe()
+        # Number of the job the worker is asked to stop (see _interrupt)
+        self.stop_job = mp_context.RawValue('q', 0)
+        # Not a daemon: hyperopt-sklearn and TPOT start processes of their own
+        self.process = mp_context.Process(target=_worker_main,
+                                          args=(child_conn, preload, process_memory_limit_mb, self.stop_job),
+                                          daemon=False)
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+        self.jobs_sent = 0
+        self.ready = False
+
+    def wait_ready(self):
+        if not self.ready:
+            message = self.conn.recv()
+            self.ready = message[0] == 'ready'
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def interrupt(self, job):
+        """Asks the job number job of the worker to stop with its best-so-far result (if it still runs)."""
+        self.stop_job.value = job
+        try:
+            os.kill(self.process.pid, signal.SIGINT)
+        except ProcessLookupError:
+            pass
+
+    def kill(self):
+        """Kills the worker and every process it started (its process group)."""
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def stop(self):
+        """
+        Asks the worker to exit and terminates it if it does not, then kills the processes it left.
+        """
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.kill()
+        self.conn.close()
+
+
+class ProcessEngine:
+    """
+    Managed pool of pre-warmed worker processes running the CPU-bound AutoML searches outside the
+    Flask process. Workers are recycled after max_jobs_per_worker jobs to bound memory growth. Every
+    process of a worker is limited to process_memory_limit_mb of address space, and a job whose
+    processes use more than cpu_time_limit seconds of CPU time in total is killed. A job can be stopped
+    at any time: its worker is interrupted, then killed if it does not return within stop_grace_seconds.
+    """
+
+    def __init__(self, max_workers=2, max_jobs_per_worker=5, process_memory_limit_mb=None, cpu_time_limit=None,
+                 preload=PRELOAD_MODULES, stop_grace_seconds=STOP_GRACE_SECONDS):
+        self.max_workers = max_workers
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.process_memory_limit_mb = process_memory_limit_mb
+        self.cpu_time_limit = cpu_time_limit
+        self.stop_grace_seconds = stop_grace_seconds
+        self.preload = preload
+        self.condition = threading.Condition()
+        self.idle = []
+        self.n_workers = 0
+        self.busy = 0
+        self.jobs_done = 0
+        self.recycled = 0
+        self.stopped = 0
+        self.killed = 0
+
+    def start(self):
+        """
+        Starts (and pre-warms, in the background) all the workers of the pool.
+        """
+        with self.condition:
+            while self.n_workers < self.max_workers:
+                self.idle.append(self._spawn())
+
+    def _spawn(self):
+        self.n_workers += 1
+        return Worker(self.preload, self.process_memory_limit_mb)
+
+    def _acquire(self):
+        with self.condition:
+            while not self.idle and self.n_workers >= self.max_workers:
+                self.condition.wait()
+            worker = self.idle.pop() if self.idle else self._spawn()
+            self.busy += 1
+        return worker
+
+    def _release(self, worker, healthy):
+        with self.condition:
+            self.busy -= 1
+            self.jobs_done += 1
+            worker.jobs_done += 1
+            if healthy and worker.is_alive() and worker.jobs_done < self.max_jobs_per_worker:
+                self.idle.append(worker)
+                worker = None
+            else:
+                self.n_workers -= 1
+                self.recycled += 1
+                # Replace the worker right away so the next job finds a warm one
+                self.idle.append(self._spawn())
+            self.condition.notify()
+        if worker is not None:
+            worker.stop()
+
+    def run(self, module_name, func_name, *args, progress=None, cpu_time_limit=None, **kwargs):
+        """
+        Runs module_name.func_name(*args, progress=..., **kwargs) on a worker process and returns its result.
+        Progress messages of the job are forwarded to the progress callback, and its events to
+        progress.event if the callback has it.
+
+        Once progress.stop_requested (a threading.Event, if the callback has it) is set, the job is
+        stopped: the result it returns then is its best-so-far result, and its worker is replaced.
+        With progress.cores (the ids of the cores given to the job), the job runs on these cores only.
+
+        The CPU time of the job counts its worker and all the processes the worker starts (on Linux,
+        from /proc); a job exceeding cpu_time_limit (default is the limit of the engine) is killed.
+
+        Raises:
+        - RuntimeError: If the job failed, was stopped before having a result, exceeded its CPU time
+          limit, or its worker died.
+        """
+        worker = self._acquire()
+        healthy = False
+        stop = getattr(progress, 'stop_requested', None)
+        stopped_at = None
+        killed = False
+        cpu_time_limit = cpu_time_limit or self.cpu_time_limit
+        cpu_exceeded = False
+        try:
+            worker.wait_ready()
+            cpu_start = process_group_cpu_time(worker.process.pid) if cpu_time_limit else None
+            cpu_checked_at = time.time()
+            worker.jobs_sent += 1
+            job = worker.jobs_sent
+            worker.conn.send((module_name, func_name, args, kwargs, getattr(progress, 'cores', None), job))
+            while True:
+                if cpu_start is not None and not killed and time.time() - cpu_checked_at >= CPU_CHECK_SECONDS:
+                    cpu_checked_at = time.time()
+                    if process_group_cpu_time(worker.process.pid) - cpu_start > cpu_time_limit:
+                        killed = cpu_exceeded = True
+                        worker.kill()
+                if stop is not None and stop.is_set():
+                    if stopped_at is None:
+                        stopped_at = time.time()
+                        self.stopped += 1
+                        worker.interrupt(job)
+                    elif not killed and time.time() - stopped_at > self.stop_grace_seconds:
+                        killed = True
+                        self.killed += 1
+                        worker.kill()
+                if not worker.conn.poll(POLL_SECONDS):
+                    continue
+                try:
+                    message = worker.conn.recv()
+                except EOFError:
+                    worker.process.join()
+                    if cpu_exceeded:
+                        raise RuntimeError('The job exceeded the CPU time limit and its worker was stopped.')
+                    if killed:
+                        raise RuntimeError('The job was stopped and its worker killed before it had a result.')
+                    raise RuntimeError(self._describe_exit(worker.process.exitcode))
+                if message[0] == 'progress':
+                    if progress is not None:
+                        progress(message[1], message[2])
+                elif message[0] == 'event':
+                    if hasattr(progress, 'event'):
+                        progress.event(message[1], message[2])
+                elif message[0] == 'result':
+                    # An interrupted worker is replaced, the interruption may have left it in any state
+                    healthy = stopped_at is None
+                    return message[1]
+                else:
+                    raise RuntimeError(message[1])
+        finally:
+            self._release(worker, healthy)
+
+    def _describe_exit(self, exitcode):
+        if exitcode == -signal.SIGKILL:
+            return 'The worker of the job was killed (out of memory?).'
+        return f'The worker of the job exited unexpectedly (exit code {exitcode}).'
+
+    def stats(self):
+        """
+        Returns the state of the pool.
+        """
+        with self.condition:
+            return {
+                'processes': self.n_workers,
+                'busy': self.busy,
+                'idle': len(self.idle),
+                'jobs_done': self.jobs_done,
+                'recycled': self.recycled,
+                'stopped': self.stopped,
+                'killed': self.killed,
+                'max_jobs_per_worker': self.max_jobs_per_worker,
+                'process_memory_limit_mb': self.process_memory_limit_mb,
+                'cpu_time_limit': self.cpu_time_limit,
+                'stop_grace_seconds': self.stop_grace_seconds
+            }
+
+    def shutdown(self):
+        """
+        Stops the idle workers.
+        """
+        with self.condition:
+            workers, self.idle = self.idle, []
+            self.n_workers -= len(workers)
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,252 @@
+import copy
+import hashlib
+import json
+import math
+import os
+import time
+import uuid
+from importlib import metadata
+
+# Scores of the pipelines evaluated by the searches, reused whenever the same pipeline (same operators
+# and hyperparameters) is evaluated again on the same training data, in the same search or a later one:
+# data/evaluation-cache/<training data hash>/<key>.json. The training data hash covers the dataset and
+# the split of its training rows; the key hashes the pipeline, its hyperparameters, how it is scored
+# (validation split or cross-validation folds, scoring function, random state) and the versions of
+# the libraries fitting it. Only successful evaluations are kept.
+CACHE_FOLDER = 'data/evaluation-cache'
+EVALUATION_CACHE = os.environ.get('AUTOML_EVALUATION_CACHE', '1') != '0'
+
+# TPOT also caches the transformers it fits (memory=), so pipelines sharing their preprocessing steps
+# fit them once; the least recently used are removed above TPOT_MEMORY_MB
+TPOT_MEMORY_FOLDER = os.path.join(CACHE_FOLDER, 'tpot-memory')
+TPOT_MEMORY_MB = int(os.environ.get('TPOT_MEMORY_MB', 1024))
+
+# Parameters that change how fast a pipeline is fitted, not its score
+IGNORED_PARAMS = ('n_jobs', 'verbose')
+
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def data_hash(X, y):
+    """Returns the content hash of training data (any array-like, numeric or not)."""
+    import joblib
+
+    return joblib.hash((X, y))
+
+
+def _function_name(function):
+    if function is None or isinstance(function, str):
+        return function
+    return f'{getattr(function, "__module__", "")}.{getattr(function, "__qualname__", repr(function))}'
+
+
+class EvaluationCache:
+    """
+    Scores of the pipelines evaluated on one training set, under one way of scoring them.
+    """
+
+    def __init__(self, training_hash, scoring, folder=CACHE_FOLDER):
+        self.directory = os.path.join(folder, training_hash)
+        self.scoring = scoring
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def key(self, pipeline, params=None):
+        return hashlib.sha256(json.dumps({'pipeline': pipeline, 'params': params, 'scoring': self.scoring},
+                                         sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, pipeline, params=None):
+        """Returns the saved evaluation of a pipeline, or None."""
+        path = os.path.join(self.directory, self.key(pipeline, params) + '.json')
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, pipeline, params=None, **evaluation):
+        """Saves the evaluation (score and fit time) of a pipeline (atomic write)."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self.key(pipeline, params) + '.json')
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(evaluation, saved_at=time.time()), f, default=float)
+        os.replace(tmp_path, path)
+        self.stored += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stored': self.stored,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+def _estimator_params(estimator):
+    return {name: repr(value) for name, value in sorted(estimator.get_params(deep=True).items())
+            if name.split('__')[-1] not in IGNORED_PARAMS}
+
+
+def hyperopt_steps(config):
+    """Returns the learner, preprocessing steps and exogenous preprocessing of a hyperopt-sklearn configuration."""
+    model = config if 'classifier' in config else config['model']
+    learner = model['classifier'] if model['classifier'] is not None else model['regressor']
+    return learner, model['preprocessing'], model['ex_preprocs']
+
+
+def hyperopt_pipeline(config):
+    """
+    Returns the canonical pipeline string of a hyperopt-sklearn configuration (its classes, in order)
+    and the hyperparameters of its steps.
+    """
+    learner, preprocessing, ex_preprocs = hyperopt_steps(config)
+    steps = list(preprocessing or ()) + [learner]
+    pipeline = ' -> '.join(f'{type(step).__module__}.{type(step).__qualname__}' for step in steps)
+    params = [_estimator_params(step) for step in steps]
+    if ex_preprocs:
+        params.append([[_estimator_params(step) for step in ex_steps] for ex_steps in ex_preprocs])
+    return pipeline, params
+
+
+def hyperopt_cache(estimator, X, y, valid_size, folder=CACHE_FOLDER):
+    """
+    Returns the evaluation cache of the trials of a HyperoptEstimator on X, y, or None when disabled.
+    hyperopt-sklearn validates every configuration on the last valid_size of the rows.
+    """
+    if not EVALUATION_CACHE:
+        return None
+    scoring = {
+        'engine': 'hyperopt',
+        'valid_size': valid_size,
+        'loss_fn': _function_name(estimator.loss_fn),
+        'continuous_loss_fn': estimator.continuous_loss_fn,
+        'use_partial_fit': estimator.use_partial_fit,
+        'versions': [_package_version('hyperopt-sklearn'), _package_version('scikit-learn')]
+    }
+    return EvaluationCache(data_hash(X, y), scoring, folder)
+
+
+def cached_hyperopt_result(config, entry, n_jobs=1):
+    """
+    Returns the trial result of a configuration from its saved evaluation. Its steps are returned
+    unfitted: the best model of a search is refitted on the full training data anyway.
+    """
+    from hyperopt import STATUS_OK
+
+    learner, preprocessing, ex_preprocs = hyperopt_steps(config)
+    learner = copy.deepcopy(learner)
+    if hasattr(learner, 'n_jobs'):
+        learner.n_jobs = n_jobs
+    return {
+        'loss': entry['loss'],
+        'loss_variance': entry.get('loss_variance'),
+        'learner': learner,
+        'preprocs': preprocessing,
+        'ex_preprocs': ex_preprocs,
+        'status': STATUS_OK,
+        'duration': 0.0,
+        'iterations': None,
+        'cached': True
+    }
+
+
+class TPOTEvaluationCache:
+    """
+    Scores the pipelines of a TPOT search from the evaluation cache before TPOT fits them.
+
+    Pipelines found in the cache are handed to TPOT as already evaluated, so it skips them; the ones
+    TPOT evaluates are saved. TPOT does not time its pipelines one by one: their fit time is the
+    average over the batch they were evaluated in.
+    """
+
+    def __init__(self, tpot, folder=CACHE_FOLDER):
+        self.tpot = tpot
+        self.folder = folder
+        self.caches = []  # (features, target, cache), the arrays are kept so their ids stay theirs
+        self._evaluate_individuals = tpot._evaluate_individuals
+        tpot._evaluate_individuals = self.evaluate_individuals
+
+    def cache_for(self, features, target):
+        """Returns the evaluation cache of the pipelines of tpot on features, target."""
+        for cached_features, cached_target, cache in self.caches:
+            if cached_features is features and cached_target is target:
+                return cache
+        tpot = self.tpot
+        scoring = {
+            'engine': 'tpot',
+            'cv': repr(tpot.cv),
+            'scoring': _function_name(tpot.scoring_function),
+            'random_state': tpot.random_state,
+            'versions': [_package_version('tpot'), _package_version('scikit-learn')]
+        }
+        cache = EvaluationCache(data_hash(features, target), scoring, self.folder)
+        self.caches.append((features, target, cache))
+        return cache
+
+    def evaluate_individuals(self, population, features, target, sample_weight=None, groups=None):
+        if sample_weight is not None or groups is not None:
+            return self._evaluate_individuals(population, features, target,
+                                              sample_weight=sample_weight, groups=groups)
+        tpot = self.tpot
+        cache = self.cache_for(features, target)
+        pending = set()
+        for individual in population:
+            individual_str = str(individual)
+            if individual.fitness.valid or individual_str in tpot.evaluated_individuals_:
+                continue
+            entry = cache.get(individual_str)
+            if entry is None:
+                pending.add(individual_str)
+                continue
+            tpot.evaluated_individuals_[individual_str] = tpot._combine_individual_stats(
+                entry['operator_count'], entry['score'], individual.statistics)
+
+        start = time.time()
+        try:
+            return self._evaluate_individuals(population, features, target)
+        finally:
+            # Also when the search is stopped in the middle of the batch: TPOT records what it evaluated
+            evaluated = [(individual_str, tpot.evaluated_individuals_[individual_str])
+                         for individual_str in pending if individual_str in tpot.evaluated_individuals_]
+            evaluated = [(individual_str, details) for individual_str, details in evaluated
+                         if math.isfinite(details['internal_cv_score'])]
+            fit_seconds = (time.time() - start) / len(evaluated) if evaluated else 0.0
+            for individual_str, details in evaluated:
+                cache.put(individual_str, score=details['internal_cv_score'],
+                          operator_count=details['operator_count'], fit_seconds=fit_seconds)
+
+    def stats(self):
+        """Returns the hits, misses and saved evaluations over all the training sets of the search."""
+        hits = sum(cache.hits for _, _, cache in self.caches)
+        misses = sum(cache.misses for _, _, cache in self.caches)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'stored': sum(cache.stored for _, _, cache in self.caches),
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0
+        }
+
+
+def tpot_memory():
+    """Returns the transformer cache directory of TPOT searches, or None when the cache is disabled."""
+    return TPOT_MEMORY_FOLDER if EVALUATION_CACHE else None
+
+
+def reduce_tpot_memory(location=TPOT_MEMORY_FOLDER, max_mb=TPOT_MEMORY_MB):
+    """Removes the least recently used transformers of the TPOT cache above max_mb."""
+    if not os.path.isdir(location):
+        return
+    from joblib import Memory
+
+    Memory(location=location, verbose=0).reduce_size(bytes_limit=max_mb * 1024 * 1024)
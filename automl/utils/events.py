@@ -0,0 +1,178 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Events of the jobs, kept in memory for their Server-Sent Events stream (/jobs/<job_id>/events): state
+# changes, progress, and the result of every trial (Hyperopt) or pipeline and generation (TPOT)
+MAX_EVENTS_PER_JOB = 1000  # the oldest events of a job are dropped beyond this
+MAX_TRACKED_JOBS = 200
+KEEPALIVE_SECONDS = 15
+
+
+class EventHub:
+    """
+    In-process publish/subscribe channel of job events.
+
+    Every event of a job gets an increasing id, so a subscriber that reconnects (SSE Last-Event-ID)
+    receives the events it missed. The stream of a job ends once the job is closed and its events
+    have been read.
+    """
+
+    def __init__(self, max_events=MAX_EVENTS_PER_JOB, max_jobs=MAX_TRACKED_JOBS):
+        self.max_events = max_events
+        self.max_jobs = max_jobs
+        self.condition = threading.Condition()
+        self.channels = OrderedDict()
+
+    def _channel(self, job_id):
+        channel = self.channels.get(job_id)
+        if channel is None:
+            channel = self.channels[job_id] = {'events': deque(maxlen=self.max_events), 'next_id': 1,
+                                               'closed': False}
+            while len(self.channels) > self.max_jobs:
+                self.channels.popitem(last=False)
+        return channel
+
+    def publish(self, job_id, event_type, data=None):
+        """Appends an event to the channel of a job and wakes up its subscribers."""
+        with self.condition:
+            channel = self._channel(job_id)
+            channel['events'].append({'id': channel['next_id'], 'type': event_type, 'time': time.time(),
+                                      'data': data or {}})
+            channel['next_id'] += 1
+            self.condition.notify_all()
+
+    def close(self, job_id):
+        """Marks the last event of a job: its streams end once they have sent it."""
+        with self.condition:
+            self._channel(job_id)['closed'] = True
+            self.condition.notify_all()
+
+    def has_job(self, job_id):
+        with self.condition:
+            return job_id in self.channels
+
+    def read(self, job_id, after=0, timeout=None):
+        """
+        Returns the events of a job with an id above after, waiting up to timeout seconds for one, and
+        whether the channel is closed.
+        """
+        with self.condition:
+            def pending():
+                channel = self.channels.get(job_id)
+                return channel is None or channel['closed'] or (channel['events'] and
+                                                                channel['events'][-1]['id'] > after)
+
+            self.condition.wait_for(pending, timeout)
+            channel = self.channels.get(job_id)
+            if channel is None:
+                return [], True
+            return [event for event in channel['events'] if event['id'] > after], channel['closed']
+
+    def subscribe(self, job_id, after=0, keepalive=KEEPALIVE_SECONDS):
+        """
+        Yields the events of a job as they are published, and None every keepalive seconds without
+        any, until the job is closed.
+        """
+        while True:
+            events, closed = self.read(job_id, after, keepalive)
+            for event in events:
+                after = event['id']
+                yield event
+            if closed and not events:
+                return
+            if not events:
+                yield None
+
+
+def format_sse(event):
+    """Formats an event (or a keepalive comment for None) as a Server-Sent Events message."""
+    if event is None:
+        return ': keepalive\n\n'
+    data = json.dumps(dict(event['data'], time=event['time']), default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+def report_event(progress, event_type, **data):
+    """
+    Publishes an event of the running search through the progress callback of its job, when the
+    callback takes events (progress.event).
+    """
+    publish = getattr(progress, 'event', None)
+    if publish is not None:
+        publish(event_type, data)
+
+
+def describe_hyperopt_pipeline(result):
+    """Returns the steps of the pipeline of a successful hyperopt-sklearn trial result, on one line."""
+    steps = list(result.get('preprocs') or ()) + [result['learner']]
+    return ' -> '.join(' '.join(repr(step).split()) for step in steps)
+
+
+def hyperopt_trial_reporter(progress, estimator):
+    """
+    Returns a result_callback for fit_parallel publishing a 'trial' event (pipeline, loss, best loss so
+    far, duration) for every finished trial of a HyperoptEstimator.
+    """
+    from hyperopt import STATUS_OK
+
+    best = {'loss': None}
+
+    def report(trial, result):
+        ok = result.get('status') == STATUS_OK
+        loss = float(result['loss']) if ok else None
+        if ok and (best['loss'] is None or loss < best['loss']):
+            best['loss'] = loss
+        timing = estimator.trials.timings.get(trial['tid'], {})
+        report_event(progress, 'trial', engine='hyperopt', trial=trial['tid'], status=result.get('status'),
+                     pipeline=describe_hyperopt_pipeline(result) if ok else None, loss=loss,
+                     best_loss=best['loss'], cached=result.get('cached', False), failure=result.get('failure'),
+                     duration=round(timing['end'] - timing['start'], 3) if 'end' in timing else None)
+
+    return report
+
+
+class TPOTEventReporter:
+    """
+    Publishes a 'trial' event for every pipeline a TPOT search scores (pipeline, score, duration) and a
+    'generation' event at the end of every generation (best pipeline and score so far).
+
+    TPOT does not time its pipelines one by one: their duration is the average over the batch they
+    were evaluated in.
+    """
+
+    def __init__(self, tpot, progress):
+        self.tpot = tpot
+        self.progress = progress
+        self.best_score = None
+        self.best_pipeline = None
+        self._evaluate_individuals = tpot._evaluate_individuals
+        self._check_periodic_pipeline = tpot._check_periodic_pipeline
+        tpot._evaluate_individuals = self.evaluate_individuals
+        tpot._check_periodic_pipeline = self.check_periodic_pipeline
+
+    def evaluate_individuals(self, population, features, target, sample_weight=None, groups=None):
+        evaluated_before = set(self.tpot.evaluated_individuals_)
+        start = time.time()
+        try:
+            return self._evaluate_individuals(population, features, target,
+                                              sample_weight=sample_weight, groups=groups)
+        finally:
+            evaluated = [(individual_str, details) for individual_str, details
+                         in self.tpot.evaluated_individuals_.items() if individual_str not in evaluated_before]
+            duration = round((time.time() - start) / len(evaluated), 3) if evaluated else None
+            for individual_str, details in evaluated:
+                score = details['internal_cv_score']
+                valid = math.isfinite(score)
+                if valid and (self.best_score is None or score > self.best_score):
+                    self.best_score, self.best_pipeline = score, individual_str
+                report_event(self.progress, 'trial', engine='tpot', pipeline=individual_str,
+                             score=score if valid else None, best_score=self.best_score,
+                             generation=details.get('generation'), duration=duration)
+
+    def check_periodic_pipeline(self, gen):
+        report_event(self.progress, 'generation', engine='tpot', generation=gen, best_score=self.best_score,
+                     best_pipeline=self.best_pipeline, evaluated=len(self.tpot.evaluated_individuals_))
+        self._check_periodic_pipeline(gen)
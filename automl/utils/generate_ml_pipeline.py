@@ -1,21 +1,43 @@
 from sklearn.model_selection import train_test_split
-from hpsklearn import *
-from sklearn.metrics import accuracy_score, confusion_matrix, mean_absolute_error
+from sklearn.metrics import accuracy_score, mean_absolute_error
 from hyperopt import tpe
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
-from graphviz import Digraph
 from datetime import datetime
 import sys
-import shutil
-from tpot import TPOTClassifier, TPOTRegressor
-import nbformat as nbf
 import json
 from sklearn.metrics import fbeta_score
 import numpy as np
-import pandas as pd
+from utils.parallel_trials import default_parallelism, fit_parallel
+from utils.preprocess_data import load_preprocessed_dataset, encoder_path
+from utils.dataset_encoder import DatasetEncoder
+from utils.model_store import save_model
+from utils.artifacts import plan_artifacts
+from utils.tpot_checkpoints import (TPOTCheckpointer, is_warm_start, load_checkpoint, restore_checkpoint,
+                                    search_checkpoint_path)
+from utils.successive_halving import (DEFAULT_ETA, fit_hyperopt_successive_halving, fit_tpot_successive_halving,
+                                      parse_rung_schedule)
+from sklearn.pipeline import make_pipeline
+from utils.search_spaces import ALGORITHM_SPACES, PREPROCESSING_SPACES, SearchSpaceRegistry
+from utils.tpot_config import METRIC_NAMES, describe_settings, tpot_search_settings
+from utils.evaluation_cache import EVALUATION_CACHE, TPOTEvaluationCache, reduce_tpot_memory, tpot_memory
+from utils.events import TPOTEventReporter, hyperopt_trial_reporter
+
+# hpsklearn is imported by the Hyperopt generator and tpot and nbformat by the TPOT generator, so
+# importing this module does not load both engines (the workers preload them, see engine.PRELOAD_MODULES)
+
+# Hyperopt trials evaluated at the same time (HYPEROPT_WORKERS=1 evaluates them one at a time). A job
+# runs at most as many trials at once as it has cores (the worker is pinned to them). The number of
+# evaluations of a search, HYPEROPT_MAX_EVALS, does not depend on the number of workers or cores.
+HYPEROPT_WORKERS = int(os.environ.get('HYPEROPT_WORKERS', 0)) or default_parallelism()
+HYPEROPT_MAX_EVALS = 20
+# With a total time budget ('timeBudget'), a search runs as many trials as fit in it (up to
+# HYPEROPT_BUDGET_MAX_EVALS) and stops early after 'earlyStoppingRounds' trials without improvement
+HYPEROPT_BUDGET_MAX_EVALS = 1000
+HYPEROPT_EARLY_STOPPING_ROUNDS = 10
+# Searches are seeded: the same search suggests the same configurations again, which are then scored
+# from the evaluation cache (utils/evaluation_cache.py) instead of being fitted again
+HYPEROPT_SEED = 34
 
 ## modified f1_score from sklearn.metrics
 def f1_score(
@@ -39,9 +61,10 @@ def f1_score(
         zero_division=zero_division,
     )
 def save_results_to_json(filename, dataset_name, intent, algorithm, hyperparameter_constraints,
-                         preprocessing_constraint, time, metric_name, metric_value, pipeline):
+                         preprocessing_constraint, time, metric_name, metric_value, pipeline, budget=None,
+                         multi_fidelity=None):
     
-    os.makedirs('results/hyperopt-results/pipelines', exist_ok=True)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
 
     json_data = {
         'dataset': dataset_name,
@@ -55,6 +78,10 @@ def save_results_to_json(filename, dataset_name, intent, algorithm, hyperparamet
         'metricName': metric_name,
         'metric_value': metric_value
     }
+    if budget is not None:
+        json_data['budget'] = budget
+    if multi_fidelity is not None:
+        json_data['multi_fidelity'] = multi_fidelity
 
     with open(filename, 'w') as json_file:
         json.dump(json_data, json_file, indent=4)
@@ -62,120 +89,11 @@ def save_results_to_json(filename, dataset_name, intent, algorithm, hyperparamet
     return json_data
 
 
-## hyperopt_preprocessing_class_mapping, hyperopt_algorithm_class_mapping and hyperopt_metric_class_mapping should be futher expanded based on the Knowlegde Base
-
-hyperopt_preprocessing_class_mapping = {
-    'Binarizer': binarizer("my_pre"),
-    'KBinsDiscretizer': k_bins_discretizer("my_pre"),
-    'MaxAbsScaler': max_abs_scaler("my_pre"),
-    'Normalizer': normalizer("my_pre"),
-    'MinMaxScaler': min_max_scaler("my_pre"),
-    'OneHotEncoder': one_hot_encoder("my_pre"),
-    'OrdinalEncoder': ordinal_encoder("my_pre"),
-    'PolynomialFeatures': polynomial_features("my_pre"),
-    'PowerTransformer': power_transformer("my_pre"),
-    'QuantileTransformer': quantile_transformer("my_pre"),
-    'RobustScaler': robust_scaler("my_pre"),
-    'SplineTransformer': spline_transformer("my_pre"),
-    'StandardScaler': standard_scaler("my_pre"),
-}
+## The search spaces of the preprocessing and algorithm constraints (utils/search_spaces.py) should be futher expanded based on the Knowlegde Base,
+## they are built on their first lookup only
+hyperopt_preprocessing_class_mapping = SearchSpaceRegistry(PREPROCESSING_SPACES)
 
-hyperopt_algorithm_class_mapping={
-    # classification:
-    "RandomForestClassifier" : random_forest_classifier("my-alg"),
-    "ExtraTreesClassifier":extra_trees_classifier("my-alg"),
-    "BaggingClassifier":bagging_classifier("my-alg"),
-    "AdaBoostClassifier":ada_boost_classifier("my-alg"),
-    "GradientBoostingClassifier":gradient_boosting_classifier("my-alg"),
-    "HistGradientBoostingClassifier":hist_gradient_boosting_classifier("my-alg"),
-    "BernoulliNB":bernoulli_nb("my-alg"),
-    "CategoricalNB":categorical_nb("my-alg"),
-    "ComplementNB":complement_nb("my-alg"),
-    "GaussianNB":gaussian_nb("my-alg"),
-    "MultinomialNB":multinomial_nb("my-alg"),
-    "SGDClassifier":sgd_classifier("my-alg"),
-    "SGDOneClassSVM":sgd_one_class_svm("my-alg"),
-    "RidgeClassifier":ridge_classifier("my-alg"),
-    "RidgeClassifierCV":ridge_classifier_cv("my-alg"),
-    "PassiveAggressiveClassifier":passive_aggressive_classifier("my-alg"),
-    "Perceptron":perceptron("my-alg"),
-    "DummyClassifier":dummy_classifier("my-alg"),
-    "GaussianProcessClassifier":gaussian_process_classifier("my-alg"),
-    "MLPClassifier":mlp_classifier("my-alg"),
-    "LinearSVC":linear_svc("my-alg"),
-    "NuSVC":nu_svc("my-alg"),
-    "SVC":svc("my-alg"),
-    "DecisionTreeClassifier":decision_tree_classifier("my-alg"),
-    "ExtraTreesClassifier":extra_tree_classifier("my-alg"),
-    "LabelPropagation":label_propagation("my-alg"),
-    "LabelSpreading":label_spreading("my-alg"),
-    "EllipticEnvelope":elliptic_envelope("my-alg"),
-    "LinearDiscriminantAnalysis":linear_discriminant_analysis("my-alg"),
-    "QuadraticDiscriminantAnalysis":quadratic_discriminant_analysis("my-alg"),
-    "BayesianGaussianMixture":bayesian_gaussian_mixture("my-alg"),
-    "GaussianMixture":gaussian_mixture("my-alg"),
-    "KNeighborsClassifier":k_neighbors_classifier("my-alg"),
-    "RadiusNeighborsClassifier":radius_neighbors_classifier("my-alg"),
-    "NearestCentroid":nearest_centroid("my-alg"),
-    # regression:
-    "RandomForestRegressor":random_forest_regressor("my-alg"),
-    "ExtraTreesRegressor":extra_trees_regressor("my-alg"),
-    "BaggingRegressor":bagging_regressor("my-alg"),
-    "IsolationForest":isolation_forest("my-alg"),
-    "AdaBoostRegressor":ada_boost_regressor("my-alg"),
-    "GradientBoostingRegressor":gradient_boosting_regressor("my-alg"),
-    "HistGradientBoostingRegressor":hist_gradient_boosting_regressor("my-alg"),
-    "LinearRegression":linear_regression("my-alg"),
-    "BayesianRidge":bayesian_ridge("my-alg"),
-    "ARDRegression":ard_regression("my-alg"),
-    "Lars":lars("my-alg"),
-    "LassoLars":lasso_lars("my-alg"),
-    "LarsCV":lars_cv("my-alg"),
-    "LassoLarsCV":lasso_lars_cv("my-alg"),
-    "LassoLarsIC":lasso_lars_ic("my-alg"),
-    "Lasso":lasso("my-alg"),
-    "ElasticNet":elastic_net("my-alg"),
-    "LassoCV":lasso_cv("my-alg"),
-    "ElasticNetCV":elastic_net_cv("my-alg"),
-    "MultiTaskLasso":multi_task_lasso("my-alg"),
-    "MultiTaskElasticNet":multi_task_elastic_net("my-alg"),
-    "MultiTaskLassoCV":multi_task_lasso_cv("my-alg"),
-    "MultiTaskElasticNetCV":multi_task_elastic_net_cv("my-alg"),
-    "PoissonRegressor":poisson_regressor("my-alg"),
-    "GammaRegressor":gamma_regressor("my-alg"),
-    "TweedieRegressor":tweedie_regressor("my-alg"),
-    "HuberRegressor":huber_regressor("my-alg"),
-    "SGDRegressor":sgd_regressor("my-alg"),
-    "Ridge":ridge("my-alg"),
-    "RidgeCV":ridge_cv("my-alg"),
-    "LogisticRegression":logistic_regression("my-alg"),
-    "LogisticRegressionCV":logistic_regression_cv("my-alg"),
-    "OrthogonalMatchingPursuit":orthogonal_matching_pursuit("my-alg"),
-    "OrthogonalMatchingPursuitCV":orthogonal_matching_pursuit_cv("my-alg"),
-    "PassiveAggressiveRegressor":passive_aggressive_regressor("my-alg"),
-    "QuantileRegressor":quantile_regression("my-alg"),
-    "RANSACRegressor":ransac_regression("my-alg"),
-    "TheilSenRegressor":theil_sen_regressor("my-alg"),
-    "DummyRegressor":dummy_regressor("my-alg"),
-    "GaussianProcessRegressor":gaussian_process_regressor("my-alg"),
-    "MLPRegressor":mlp_regressor("my-alg"),
-    "CCA":cca("my-alg"),
-    "PLSCanonical":pls_canonical("my-alg"),
-    "PLSRegression":pls_regression("my-alg"),
-    "NuSVR":nu_svr("my-alg"),
-    "OneClassSVM":one_class_svm("my-alg"),
-    "SVR":svr("my-alg"),
-    "DecisionTreeRegressor":decision_tree_regressor("my-alg"),
-    "ExtraTreesRegressor":extra_tree_regressor("my-alg"),
-    "TransformedTargetRegressor":transformed_target_regressor("my-alg"),
-    "KernelRidge":hp_sklearn_kernel_ridge("my-alg"),
-    "BayesianGaussianMixture":bayesian_gaussian_mixture("my-alg"),
-    "GaussianMixture":gaussian_mixture("my-alg"),
-    "KNeighborsRegressor":k_neighbors_regressor("my-alg"),
-    "RadiusNeighborsRegressor":radius_neighbors_regressor("my-alg"),
-    "KMeans":k_means("my-alg"),
-    "MiniBatchKMeans":mini_batch_k_means("my-alg")
-}
+hyperopt_algorithm_class_mapping = SearchSpaceRegistry(ALGORITHM_SPACES)
 
 hyperopt_metric_class_mapping = {
     'Accuracy': accuracy_score,
@@ -210,17 +128,89 @@ def hyperopt_map_loss_fn(metric):
     return None
 
 
-def save_plot_as_image(filename):
+def report_progress(progress, stage, fraction):
     """
-    Saves the current plot to a file with the specified filename and then closes the plot.
+    Reports the current stage of a search to the optional progress callback of the job running it.
     """
-    plt.savefig(filename)
-    plt.close()
+    if progress is not None:
+        progress(stage, fraction)
 
-def hyperopt_pipeline_generator(restrictions):
+def read_rung_schedule(restrictions):
     """
-    Generates and evaluates a Hyperopt ML pipeline based on given constraints, saves the results and visualizations, and returns file paths for the results.
+    Returns the rung schedule and eta of a multi-fidelity search ('rungs' and 'eta' restrictions),
+    or (None, None) if the request does not ask for one.
     """
+    rungs = restrictions.get('rungs')
+    if not rungs:
+        return None, None
+    eta = restrictions.get('eta')
+    return parse_rung_schedule(rungs), float(eta) if eta else DEFAULT_ETA
+
+def fit_hyperopt_estimator(estim, X_train, y_train, time_budget=None, early_stopping_rounds=None,
+                           workers=None, rungs=None, eta=DEFAULT_ETA, stratify=True, progress=None):
+    """
+    Fits a HyperoptEstimator, evaluating its trials on the available workers within the optional time budget.
+    With a rung schedule, the search runs in multi-fidelity mode and the report of its rungs is returned.
+    Every finished trial is published as an event of the job.
+    """
+    workers = workers or min(HYPEROPT_WORKERS, default_parallelism())
+    result_callback = hyperopt_trial_reporter(progress, estim)
+    if rungs:
+        return fit_hyperopt_successive_halving(estim, X_train, y_train, rungs, eta, stratify, parallelism=workers,
+                                               time_budget=time_budget, early_stopping_rounds=early_stopping_rounds,
+                                               result_callback=result_callback)
+    fit_parallel(estim, X_train, y_train, parallelism=workers, time_budget=time_budget,
+                 early_stopping_rounds=early_stopping_rounds, result_callback=result_callback)
+    return None
+
+def fit_tpot(tpot, restrictions, X_train, y_train, rungs=None, eta=DEFAULT_ETA, stratify=True, evaluation_cache=None):
+    """
+    Fits a TPOT estimator, checkpointing its population and evaluated pipelines per dataset (warm-started
+    from the last checkpoint with 'warmStart'). With a rung schedule, the search runs in multi-fidelity mode.
+    Pipelines already scored on the same data are taken from evaluation_cache (a TPOTEvaluationCache).
+    Returns the report of the rungs (or None) and of the checkpoint (or None without a dataset hash).
+    """
+    checkpointer = None
+    warm_start = is_warm_start(restrictions)
+    restored = None
+    path = search_checkpoint_path(restrictions)
+    if path:
+        checkpoint = load_checkpoint(path) if warm_start else None
+        if checkpoint is not None:
+            restored = restore_checkpoint(tpot, checkpoint)
+            print(f"Warm start from {path}: {restored} pipelines, {len(tpot.evaluated_individuals_)} already evaluated")
+        checkpointer = TPOTCheckpointer(tpot, path, generation=checkpoint['generations'] if checkpoint else 0)
+
+    multi_fidelity = None
+    if rungs:
+        multi_fidelity = fit_tpot_successive_halving(tpot, X_train, y_train, rungs, eta, stratify=stratify,
+                                                     evaluation_cache=evaluation_cache)
+    else:
+        tpot.fit(X_train, y_train)
+    reduce_tpot_memory()
+
+    if checkpointer is None:
+        return multi_fidelity, None
+    checkpointer.save()
+    return multi_fidelity, checkpointer.report(warm_start, restored)
+
+def save_best_model(restrictions, pipeline, **info):
+    """
+    Saves the best fitted pipeline of a search with the encoders of its dataset, if the job gave a model path.
+    """
+    path = restrictions.get('model_path')
+    if not path:
+        return None
+    encoder_file_path = encoder_path(restrictions.get('dataset'))
+    encoder = DatasetEncoder.load(encoder_file_path) if os.path.exists(encoder_file_path) else None
+    return save_model(path, pipeline, encoder, **info)
+
+def hyperopt_pipeline_generator(restrictions, progress=None):
+    """
+    Generates and evaluates a Hyperopt ML pipeline based on given constraints, saves the results, and returns them with the render spec of its visualizations.
+    """
+    from hpsklearn import HyperoptEstimator, any_classifier, any_preprocessing, any_regressor
+
     data_file_path = restrictions.get('dataset')
     intent = restrictions.get('intent')
     metric = restrictions.get('metric')
@@ -230,10 +220,12 @@ def hyperopt_pipeline_generator(restrictions):
     algorithm = restrictions.get('algorithm')
     preprocessingAlg = restrictions.get('preprocessingAlgorithm')
     time = restrictions.get('timeLimit')
+    time_budget = restrictions.get('timeBudget')
+    early_stopping_rounds = restrictions.get('earlyStoppingRounds')
+    output_dir = os.path.join(restrictions.get('results_dir') or 'results', 'hyperopt-results')
 
-    visualisation = ''
-
-    df = pd.read_csv(data_file_path)
+    report_progress(progress, 'loading data', 0.0)
+    df = load_preprocessed_dataset(data_file_path)
     X = df.iloc[:, :-1]
     y = df.iloc[:, -1]
     X_train, X_test, y_train, y_test = train_test_split(X, y, train_size=0.75, test_size=0.25, random_state=34)
@@ -257,7 +249,20 @@ def hyperopt_pipeline_generator(restrictions):
     else:
         timeLimit = 300 # default value
 
+    #timeBudget
+    if time_budget and time_budget!='':
+        time_budget = float(time_budget)
+        max_evals = HYPEROPT_BUDGET_MAX_EVALS
+        early_stopping_rounds = int(early_stopping_rounds) if early_stopping_rounds else HYPEROPT_EARLY_STOPPING_ROUNDS
+    else:
+        time_budget = None
+        max_evals = HYPEROPT_MAX_EVALS
+        early_stopping_rounds = int(early_stopping_rounds) if early_stopping_rounds else None
+
+    #multi-fidelity
+    rungs, eta = read_rung_schedule(restrictions)
     
+    report_progress(progress, 'searching', 0.1)
     if intent == 'classification':
          # algorithm
         alg = []
@@ -282,10 +287,12 @@ def hyperopt_pipeline_generator(restrictions):
             loss_fn=loss_fn,
             algo=tpe.suggest,
             trial_timeout = timeLimit,
-            max_evals=5
+            max_evals=max_evals,
+            seed=HYPEROPT_SEED
         )
         
-        estim.fit(X_train, y_train)
+        multi_fidelity = fit_hyperopt_estimator(estim, X_train, y_train, time_budget, early_stopping_rounds,
+                                                rungs=rungs, eta=eta, stratify=True, progress=progress)
         if not metric or metric=='':
             metric_name = "accuracy"
         else:
@@ -309,9 +316,11 @@ def hyperopt_pipeline_generator(restrictions):
                                 regressor=alg,
                                 loss_fn=mean_absolute_error, # default setting for regression
                                 algo=tpe.suggest,
-                                max_evals=5,
-                                trial_timeout=timeLimit, verbose=False)
-        estim.fit(X_train, y_train)
+                                max_evals=max_evals,
+                                trial_timeout=timeLimit, verbose=False,
+                                seed=HYPEROPT_SEED)
+        multi_fidelity = fit_hyperopt_estimator(estim, X_train, y_train, time_budget, early_stopping_rounds,
+                                                rungs=rungs, eta=eta, stratify=False, progress=progress)
         
         metric_name = "mae" # default setting for regression
 
@@ -319,11 +328,12 @@ def hyperopt_pipeline_generator(restrictions):
         print('Intent must be classification or regression')
         return
     
+    report_progress(progress, 'evaluating', 0.8)
     metric_value = estim.score(X_test, y_test)
     y_pred = estim.predict(X_test)
     pipeline = estim.best_model()
 
-    json_filename = f"results/hyperopt-results/pipelines/{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-result.json"
+    json_filename = f"{output_dir}/pipelines/{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-result.json"
     results_json = save_results_to_json(
         filename=json_filename,
         dataset_name=dataset_name,
@@ -337,208 +347,105 @@ def hyperopt_pipeline_generator(restrictions):
         pipeline={
             'preprocs': str(preprocessing_steps[0]).split('(')[0].split('\n')[0].split(" ")[1].split("_")[1] + "()" if preprocessing_steps else [],
             'learner': str(pipeline['learner']).split('(')[0] + "()"
-        }
+        },
+        budget=estim.trials.budget_report(),
+        multi_fidelity=multi_fidelity
     )
+    save_best_model(restrictions, make_pipeline(*pipeline['preprocs'], pipeline['learner']),
+                    kind='hyperopt', intent=intent, metric_name=metric_name, metric_value=metric_value)
 
-    if intent == 'classification':
-        visualisation = 'Confusion Matrix'
-        cm = confusion_matrix(y_test, y_pred)
-        sns.heatmap(cm, annot=True, cmap='Blues', fmt='d', cbar=False)
-        plt.xlabel('Predicted')
-        plt.ylabel('True')
-        plt.title('Confusion Matrix')
-        if os.path.exists('results/hyperopt-results/images'):
-            shutil.rmtree('results/hyperopt-results/images')
-        os.makedirs('results/hyperopt-results/images')
-        img_filename = f"results/hyperopt-results/images/{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-conf_matrix.png"
-        save_plot_as_image(img_filename)
-
-    elif intent == 'regression':
-        visualisation = 'Scatter Plot'
-        plt.figure(figsize=(8, 6))
-        plt.scatter(y_test, y_pred, color='blue', alpha=0.5)
-        plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'k--', lw=2)
-        plt.xlabel('Actual')
-        plt.ylabel('Predicted')
-        plt.title('Actual vs. Predicted Values')
-        if os.path.exists('results/hyperopt-results/images'):
-            shutil.rmtree('results/hyperopt-results/images')
-        os.makedirs('results/hyperopt-results/images')
-        img_filename = f"results/hyperopt-results/images/{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-scatter_plot.png"
-        save_plot_as_image(img_filename)
-
-    if not os.path.exists('results/hyperopt-results/dataflows'):
-        os.makedirs('results/hyperopt-results/dataflows')
-
-    graph_filename = f"results/hyperopt-results/dataflows/{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-dataflow"
-    graph = Digraph('DataFlow', filename=graph_filename)
-    graph.attr(rankdir='LR')
-
-    graph.node('Dataset', fillcolor='orange', label=f'Dataset:\n{dataset_name}.csv')
-    graph.node('Visualization', fillcolor='lightgreen', label=f'Visualization:\n{visualisation}')
-    algo = pipeline['learner']
-    algo_name = str(algo).split('(')[0]
-    graph.node('Algorithm', fillcolor='lightblue', label=f'Algorithm:\n{algo_name}')
-
-    if len(pipeline['preprocs']) != 0:
-        prepro = pipeline['preprocs'][0]
-        prepro_name = str(prepro).split('(')[0]
-        graph.node('Preprocessing', fillcolor='lightblue', label=f'Preprocessing:\n{prepro_name}')
-
-    if len(pipeline['preprocs']) != 0:
-        path = 'utils/template-4-dataflow.svg'
-        if os.path.exists(path):
-            graph_path = graph_filename + '.svg'
-            with open(path, "rt") as change:
-                data = change.read()
-                data = data.replace('dataset_name.csv', dataset_name + '.csv')
-                data = data.replace('methodX', prepro_name)
-                data = data.replace('Scatter Plot/Confusion Matrix', visualisation)
-                data = data.replace('Classifier/Regressor', algo_name)
-            with open(graph_path, "wt") as change:
-                change.write(data)
-        else:
-            print(f"The path '{path}' does not exist.")
-        graph.edge('Dataset', 'Preprocessing')
-        graph.edge('Preprocessing', 'Algorithm')
-        graph.edge('Algorithm', 'Visualization')
-    else:
-        path = 'utils/template-3-dataflow.svg'
-        if os.path.exists(path):
-            graph_path = graph_filename + '.svg'
-            with open(path, "rt") as change:
-                data = change.read()
-                data = data.replace('dataset_name.csv', dataset_name + '.csv')
-                data = data.replace('Scatter Plot/Confusion Matrix', visualisation)
-                data = data.replace('Classifier/Regressor', algo_name)
-            with open(graph_path, "wt") as change:
-                change.write(data)
-        else:
-            print(f"The path '{path}' does not exist.")
-        graph.edge('Dataset', 'Algorithm')
-        graph.edge('Algorithm', 'Visualization')
-
-    graph.save()
+    preprocessing_name = str(pipeline['preprocs'][0]).split('(')[0] if pipeline['preprocs'] else None
+    artifacts = plan_artifacts(output_dir, restrictions.get('job_id'), dataset_name, intent, y_test, y_pred,
+                               str(pipeline['learner']).split('(')[0], preprocessing_name)
 
-    return img_filename, graph_filename + '.svg', metric_name, metric_value, results_json
+    return artifacts, metric_name, metric_value, results_json
 
-def tpot_pipeline_generator(restrictions):
+def tpot_pipeline_generator(restrictions, progress=None):
     """
-    Generates and evaluates a TPOT pipeline based on the specified intent, saves the pipeline and results, and returns file paths for the results.
+    Generates and evaluates a TPOT pipeline based on the specified intent and constraints, saves the pipeline and results, and returns them with the render spec of its visualizations.
     """
+    from tpot import TPOTClassifier, TPOTRegressor
+    import nbformat as nbf
+
     data_file_path = restrictions.get('dataset')
     intent = restrictions.get('intent')
+    output_dir = os.path.join(restrictions.get('results_dir') or 'results', 'tpot-results')
 
-    df = pd.read_csv(data_file_path)
+    report_progress(progress, 'loading data', 0.0)
+    df = load_preprocessed_dataset(data_file_path)
 
     X = df.iloc[:, :-1]
     y = df.iloc[:, -1]
     X_train, X_test, y_train, y_test = train_test_split(X, y, train_size=0.75, test_size=0.25, random_state=34)
     dataset_name = os.path.basename(data_file_path).split('.')[0]
+    rungs, eta = read_rung_schedule(restrictions)
 
+    report_progress(progress, 'searching', 0.1)
+
+    # operators, scoring and time limit following the constraints of the request
+    settings = tpot_search_settings(restrictions)
 
     if intent == 'classification':
-        # Default settings
         tpot = TPOTClassifier(verbosity=3,
-                            scoring="balanced_accuracy",
                             random_state=23,
-                            n_jobs=-1,
+                            n_jobs=default_parallelism(),  # the cores of the job
                             generations=1,
-                            population_size=100)
-        tpot.fit(X_train, y_train)
-        metric_name = "accuracy"
+                            population_size=100,
+                            memory=tpot_memory(),
+                            **settings)
+        evaluation_cache = TPOTEvaluationCache(tpot) if EVALUATION_CACHE else None
+        TPOTEventReporter(tpot, progress)
+        multi_fidelity, checkpoint = fit_tpot(tpot, restrictions, X_train, y_train, rungs, eta, stratify=True,
+                                              evaluation_cache=evaluation_cache)
 
     if intent == 'regression':
-        # Default settings
         tpot = TPOTRegressor(verbosity=3,
-                            scoring="neg_mean_absolute_error",
                             random_state=23,
-                            n_jobs=-1,
+                            n_jobs=default_parallelism(),  # the cores of the job
                             generations=2,
-                            population_size=100)
-        tpot.fit(X_train, y_train)
-        metric_name = "mae"
-
+                            population_size=100,
+                            memory=tpot_memory(),
+                            **settings)
+        evaluation_cache = TPOTEvaluationCache(tpot) if EVALUATION_CACHE else None
+        TPOTEventReporter(tpot, progress)
+        multi_fidelity, checkpoint = fit_tpot(tpot, restrictions, X_train, y_train, rungs, eta, stratify=False,
+                                              evaluation_cache=evaluation_cache)
+
+    metric_name = METRIC_NAMES.get(settings['scoring'], settings['scoring'])
+    report_progress(progress, 'evaluating', 0.8)
     metric_value = tpot.score(X_test, y_test)
-
-    if not os.path.exists('results/tpot-results/pipelines'):
-        os.makedirs('results/tpot-results/pipelines')
-    tpot.export(f"results/tpot-results/pipelines/tpot_{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{intent}_pipeline.py")
-    with open(f"results/tpot-results/pipelines/tpot_{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{intent}_pipeline.py", 'r') as f:
+    save_best_model(restrictions, tpot.fitted_pipeline_,
+                    kind='tpot', intent=intent, metric_name=metric_name, metric_value=abs(metric_value))
+
+    # One timestamp for the exported pipeline and its notebook, so the notebook reads the file just written
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    if not os.path.exists(f'{output_dir}/pipelines'):
+        os.makedirs(f'{output_dir}/pipelines')
+    pipeline_path = f"{output_dir}/pipelines/tpot_{dataset_name}-{timestamp}-{intent}_pipeline.py"
+    tpot.export(pipeline_path)
+    with open(pipeline_path, 'r') as f:
         python_code = f.read()
 
     nb = nbf.v4.new_notebook()
     nb['cells'] = [nbf.v4.new_code_cell(python_code)]
 
-    if not os.path.exists('results/tpot-results/notebooks'):
-        os.makedirs('results/tpot-results/notebooks')
-    notebook_path = f"results/tpot-results/notebooks/tpot_{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{intent}_pipeline.ipynb"
+    if not os.path.exists(f'{output_dir}/notebooks'):
+        os.makedirs(f'{output_dir}/notebooks')
+    notebook_path = f"{output_dir}/notebooks/tpot_{dataset_name}-{timestamp}-{intent}_pipeline.ipynb"
     with open(notebook_path, 'w') as f:
         nbf.write(nb, f)
 
     y_pred = tpot.predict(X_test)
     exctracted_best_model = tpot.fitted_pipeline_.steps[-1][1]
 
-    if intent == 'classification':
-        visualisation = 'Confusion Matrix'
-        cm = confusion_matrix(y_test, y_pred)
-        sns.heatmap(cm, annot=True, cmap='Blues', fmt='d', cbar=False)
-        plt.xlabel('Predicted')
-        plt.ylabel('True')
-        plt.title('Confusion Matrix')
-        if os.path.exists('results/tpot-results/images'):
-            shutil.rmtree('results/tpot-results/images')
-        os.makedirs('results/tpot-results/images')
-        img_filename = f"results/tpot-results/images/{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-conf_matrix.png"
-        save_plot_as_image(img_filename)
-
-    elif intent == 'regression':
-        visualisation = 'Scatter Plot'
-        plt.figure(figsize=(8, 6))
-        plt.scatter(y_test, y_pred, color='blue', alpha=0.5)
-        plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'k--', lw=2)
-        plt.xlabel('Actual')
-        plt.ylabel('Predicted')
-        plt.title('Actual vs. Predicted Values')
-        if os.path.exists('results/tpot-results/images'):
-            shutil.rmtree('results/tpot-results/images')
-        os.makedirs('results/tpot-results/images')
-        img_filename = f"results/tpot-results/images/{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-scatter_plot.png"
-        save_plot_as_image(img_filename)
+    if intent == 'regression':
         metric_value = abs(metric_value)
+    artifacts = plan_artifacts(output_dir, restrictions.get('job_id'), dataset_name, intent, y_test, y_pred,
+                               str(exctracted_best_model).split('(')[0])
 
-    if not os.path.exists('results/tpot-results/dataflows'):
-        os.makedirs('results/tpot-results/dataflows')
-
-    graph_filename = f"results/tpot-results/dataflows/{dataset_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}-dataflow"
-    graph = Digraph('DataFlow', filename=graph_filename)
-    graph.attr(rankdir='LR')
-
-    graph.node('Dataset', fillcolor='orange', label=f'Dataset:\n{dataset_name}.csv')
-    graph.node('Visualization', fillcolor='lightgreen', label=f'Visualization:\n{visualisation}')
-
-    algo = exctracted_best_model
-    algo_name = str(algo).split('(')[0]
-    graph.node('Algorithm', fillcolor='lightblue', label=f'Algorithm:\n{algo_name}')
-
-    path = 'utils/template-3-dataflow.svg'
-    if os.path.exists(path):
-        graph_path = graph_filename + '.svg'
-        with open(path, "rt") as change:
-            data = change.read()
-            data = data.replace('dataset_name.csv', dataset_name + '.csv')
-            data = data.replace('Scatter Plot/Confusion Matrix', visualisation)
-            data = data.replace('Classifier/Regressor', algo_name)
-        with open(graph_path, "wt") as change:
-            change.write(data)
-    else:
-        print(f"The path '{path}' does not exist.")
-        graph.edge('Dataset', 'Algorithm')
-        graph.edge('Algorithm', 'Visualization')
-
-    graph.save()
-
-    return img_filename, graph_filename + '.svg', metric_name, metric_value
+    search = describe_settings(settings)
+    search['evaluation_cache'] = evaluation_cache.stats() if evaluation_cache is not None else None
+    return artifacts, metric_name, metric_value, multi_fidelity, checkpoint, search
 
 # if __name__ == "__main__":
 #     if len(sys.argv) != 2:
@@ -0,0 +1,240 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.events import EventHub
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMED_OUT = 'timed_out'  # stopped on reaching the time limit of the jobs
+
+# Why a job was stopped, and the state it ends in
+STOP_STATES = {'cancel': CANCELLED, 'time_limit': TIMED_OUT}
+
+MAX_FINISHED_JOBS = 200  # finished jobs kept in memory for polling
+
+
+class JobProgress:
+    """
+    Progress callback of a job: progress(stage, fraction) updates its progress, progress.event(event_type,
+    data) publishes an event of its search. Both are published on the event stream of the job.
+    stop_requested is set once the job is asked to stop (cancelled or out of time), and cores holds
+    the ids of the cores the job runs on (None without a core scheduler).
+    """
+
+    def __init__(self, manager, job):
+        self.manager = manager
+        self.job = job
+        self.stop_requested = threading.Event()
+        self.stop_reason = None
+        self.cores = None
+
+    def stop(self, reason):
+        """Asks the job to stop ('cancel' or 'time_limit'), unless it already was."""
+        if self.stop_requested.is_set():
+            return
+        self.stop_reason = reason
+        self.stop_requested.set()
+        self.manager.events.publish(self.job['id'], 'stopping', {'reason': reason})
+
+    def __call__(self, stage, fraction):
+        progress = {'stage': stage, 'fraction': round(fraction, 3)}
+        with self.manager.lock:
+            self.job['progress'] = progress
+        self.manager.events.publish(self.job['id'], 'progress', dict(progress))
+
+    def event(self, event_type, data):
+        self.manager.events.publish(self.job['id'], event_type, data)
+
+
+class JobManager:
+    """
+    Runs AutoML searches in the background on a bounded pool of workers.
+
+    Submitting returns immediately with a job id; the job record can then be polled for its
+    status, progress and result, or its events (state changes, progress and the events of its
+    search) followed on self.events. Jobs exceeding the pool size wait in a FIFO queue.
+
+    A job can be cancelled, and is stopped once it has run for time_limit seconds (if given): it then
+    ends as cancelled or timed out, with its best-so-far result when the search had one.
+
+    With a scheduler (a CoreScheduler), every submitted job gets cores_per_job cores (or the number
+    it asks for) of its own, and stays queued until they are free.
+    """
+
+    def __init__(self, max_workers=2, time_limit=None, scheduler=None, cores_per_job=None):
+        self.max_workers = max_workers
+        self.time_limit = time_limit
+        self.scheduler = scheduler
+        self.cores_per_job = cores_per_job
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='automl-job')
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.running = {}  # progress callback of the running jobs, by job id
+        self.finished = deque()
+        self.wait_times = deque(maxlen=100)
+        self.events = EventHub()
+
+    def submit(self, kind, fn, *args, cores=None, **kwargs):
+        """
+        Queues fn(*args, progress=callback, job_id=id, **kwargs) and returns the new job record. With a
+        scheduler, the job gets the number of cores given (default is cores_per_job).
+        """
+        job = self._new_job(kind, args, kwargs)
+        if self.scheduler is not None:
+            job['slots'] = self.scheduler.slots(cores or self.cores_per_job)
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return self.snapshot(job['id'])
+
+    def run_inline(self, kind, fn, *args, **kwargs):
+        """
+        Runs fn like submit but at once in the calling thread, for jobs that do not need a worker
+        (e.g. a cached result), and returns the finished job record.
+        """
+        job = self._new_job(kind, args, kwargs)
+        self._run(job, fn, args, kwargs)
+        return self.snapshot(job['id'])
+
+    def _new_job(self, kind, args=(), kwargs=None):
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'args': args,  # kept so an interrupted job can be resubmitted
+            'kwargs': kwargs or {},
+            'status': QUEUED,
+            'progress': {'stage': 'queued', 'fraction': 0.0},
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'slots': None,  # number of cores of the job, and their ids once it runs
+            'cores': None,
+            'result': None,
+            'error': None
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+        self.events.publish(job_id, 'status', {'status': QUEUED, 'kind': kind})
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        progress = JobProgress(self, job)
+        if job['slots']:
+            # The job stays queued until its cores are free
+            progress.cores = self.scheduler.acquire(job['slots'], cancelled=lambda: job['status'] == CANCELLED)
+        try:
+            self._execute(job, fn, args, kwargs, progress)
+        finally:
+            if progress.cores:
+                self.scheduler.release(progress.cores)
+
+    def _execute(self, job, fn, args, kwargs, progress):
+        with self.lock:
+            if job['status'] == CANCELLED:  # cancelled while queued
+                return
+            job['status'] = RUNNING
+            job['cores'] = progress.cores
+            job['started_at'] = time.time()
+            self.wait_times.append(job['started_at'] - job['submitted_at'])
+            self.running[job['id']] = progress
+        self.events.publish(job['id'], 'status', {'status': RUNNING})
+
+        timer = None
+        if self.time_limit:
+            timer = threading.Timer(self.time_limit, progress.stop, args=('time_limit',))
+            timer.daemon = True
+            timer.start()
+        try:
+            result = fn(*args, progress=progress, job_id=job['id'], **kwargs)
+            with self.lock:
+                if progress.stop_reason:
+                    job['result'] = dict(result, partial=True) if isinstance(result, dict) else result
+                    job['status'] = STOP_STATES[progress.stop_reason]
+                else:
+                    job['result'] = result
+                    job['status'] = FINISHED
+                job['progress'] = {'stage': 'done', 'fraction': 1.0}
+        except Exception as e:
+            traceback.print_exc()
+            with self.lock:
+                job['error'] = str(e)
+                job['status'] = STOP_STATES[progress.stop_reason] if progress.stop_reason else FAILED
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with self.lock:
+                self.running.pop(job['id'], None)
+            self._finish(job)
+
+    def _finish(self, job):
+        with self.lock:
+            job['finished_at'] = time.time()
+            self.finished.append(job['id'])
+            while len(self.finished) > MAX_FINISHED_JOBS:
+                self.jobs.pop(self.finished.popleft(), None)
+        self.events.publish(job['id'], 'status', {'status': job['status'], 'error': job['error']})
+        self.events.close(job['id'])
+
+    def cancel(self, job_id):
+        """
+        Cancels a job: a queued job never runs, a running one is stopped and ends with its best-so-far
+        result. Returns the job record, or None if the job is unknown.
+
+        Raises:
+        - ValueError: If the job has already ended.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] == QUEUED:
+                job['status'] = CANCELLED
+                job['error'] = 'The job was cancelled before it started.'
+                progress = None
+            elif job['status'] == RUNNING:
+                progress = self.running.get(job_id)
+            else:
+                raise ValueError(f"The job has already ended, it is {job['status']}.")
+        if job['status'] == CANCELLED:
+            self._finish(job)
+            if self.scheduler is not None:
+                self.scheduler.wake()
+        elif progress is not None:
+            progress.stop('cancel')
+        return self.snapshot(job_id)
+
+    def snapshot(self, job_id):
+        """Returns a copy of the job record, or None if the job is unknown."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def metrics(self):
+        """Returns queue length, running jobs and wait-time statistics of the pool."""
+        with self.lock:
+            statuses = [job['status'] for job in self.jobs.values()]
+            waits = list(self.wait_times)
+            now = time.time()
+            queued_waits = [now - job['submitted_at'] for job in self.jobs.values() if job['status'] == QUEUED]
+
+        return {
+            'workers': self.max_workers,
+            'queue_length': statuses.count(QUEUED),
+            'running': statuses.count(RUNNING),
+            'finished': statuses.count(FINISHED),
+            'failed': statuses.count(FAILED),
+            'cancelled': statuses.count(CANCELLED),
+            'timed_out': statuses.count(TIMED_OUT),
+            'time_limit': self.time_limit,
+            'cores': self.scheduler.stats() if self.scheduler is not None else None,
+            'average_wait_seconds': round(sum(waits) / len(waits), 3) if waits else 0.0,
+            'max_wait_seconds': round(max(waits), 3) if waits else 0.0,
+            'oldest_queued_seconds': round(max(queued_waits), 3) if queued_waits else 0.0
+        }
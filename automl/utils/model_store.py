@@ -0,0 +1,90 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+# The best fitted pipeline of every search is saved with the encoders of its dataset, so raw rows can be
+# scored without refitting anything: <results_dir>/models/<job_id>.joblib
+MODELS_FOLDER = 'models'
+MODEL_EXTENSION = '.joblib'
+
+
+def model_path(results_dir, job_id):
+    """
+    Returns the path of the model saved by a job.
+    """
+    return os.path.join(results_dir, MODELS_FOLDER, job_id + MODEL_EXTENSION)
+
+
+def save_model(path, pipeline, encoder, **info):
+    """
+    Serializes a fitted pipeline and the encoders of its training data with joblib (atomic write).
+    """
+    import joblib
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    joblib.dump({'pipeline': pipeline, 'encoder': encoder, 'info': info}, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+class ModelCache:
+    """
+    Size-bounded LRU cache of deserialized models, so repeated scoring calls skip loading them.
+
+    The size of a model is estimated by the size of its file; least recently used models are
+    dropped whenever the cache grows over max_bytes. A model file replaced on disk is reloaded.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.models = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path):
+        """
+        Returns the saved model at path, loading it on a cache miss.
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns)
+        with self.lock:
+            if key in self.models:
+                self.hits += 1
+                self.models.move_to_end(key)
+                return self.models[key][1]
+            self.misses += 1
+
+        import joblib
+        model = joblib.load(path)
+        with self.lock:
+            if key not in self.models:
+                self.models[key] = (stat.st_size, model)
+                self.size += stat.st_size
+                self._evict()
+        return model
+
+    def _evict(self):
+        # The most recently loaded model is kept even if it is larger than the cache on its own
+        while self.size > self.max_bytes and len(self.models) > 1:
+            _, (model_size, _) = self.models.popitem(last=False)
+            self.size -= model_size
+            self.evictions += 1
+
+    def stats(self):
+        """Returns the size and hit-rate statistics of the cache."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'models': len(self.models),
+                'size_bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,409 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from functools import partial
+
+import numpy as np
+from hyperopt import STATUS_FAIL, STATUS_OK, Trials, base
+from hyperopt.pyll import scope
+from hyperopt.utils import coarse_utcnow
+
+from utils.evaluation_cache import cached_hyperopt_result, hyperopt_cache, hyperopt_pipeline
+
+# Trials are started by a forkserver: forking the worker itself, once its searches have run threaded
+# native code (OpenMP, BLAS), could deadlock the children. The forkserver is a single-threaded process
+# with the heavy modules already imported, so starting a trial stays cheap. The objective and the
+# arguments of a trial are pickled, the data is memory-mapped instead (see hyperopt_objective).
+mp_context = multiprocessing.get_context('forkserver')
+mp_context.set_forkserver_preload(['hpsklearn', 'utils.parallel_trials'])
+
+# TPE counts the past observations of a weighted choice with np.bincount(..., minlength=None) when none
+# of its candidates take the branch of the choice, which numpy 2 rejects: in the hpsklearn spaces, the
+# suggestions after the first n_startup_jobs (20) random trials failed. minlength=0 means the same thing.
+_hyperopt_bincount = scope._impls['bincount']
+
+
+def bincount(x, offset=0, weights=None, minlength=None, p=None):
+    return _hyperopt_bincount(x, offset, weights, 0 if minlength is None else minlength, p)
+
+
+scope.undefine('bincount')
+scope.define_pure(bincount)
+
+
+def default_parallelism():
+    """
+    Returns the number of CPUs the current process may run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _call_in_child(fn, args, conn, cores):
+    # The forkserver may have been started during another job, on other cores
+    if cores is not None:
+        from threadpoolctl import threadpool_limits
+
+        os.sched_setaffinity(0, cores)
+        threadpool_limits(limits=len(cores))
+    try:
+        conn.send(('return', fn(*args)))
+    except Exception as e:
+        conn.send(('raise', f'{type(e).__name__}: {str(e)}'))
+    finally:
+        conn.close()
+
+
+def evaluate_in_child(fn, args, timeout=None, processes=None):
+    """
+    Runs fn(*args) in a child process started by the forkserver (fn and args must be picklable), on
+    the cores of the calling process, and returns ('return', value), ('raise', message), or
+    ('timeout', None) after killing the child if it did not finish within timeout seconds.
+    The child is in the set processes, if given, while it runs.
+    """
+    cores = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else None
+    parent_conn, child_conn = mp_context.Pipe(duplex=False)
+    process = mp_context.Process(target=_call_in_child, args=(fn, args, child_conn, cores))
+    try:
+        process.start()
+    except Exception as e:
+        parent_conn.close()
+        return 'raise', f'The trial process could not be started: {type(e).__name__}: {str(e)}'
+    finally:
+        child_conn.close()
+    if processes is not None:
+        processes.add(process)
+    try:
+        if parent_conn.poll(timeout):
+            return parent_conn.recv()
+        process.terminate()
+        return 'timeout', None
+    except EOFError:
+        return 'raise', f'Process exited with code {process.exitcode}'
+    finally:
+        process.join()
+        parent_conn.close()
+        if processes is not None:
+            processes.discard(process)
+
+
+class ParallelTrials(Trials):
+    """
+    Local process-pool Trials backend, in the style of hyperopt's SparkTrials and MongoTrials but
+    without any external service.
+
+    hyperopt.fmin hands the search over to ParallelTrials.fmin, which keeps up to `parallelism`
+    TPE suggestions in flight at once. Every trial is evaluated in its own process (so a trial
+    exceeding trial_timeout can be killed), which receives the domain pickled, and the results are collected back in the calling thread. When the search is interrupted
+    (KeyboardInterrupt, e.g. its job is cancelled), the running trials are killed and it ends with the
+    results it has.
+    """
+
+    def __init__(self, parallelism=None, trial_timeout=None, result_callback=None):
+        super().__init__()
+        self.parallelism = max(1, int(parallelism or default_parallelism()))
+        self.trial_timeout = trial_timeout
+        # Called in the calling thread with (trial, result) as soon as a trial finishes
+        self.result_callback = result_callback
+        # Trial ids in the order the trials finished, and when each ran (seconds since the search started)
+        self.completed = []
+        self.timings = {}
+        self.time_budget = None
+        self.elapsed = 0.0
+        self.stopped_by = None
+        self.processes = set()  # processes of the running trials
+
+    def _evaluate(self, domain, spec, ctrl, trial_timeout):
+        """
+        Runs one trial in a child process and waits for its result (runs on a dispatcher thread).
+        The trial does not get ctrl, which holds the Trials object: it cannot be pickled.
+        """
+        rtype, rval = evaluate_in_child(domain.evaluate, (spec, None, False), trial_timeout, self.processes)
+        if rtype == 'timeout':
+            return {'status': STATUS_FAIL, 'failure': 'TimeOut'}
+        if rtype == 'raise':
+            return {'status': STATUS_FAIL, 'failure': rval}
+        return rval
+
+    def fmin(self, fn, space, algo, max_evals, timeout=None, loss_threshold=None, rstate=None,
+             early_stop_fn=None, return_argmin=True, **kwargs):
+        """
+        Runs the search; called by hyperopt.fmin(..., trials=ParallelTrials(...)).
+
+        timeout is a budget for the whole search: no trial is started once it is spent, and every
+        trial is given at most the remaining budget, so the search ends on time.
+        """
+        domain = base.Domain(fn, space, pass_expr_memo_ctrl=kwargs.get('pass_expr_memo_ctrl'))
+        rstate = rstate if rstate is not None else np.random.default_rng()
+        start_time = time.time()
+        self.time_budget = timeout
+        early_stop_args = []
+        n_queued = len(self._dynamic_trials)
+        running = {}
+        stopped = False
+
+        def remaining():
+            return float('inf') if timeout is None else timeout - (time.time() - start_time)
+
+        with ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix='hyperopt-trial') as pool:
+            while True:
+                try:
+                    if not stopped and n_queued >= max_evals:
+                        stopped, self.stopped_by = True, 'max_evals'
+                    if not stopped and remaining() <= 0:
+                        stopped, self.stopped_by = True, 'time_budget'
+
+                    # Keep the pool full with new suggestions, based on all the results known so far
+                    while not stopped and len(running) < self.parallelism and n_queued < max_evals:
+                        n_new = min(self.parallelism - len(running), max_evals - n_queued)
+                        new_ids = self.new_trial_ids(n_new)
+                        self.refresh()
+                        try:
+                            new_trials = algo(new_ids, domain, self, rstate.integers(2 ** 31 - 1))
+                        except Exception as e:
+                            # The search ends with the trials it has, the running ones finish
+                            print(f'Hyperopt could not suggest new trials: {type(e).__name__}: {str(e)}')
+                            stopped, self.stopped_by = True, 'suggest_failed'
+                            break
+                        if not new_trials:
+                            stopped, self.stopped_by = True, 'search_space_exhausted'
+                            break
+                        self.insert_trial_docs(new_trials)
+                        self.refresh()
+                        n_queued += len(new_trials)
+
+                        trial_timeout = min(self.trial_timeout or float('inf'), remaining())
+                        if trial_timeout == float('inf'):
+                            trial_timeout = None
+                        for trial in self._dynamic_trials[-len(new_trials):]:
+                            trial['state'] = base.JOB_STATE_RUNNING
+                            trial['book_time'] = trial['refresh_time'] = coarse_utcnow()
+                            spec = base.spec_from_misc(trial['misc'])
+                            ctrl = base.Ctrl(self, current_trial=trial)
+                            self.timings[trial['tid']] = {
+                                'start': time.time() - start_time,
+                                'timeout': trial_timeout
+                            }
+                            running[pool.submit(self._evaluate, domain, spec, ctrl, trial_timeout)] = trial
+
+                    if not running:
+                        break
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        trial = running.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:  # the trial is recorded as failed, the search goes on
+                            result = {'status': STATUS_FAIL, 'failure': f'{type(e).__name__}: {str(e)}'}
+                        self.timings[trial['tid']]['end'] = time.time() - start_time
+                        self.completed.append(trial['tid'])
+                        if self.result_callback is not None:
+                            self.result_callback(trial, result)
+                        trial['state'] = base.JOB_STATE_DONE
+                        trial['result'] = result
+                        trial['refresh_time'] = coarse_utcnow()
+                    self.refresh()
+
+                    # Stop queueing new trials once a stopping condition is met, the running ones finish
+                    losses = [loss for loss in self.losses() if loss is not None]
+                    if not stopped and loss_threshold is not None and losses and min(losses) < loss_threshold:
+                        stopped, self.stopped_by = True, 'loss_threshold'
+                    if not stopped and early_stop_fn is not None:
+                        stop, early_stop_args = early_stop_fn(self, *early_stop_args)
+                        if stop:
+                            stopped, self.stopped_by = True, 'early_stopping'
+                except KeyboardInterrupt:
+                    # The search is stopped: the running trials are killed, it ends with the results so far
+                    stopped, self.stopped_by = True, 'interrupted'
+                    for process in list(self.processes):
+                        process.terminate()
+
+        self.elapsed = time.time() - start_time
+        if return_argmin and len(self.trials) and any(r['status'] == STATUS_OK for r in self.results):
+            return self.argmin
+        return None
+
+    def budget_report(self):
+        """
+        Returns how the time of the search was spent, trial by trial in the order they finished.
+        """
+        trials = {trial['tid']: trial for trial in self.trials}
+        report = []
+        for tid in self.completed:
+            result = trials[tid]['result'] if tid in trials else {}
+            timing = self.timings[tid]
+            report.append({
+                'trial': tid,
+                'status': result.get('status'),
+                'loss': result.get('loss'),
+                'failure': result.get('failure'),
+                'cached': result.get('cached', False),
+                'start': round(timing['start'], 3),
+                'duration': round(timing['end'] - timing['start'], 3),
+                'timeout': round(timing['timeout'], 3) if timing['timeout'] is not None else None
+            })
+        return {
+            'time_budget': self.time_budget,
+            'elapsed': round(self.elapsed, 3),
+            'stopped_by': self.stopped_by,
+            'trials_run': len(report),
+            'trials_failed': sum(1 for trial in report if trial['status'] != STATUS_OK),
+            'trials_cached': sum(1 for trial in report if trial['cached']),
+            'time_in_failed_trials': round(sum(trial['duration'] for trial in report if trial['status'] != STATUS_OK), 3),
+            'trials': report
+        }
+
+
+def no_improvement_stop(rounds):
+    """
+    Returns an early_stop_fn for ParallelTrials.fmin stopping the search after `rounds` finished
+    trials (failed ones included) without improving the best loss.
+    """
+    def stop_fn(trials, best_loss=float('inf'), n_seen=0, without_improvement=0):
+        results = {trial['tid']: trial['result'] for trial in trials.trials}
+        for tid in trials.completed[n_seen:]:
+            result = results.get(tid, {})
+            if result.get('status') == STATUS_OK and result['loss'] < best_loss:
+                best_loss = result['loss']
+                without_improvement = 0
+            else:
+                without_improvement += 1
+        return without_improvement >= rounds, [best_loss, len(trials.completed), without_improvement]
+
+    return stop_fn
+
+
+class _Connection:
+    """Collects the result hyperopt-sklearn's cost function reports through a pipe."""
+
+    def send(self, message):
+        self.message = message
+
+
+def _info(verbose, *args):
+    if verbose:
+        print(" ".join(map(str, args)))
+
+
+class HyperoptObjective:
+    """
+    Objective of a HyperoptEstimator, picklable so that its trials can run in other processes: fits
+    and scores a configuration of the search space with hyperopt-sklearn's cost function on the data
+    saved at data_path, which every trial memory-maps. best_loss is the best loss of the search when
+    the objective is pickled for a trial.
+    """
+
+    def __init__(self, estimator, data_path, valid_size, cache):
+        self.data_path = data_path
+        self.valid_size = valid_size
+        self.cache = cache
+        self.best_loss = estimator._best_loss
+        self.n_jobs = estimator.n_jobs
+        self.cost_fn_kwargs = dict(use_partial_fit=estimator.use_partial_fit,
+                                   info=partial(_info, estimator.verbose),
+                                   timeout=estimator.trial_timeout, loss_fn=estimator.loss_fn,
+                                   continuous_loss_fn=estimator.continuous_loss_fn, n_jobs=estimator.n_jobs)
+
+    def __call__(self, config):
+        import joblib
+        from hpsklearn.estimator._cost_fn import _cost_fn
+
+        if self.cache is not None:
+            pipeline, params = hyperopt_pipeline(config)
+            entry = self.cache.get(pipeline, params)
+            if entry is not None:
+                return cached_hyperopt_result(config, entry, self.n_jobs)
+
+        X, y = joblib.load(self.data_path, mmap_mode='r')
+        conn = _Connection()
+        _cost_fn(config, X=X, y=y, valid_size=self.valid_size, _conn=conn, best_loss=self.best_loss,
+                 **self.cost_fn_kwargs)
+        rtype, rval = conn.message
+        if rtype == 'raise':
+            raise rval
+        if self.cache is not None and rval.get('status') == STATUS_OK:
+            self.cache.put(pipeline, params, loss=rval['loss'], loss_variance=rval.get('loss_variance'),
+                           fit_seconds=rval['duration'])
+        return rval
+
+
+@contextmanager
+def hyperopt_objective(estimator, X, y, valid_size=.2):
+    """
+    Yields the objective of a HyperoptEstimator (a HyperoptObjective): fits and scores a configuration
+    of its search space on X, y, holding out valid_size of the data. Configurations already evaluated
+    on the same data are scored from the evaluation cache instead. X, y are saved to a temporary
+    file for the trials, removed on exit.
+    """
+    import joblib
+
+    directory = tempfile.mkdtemp(prefix='automl-trials-')
+    try:
+        data_path = os.path.join(directory, 'data.joblib')
+        joblib.dump((X, y), data_path)
+        yield HyperoptObjective(estimator, data_path, valid_size, hyperopt_cache(estimator, X, y, valid_size))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def set_best_model(estimator, result):
+    """
+    Makes the fitted model of a successful trial result the best model of the estimator. The large
+    objects are popped from the result so the Trials object stays small.
+    """
+    estimator._best_preprocs = result.pop('preprocs')
+    estimator._best_ex_preprocs = result.pop('ex_preprocs')
+    estimator._best_learner = result.pop('learner')
+    estimator._best_iters = result.pop('iterations')
+    estimator._best_loss = float(result['loss'])
+
+
+def fit_parallel(estimator, X, y, parallelism=None, valid_size=.2, result_callback=None,
+                 time_budget=None, early_stopping_rounds=None, refit=True):
+    """
+    Fits a hyperopt-sklearn HyperoptEstimator with its trials evaluated in parallel by ParallelTrials.
+
+    The estimator keeps working as after HyperoptEstimator.fit: its best model is refitted on the
+    full data (unless refit is False) and estimator.trials holds the trials of the search.
+    result_callback, if given, is called with (trial, result) whenever a trial finishes. With a
+    time_budget (seconds), the search runs as many of the estimator's max_evals trials as fit in it;
+    with early_stopping_rounds, it stops after that many trials without improvement.
+    """
+    estimator._init()
+    if not isinstance(X, np.ndarray):
+        X = np.array(X)
+    if not isinstance(y, np.ndarray):
+        y = np.array(y)
+
+    with hyperopt_objective(estimator, X, y, valid_size) as objective:
+        def record_best(trial, result):
+            if result_callback is not None:
+                result_callback(trial, result)
+            if result.get('status') != STATUS_OK:
+                return
+            if float(result['loss']) < estimator._best_loss:
+                set_best_model(estimator, result)
+                objective.best_loss = estimator._best_loss
+            else:
+                for key in ('preprocs', 'ex_preprocs', 'learner', 'iterations'):
+                    result.pop(key)
+
+        estimator.trials = ParallelTrials(parallelism=parallelism, trial_timeout=estimator.trial_timeout,
+                                          result_callback=record_best)
+        estimator.trials.fmin(objective, estimator.space,
+                              algo=estimator.algo, max_evals=estimator.max_evals,
+                              timeout=time_budget, rstate=estimator.rstate, return_argmin=False,
+                              early_stop_fn=no_improvement_stop(early_stopping_rounds) if early_stopping_rounds else None)
+
+    if estimator._best_learner is None:
+        raise RuntimeError("All trials failed or timed out. \n"
+                           f"Result of last trial: {estimator.trials.trials[-1]['result']}")
+    if refit and estimator.refit:
+        estimator._retrain_best_model_on_full_data(X, y)
+    return estimator
@@ -1,57 +1,171 @@
-from sklearn.preprocessing import LabelEncoder
-from sklearn.preprocessing import StandardScaler
 import os
 import pandas as pd
-import numpy as np
 import json
+import pyarrow as pa
+import pyarrow.feather as feather
+from utils import dtype_planner
+from utils.dataset_encoder import DatasetEncoder, ENCODER_EXTENSION
 
+# Bump whenever the output of preprocess_dataset changes, so cached preprocessed datasets are not reused
+PREPROCESSING_VERSION = 4
 
-def preprocess_dataset(data_file_path):
+# Preprocessed datasets are stored as uncompressed Feather (Arrow IPC) files: exact dtypes, no text
+# formatting and parsing, and they can be memory-mapped when loaded. CSV is only an export format.
+PREPROCESSED_EXTENSION = '.feather'
+
+
+class EmptyDatasetError(ValueError):
+    """The uploaded dataset has no rows (or no columns) to preprocess."""
+
+
+def preprocessed_dataset_path(output_dir, dataset_file_name):
     """
-    Loads, preprocesses the dataset by encoding categorical variables and scaling features, then saves the processed data to a new CSV file.
+    Returns the path of the preprocessed version of an uploaded dataset.
     """
-    file_name = os.path.basename(data_file_path)     
-    df = pd.read_csv(data_file_path)
-    df.rename(columns={df.columns[-1]: 'target'}, inplace=True)
-    
-    categorical_columns = df.select_dtypes(include=['object']).columns
-    for column in categorical_columns:
-            df[column] = LabelEncoder().fit_transform(df[column])
-
-    X = df.iloc[:, :-1]
-    y = df.iloc[:, -1]
-    StandardScalerModel = StandardScaler()
-    X = StandardScalerModel.fit_transform(X)
-
-    data = np.column_stack((X, y))
-    column_names = df.columns
-    res = pd.DataFrame(data,columns =column_names)
-    for column in res.columns:
-        res[column] = pd.to_numeric(res[column])
-    
-    preprocessed_file_path = f'data/preprocessed/{file_name}'
-    if not os.path.exists('data/preprocessed'):
-            os.makedirs('data/preprocessed')
+    base_name = os.path.basename(dataset_file_name).rsplit('.', 1)[0]
+    return os.path.join(output_dir, base_name + PREPROCESSED_EXTENSION)
+
+
+def encoder_path(preprocessed_file_path):
+    """
+    Returns the path of the fitted encoders saved next to a preprocessed dataset.
+    """
+    return preprocessed_file_path.rsplit('.', 1)[0] + ENCODER_EXTENSION
+
+
+def load_encoder(preprocessed_file_path):
+    """
+    Loads the encoders fitted when preprocessing a dataset, to replay the same transform on new data.
+    """
+    return DatasetEncoder.load(encoder_path(preprocessed_file_path))
+
+
+def load_preprocessed_dataset(preprocessed_file_path):
+    """
+    Loads a preprocessed dataset as a DataFrame, memory-mapping the file (CSV files are still read).
+    """
+    if preprocessed_file_path.endswith('.csv'):
+        return dtype_planner.read_csv_planned(preprocessed_file_path)
+    table = feather.read_table(preprocessed_file_path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def export_preprocessed_csv(preprocessed_file_path, csv_file_path):
+    """
+    Exports a preprocessed dataset to CSV.
+    """
+    load_preprocessed_dataset(preprocessed_file_path).to_csv(csv_file_path, index=False)
+    return csv_file_path
+
+
+def read_dataset_sample(data_file_path, sample_rows=dtype_planner.SAMPLE_ROWS):
+    """
+    Reads the rows of a dataset its dtypes are planned from, raises EmptyDatasetError if it has none.
+    """
+    try:
+        sample = dtype_planner.read_sample(data_file_path, sample_rows)
+    except pd.errors.EmptyDataError:
+        sample = None
+    if sample is None or sample.empty:
+        raise EmptyDatasetError(f"The dataset {os.path.basename(data_file_path)} has no rows.")
+    return sample
+
+
+def preprocess_dataset(data_file_path, output_dir='data/preprocessed'):
+    """
+    Loads, preprocesses the dataset by encoding categorical variables and scaling features, then saves the processed data to a new Feather file in output_dir.
+    """
+    sample = read_dataset_sample(data_file_path)
+    plan = dtype_planner.plan_dtypes(sample)
+    df = dtype_planner.read_csv_planned(data_file_path, plan)
+    planned_bytes = df.memory_usage(deep=True, index=False).sum()
+    default_bytes = dtype_planner.estimated_default_bytes(df, sample)
+    print(f"Loaded {data_file_path} with compact dtypes: {planned_bytes} bytes instead of {default_bytes}")
+
+    # Categorical columns are encoded and the features scaled in a single pass; the target keeps its
+    # values in the smallest dtype that holds them
+    encoder = DatasetEncoder(plan).fit(df)
+    res = encoder.transform(df)
+
+    preprocessed_file_path = preprocessed_dataset_path(output_dir, data_file_path)
+    if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+    feather.write_feather(res, preprocessed_file_path, compression='uncompressed')
+    encoder.save(encoder_path(preprocessed_file_path))
+    return res.iloc[:, :-1].to_numpy(), res['target']
+
+
+def _read_chunks(data_file_path, chunksize, plan):
+    """
+    Reads a CSV in chunks, the categorical columns are read as strings and the floats cast to their
+    planned dtype.
+    """
+    dtype = {column: str for column, planned in plan.items() if planned == 'category'}
+    for chunk in pd.read_csv(data_file_path, chunksize=chunksize, dtype=dtype):
+        yield dtype_planner.cast_planned_floats(chunk, plan)
+
+
+def preprocess_dataset_chunked(data_file_path, output_dir='data/preprocessed', chunksize=100000):
+    """
+    Out-of-core version of preprocess_dataset: same output, but the CSV is streamed in chunks of
+    chunksize rows, so peak memory is bounded by the chunk size and not by the file size.
+
+    The first pass fits the encoders (category dictionaries and scaling statistics) chunk by chunk, the
+    second pass transforms every chunk and appends it to the output file.
+    """
+    plan = dtype_planner.plan_dtypes(read_dataset_sample(data_file_path, chunksize))
+
+    # First pass. The dtypes are planned from the first chunk: a column planned as numeric that holds
+    # strings further down is planned as a category, and the pass starts over
+    while True:
+        encoder = DatasetEncoder(plan)
+        for chunk in _read_chunks(data_file_path, chunksize, plan):
+            if dtype_planner.plan_strings_as_categories(plan, chunk):
+                break
+            encoder.partial_fit(chunk)
+        else:
+            break
+    encoder.finish_fit()
 
-    res.to_csv(preprocessed_file_path, index=False)
-    return X, y
+    # Second pass
+    preprocessed_file_path = preprocessed_dataset_path(output_dir, data_file_path)
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_path = preprocessed_file_path + '.tmp'
+    writer = None
+    try:
+        for chunk in _read_chunks(data_file_path, chunksize, plan):
+            table = pa.Table.from_pandas(encoder.transform(chunk), preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_file(tmp_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, preprocessed_file_path)
+    encoder.save(encoder_path(preprocessed_file_path))
+    return preprocessed_file_path
 
 
-def preprocess_json(json_file_path):
+def preprocess_json(json_file_path, output_dir='data/preprocessed', results_dir='results', dataset_hash=None):
     """
-    Loads and modifies a JSON configuration file by updating dataset paths and intent values(lower case), then saves the updated configuration to a new JSON file.
+    Loads and modifies a JSON configuration file by updating dataset paths and intent values(lower case), then saves the updated configuration to a new JSON file in output_dir.
+    dataset_hash identifies the content of the preprocessed dataset (for caching search results).
     """
     file_name = "working_request.json"
 
     with open(json_file_path, 'r') as file:
         data = json.load(file)
     
-    data['dataset'] = 'data/preprocessed/' +  data['dataset']
+    data['dataset'] = preprocessed_dataset_path(output_dir, data['dataset'])
     data['intent'] = data['intent'].lower()
     data['preprocessing'] = True if data['preprocessing'] == 'Yes' else False
+    data['results_dir'] = results_dir
+    if dataset_hash is not None:
+        data['dataset_hash'] = dataset_hash
     
     # Write the modified data to a new JSON file
-    preprocessed_file_path = f'data/preprocessed/{file_name}'
+    preprocessed_file_path = os.path.join(output_dir, file_name)
 
     with open(preprocessed_file_path, 'w') as file:
         json.dump(data, file, indent=4)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+# Preprocessed datasets are cached by the SHA-256 of the uploaded file and the preprocessing version,
+# so uploading a dataset processed before skips straight to the cached artifact
+CACHE_FOLDER = 'data/preprocessed-cache'
+
+
+def compute_file_hash(file_path):
+    """Compute SHA-256 hash of the file at the given path."""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for byte_block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(byte_block)
+    return sha256.hexdigest()
+
+
+class PreprocessedCache:
+    """
+    Size-bounded, content-addressed disk cache of preprocessed datasets.
+
+    An entry holds one or more artifacts (e.g. the preprocessed dataset and its fitted encoders),
+    stored as the files <key>.0, <key>.1, ... and always fetched and evicted together. Entries are
+    evicted least recently used first (the modification time of an entry is its last use, so the
+    order survives restarts) whenever the cache grows over max_bytes.
+    """
+
+    def __init__(self, folder=CACHE_FOLDER, max_bytes=1024 * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, data_file_path, version):
+        """Returns the cache key of an uploaded file for a version of the preprocessing."""
+        return f'{compute_file_hash(data_file_path)}-v{version}'
+
+    def _entry_paths(self, key, count):
+        return [os.path.join(self.folder, f'{key}.{i}') for i in range(count)]
+
+    def fetch(self, key, *destinations):
+        """
+        Places the cached artifacts of key at destinations, in the order they were stored.
+        Returns False on a cache miss.
+        """
+        entry_paths = self._entry_paths(key, len(destinations))
+        with self.lock:
+            if not all(os.path.exists(path) for path in entry_paths):
+                self.misses += 1
+                return False
+            self.hits += 1
+            for path, destination in zip(entry_paths, destinations):
+                os.utime(path)
+                os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+                if os.path.exists(destination):
+                    os.remove(destination)
+                try:
+                    # Cached artifacts are never modified, workspaces can share them
+                    os.link(path, destination)
+                except OSError:
+                    shutil.copyfile(path, destination)
+        return True
+
+    def store(self, key, *sources):
+        """
+        Adds the artifacts at sources to the cache under key and evicts old entries if needed.
+        """
+        entry_paths = self._entry_paths(key, len(sources))
+        tmp_paths = [f'{path}.{uuid.uuid4().hex}.tmp' for path in entry_paths]
+        for source, tmp_path in zip(sources, tmp_paths):
+            shutil.copyfile(source, tmp_path)
+        with self.lock:
+            for tmp_path, path in zip(tmp_paths, entry_paths):
+                os.replace(tmp_path, path)
+            self._evict()
+
+    def _entries(self):
+        """Returns (last use, size, artifact paths) for every entry of the cache."""
+        entries = {}
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.endswith('.tmp') or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            key = name.rsplit('.', 1)[0]
+            last_use, size, paths = entries.get(key, (0, 0, []))
+            entries[key] = (max(last_use, stat.st_mtime), size + stat.st_size, paths + [path])
+        return list(entries.values())
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[0])
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, paths in entries:
+            if size <= self.max_bytes:
+                break
+            for path in paths:
+                os.remove(path)
+            size -= entry_size
+            self.evictions += 1
+
+    def stats(self):
+        """Returns the size and hit-rate statistics of the cache."""
+        with self.lock:
+            entries = self._entries()
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'size_bytes': sum(entry_size for _, entry_size, _ in entries),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions
+            }
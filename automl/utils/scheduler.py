@@ -0,0 +1,67 @@
+import os
+import threading
+from collections import deque
+
+
+def available_cores():
+    """Returns the ids of the CPUs the current process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CoreScheduler:
+    """
+    Core budget of the searches: every job runs on its own set of cores (its slots), so concurrent
+    searches never share a core. Jobs asking for more cores than are free wait in FIFO order.
+    """
+
+    def __init__(self, cores=None):
+        self.cores = list(cores) if cores is not None else available_cores()
+        self.free = list(self.cores)
+        self.waiting = deque()
+        self.condition = threading.Condition()
+
+    def slots(self, requested=None):
+        """Returns the number of cores a job asking for requested cores gets (all of them if None)."""
+        if not requested:
+            return len(self.cores)
+        return max(1, min(int(requested), len(self.cores)))
+
+    def acquire(self, n, cancelled=None):
+        """
+        Waits until n cores are free and it is the turn of the caller, and returns their ids, or None
+        if cancelled() became true while waiting.
+        """
+        ticket = object()
+        with self.condition:
+            self.waiting.append(ticket)
+            try:
+                self.condition.wait_for(lambda: (cancelled is not None and cancelled()) or
+                                        (self.waiting[0] is ticket and len(self.free) >= n))
+                if cancelled is not None and cancelled():
+                    return None
+                cores, self.free = self.free[:n], self.free[n:]
+                return cores
+            finally:
+                self.waiting.remove(ticket)
+                self.condition.notify_all()
+
+    def release(self, cores):
+        with self.condition:
+            self.free = sorted(self.free + list(cores))
+            self.condition.notify_all()
+
+    def wake(self):
+        """Wakes up the waiting jobs, so the cancelled ones stop waiting."""
+        with self.condition:
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'total': len(self.cores),
+                'free': len(self.free),
+                'busy': len(self.cores) - len(self.free),
+                'waiting_jobs': len(self.waiting)
+            }
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from importlib import metadata
+
+# Results of finished searches, reused when the same search is requested again on the same data:
+# data/search-cache/<key>.json, the key hashing the dataset content, the normalized search
+# configuration and the engine version
+CACHE_FOLDER = 'data/search-cache'
+
+# Bump whenever the generators change in a way that changes the results of a search
+SEARCH_ENGINE_VERSION = 4
+
+# Restrictions that change the outcome of each kind of search, the others are ignored by it
+SEARCH_CONFIG_FIELDS = {
+    'hyperopt': ('intent', 'metric', 'preprocessing', 'hyperparameter', 'hyperparameterValue', 'algorithm',
+                 'preprocessingAlgorithm', 'timeLimit', 'timeBudget', 'earlyStoppingRounds', 'rungs', 'eta'),
+    'tpot': ('intent', 'metric', 'preprocessing', 'algorithm', 'preprocessingAlgorithm', 'timeLimit', 'rungs', 'eta')
+}
+
+ENGINE_PACKAGES = ('hyperopt', 'hyperopt-sklearn', 'tpot', 'scikit-learn')
+
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def engine_version():
+    """
+    Returns what identifies the search engine: its version, the versions of the AutoML libraries and
+    the settings changing the number of evaluations of a search.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    return {
+        'search_engine': SEARCH_ENGINE_VERSION,
+        'packages': {name: _package_version(name) for name in ENGINE_PACKAGES},
+        'hyperopt_workers': int(os.environ.get('HYPEROPT_WORKERS', 0)) or cpus
+    }
+
+
+def normalize_config(kind, config):
+    """
+    Keeps the restrictions a kind of search depends on, as stripped strings, unset ones dropped.
+    """
+    normalized = {}
+    for field in SEARCH_CONFIG_FIELDS[kind]:
+        value = config.get(field)
+        if value is None or value == '' or value == {}:
+            continue
+        normalized[field] = json.dumps(value, sort_keys=True) if isinstance(value, (dict, list)) else str(value).strip()
+    return normalized
+
+
+class SearchResultCache:
+    """
+    Disk cache of search results, keyed by (dataset content hash, normalized configuration, engine version).
+
+    An entry is only returned while the artifacts it refers to (images, plot data, dataflows, model) still exist.
+    """
+
+    def __init__(self, folder=CACHE_FOLDER):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, kind, dataset_hash, config):
+        """Returns the cache key of a search of kind on a dataset with the given configuration."""
+        identity = {
+            'kind': kind,
+            'dataset': dataset_hash,
+            'config': normalize_config(kind, config),
+            'engine': engine_version()
+        }
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.folder, key + '.json')
+
+    def get(self, key):
+        """Returns the cached result of key, or None on a cache miss."""
+        entry = self._entry_path(key)
+        result = None
+        if os.path.exists(entry):
+            with open(entry, 'r') as f:
+                result = json.load(f)
+            artifacts = [result.get(name) for name in ('image', 'graph', 'plot_data', 'model')]
+            if not all(os.path.exists(path) for path in artifacts if path):
+                result = None
+        with self.lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def store(self, key, result):
+        """Caches the result of a finished search under key."""
+        entry = self._entry_path(key)
+        tmp_path = f'{entry}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f, indent=4, default=float)
+        os.replace(tmp_path, entry)
+
+    def stats(self):
+        """Returns the size and hit-rate statistics of the cache."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': sum(1 for name in os.listdir(self.folder) if name.endswith('.json')),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
@@ -0,0 +1,152 @@
+import copy
+import threading
+
+# hyperopt-sklearn search spaces by constraint name: the name of the hpsklearn factory and the label
+# of the space. Spaces are only built when first looked up.
+PREPROCESSING_SPACES = {
+    'Binarizer': ('binarizer', 'my_pre'),
+    'KBinsDiscretizer': ('k_bins_discretizer', 'my_pre'),
+    'MaxAbsScaler': ('max_abs_scaler', 'my_pre'),
+    'Normalizer': ('normalizer', 'my_pre'),
+    'MinMaxScaler': ('min_max_scaler', 'my_pre'),
+    'OneHotEncoder': ('one_hot_encoder', 'my_pre'),
+    'OrdinalEncoder': ('ordinal_encoder', 'my_pre'),
+    'PolynomialFeatures': ('polynomial_features', 'my_pre'),
+    'PowerTransformer': ('power_transformer', 'my_pre'),
+    'QuantileTransformer': ('quantile_transformer', 'my_pre'),
+    'RobustScaler': ('robust_scaler', 'my_pre'),
+    'SplineTransformer': ('spline_transformer', 'my_pre'),
+    'StandardScaler': ('standard_scaler', 'my_pre'),
+}
+
+ALGORITHM_SPACES = {
+    # classification:
+    'RandomForestClassifier': ('random_forest_classifier', 'my-alg'),
+    'ExtraTreesClassifier': ('extra_trees_classifier', 'my-alg'),
+    'BaggingClassifier': ('bagging_classifier', 'my-alg'),
+    'AdaBoostClassifier': ('ada_boost_classifier', 'my-alg'),
+    'GradientBoostingClassifier': ('gradient_boosting_classifier', 'my-alg'),
+    'HistGradientBoostingClassifier': ('hist_gradient_boosting_classifier', 'my-alg'),
+    'BernoulliNB': ('bernoulli_nb', 'my-alg'),
+    'CategoricalNB': ('categorical_nb', 'my-alg'),
+    'ComplementNB': ('complement_nb', 'my-alg'),
+    'GaussianNB': ('gaussian_nb', 'my-alg'),
+    'MultinomialNB': ('multinomial_nb', 'my-alg'),
+    'SGDClassifier': ('sgd_classifier', 'my-alg'),
+    'SGDOneClassSVM': ('sgd_one_class_svm', 'my-alg'),
+    'RidgeClassifier': ('ridge_classifier', 'my-alg'),
+    'RidgeClassifierCV': ('ridge_classifier_cv', 'my-alg'),
+    'PassiveAggressiveClassifier': ('passive_aggressive_classifier', 'my-alg'),
+    'Perceptron': ('perceptron', 'my-alg'),
+    'DummyClassifier': ('dummy_classifier', 'my-alg'),
+    'GaussianProcessClassifier': ('gaussian_process_classifier', 'my-alg'),
+    'MLPClassifier': ('mlp_classifier', 'my-alg'),
+    'LinearSVC': ('linear_svc', 'my-alg'),
+    'NuSVC': ('nu_svc', 'my-alg'),
+    'SVC': ('svc', 'my-alg'),
+    'DecisionTreeClassifier': ('decision_tree_classifier', 'my-alg'),
+    'ExtraTreeClassifier': ('extra_tree_classifier', 'my-alg'),
+    'LabelPropagation': ('label_propagation', 'my-alg'),
+    'LabelSpreading': ('label_spreading', 'my-alg'),
+    'EllipticEnvelope': ('elliptic_envelope', 'my-alg'),
+    'LinearDiscriminantAnalysis': ('linear_discriminant_analysis', 'my-alg'),
+    'QuadraticDiscriminantAnalysis': ('quadratic_discriminant_analysis', 'my-alg'),
+    'BayesianGaussianMixture': ('bayesian_gaussian_mixture', 'my-alg'),
+    'GaussianMixture': ('gaussian_mixture', 'my-alg'),
+    'KNeighborsClassifier': ('k_neighbors_classifier', 'my-alg'),
+    'RadiusNeighborsClassifier': ('radius_neighbors_classifier', 'my-alg'),
+    'NearestCentroid': ('nearest_centroid', 'my-alg'),
+    # regression:
+    'RandomForestRegressor': ('random_forest_regressor', 'my-alg'),
+    'ExtraTreesRegressor': ('extra_trees_regressor', 'my-alg'),
+    'BaggingRegressor': ('bagging_regressor', 'my-alg'),
+    'IsolationForest': ('isolation_forest', 'my-alg'),
+    'AdaBoostRegressor': ('ada_boost_regressor', 'my-alg'),
+    'GradientBoostingRegressor': ('gradient_boosting_regressor', 'my-alg'),
+    'HistGradientBoostingRegressor': ('hist_gradient_boosting_regressor', 'my-alg'),
+    'LinearRegression': ('linear_regression', 'my-alg'),
+    'BayesianRidge': ('bayesian_ridge', 'my-alg'),
+    'ARDRegression': ('ard_regression', 'my-alg'),
+    'Lars': ('lars', 'my-alg'),
+    'LassoLars': ('lasso_lars', 'my-alg'),
+    'LarsCV': ('lars_cv', 'my-alg'),
+    'LassoLarsCV': ('lasso_lars_cv', 'my-alg'),
+    'LassoLarsIC': ('lasso_lars_ic', 'my-alg'),
+    'Lasso': ('lasso', 'my-alg'),
+    'ElasticNet': ('elastic_net', 'my-alg'),
+    'LassoCV': ('lasso_cv', 'my-alg'),
+    'ElasticNetCV': ('elastic_net_cv', 'my-alg'),
+    'MultiTaskLasso': ('multi_task_lasso', 'my-alg'),
+    'MultiTaskElasticNet': ('multi_task_elastic_net', 'my-alg'),
+    'MultiTaskLassoCV': ('multi_task_lasso_cv', 'my-alg'),
+    'MultiTaskElasticNetCV': ('multi_task_elastic_net_cv', 'my-alg'),
+    'PoissonRegressor': ('poisson_regressor', 'my-alg'),
+    'GammaRegressor': ('gamma_regressor', 'my-alg'),
+    'TweedieRegressor': ('tweedie_regressor', 'my-alg'),
+    'HuberRegressor': ('huber_regressor', 'my-alg'),
+    'SGDRegressor': ('sgd_regressor', 'my-alg'),
+    'Ridge': ('ridge', 'my-alg'),
+    'RidgeCV': ('ridge_cv', 'my-alg'),
+    'LogisticRegression': ('logistic_regression', 'my-alg'),
+    'LogisticRegressionCV': ('logistic_regression_cv', 'my-alg'),
+    'OrthogonalMatchingPursuit': ('orthogonal_matching_pursuit', 'my-alg'),
+    'OrthogonalMatchingPursuitCV': ('orthogonal_matching_pursuit_cv', 'my-alg'),
+    'PassiveAggressiveRegressor': ('passive_aggressive_regressor', 'my-alg'),
+    'QuantileRegressor': ('quantile_regression', 'my-alg'),
+    'RANSACRegressor': ('ransac_regression', 'my-alg'),
+    'TheilSenRegressor': ('theil_sen_regressor', 'my-alg'),
+    'DummyRegressor': ('dummy_regressor', 'my-alg'),
+    'GaussianProcessRegressor': ('gaussian_process_regressor', 'my-alg'),
+    'MLPRegressor': ('mlp_regressor', 'my-alg'),
+    'CCA': ('cca', 'my-alg'),
+    'PLSCanonical': ('pls_canonical', 'my-alg'),
+    'PLSRegression': ('pls_regression', 'my-alg'),
+    'NuSVR': ('nu_svr', 'my-alg'),
+    'OneClassSVM': ('one_class_svm', 'my-alg'),
+    'SVR': ('svr', 'my-alg'),
+    'DecisionTreeRegressor': ('decision_tree_regressor', 'my-alg'),
+    'ExtraTreeRegressor': ('extra_tree_regressor', 'my-alg'),
+    'TransformedTargetRegressor': ('transformed_target_regressor', 'my-alg'),
+    'KernelRidge': ('hp_sklearn_kernel_ridge', 'my-alg'),
+    'KNeighborsRegressor': ('k_neighbors_regressor', 'my-alg'),
+    'RadiusNeighborsRegressor': ('radius_neighbors_regressor', 'my-alg'),
+    'KMeans': ('k_means', 'my-alg'),
+    'MiniBatchKMeans': ('mini_batch_k_means', 'my-alg'),
+}
+
+
+class SearchSpaceRegistry:
+    """
+    Lazy registry of hyperopt-sklearn search spaces, looked up like a dict.
+
+    A space is built by its hpsklearn factory on its first lookup and memoized; every lookup returns
+    a deep copy, so a request never shares (or alters) the space of another one.
+    """
+
+    def __init__(self, factories):
+        self.factories = factories
+        self.lock = threading.Lock()
+        self.spaces = {}
+
+    def __contains__(self, name):
+        return name in self.factories
+
+    def __getitem__(self, name):
+        factory_name, label = self.factories[name]
+        with self.lock:
+            if name not in self.spaces:
+                import hpsklearn
+                self.spaces[name] = getattr(hpsklearn, factory_name)(label)
+            space = self.spaces[name]
+        return copy.deepcopy(space)
+
+    def __len__(self):
+        return len(self.factories)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def built(self):
+        """Returns the names of the spaces built so far."""
+        with self.lock:
+            return list(self.spaces)
@@ -0,0 +1,234 @@
+import math
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from hyperopt import STATUS_OK, space_eval
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import cross_val_score, train_test_split
+
+from utils.engine import stop_requested
+from utils.parallel_trials import evaluate_in_child, fit_parallel, hyperopt_objective, set_best_model
+
+# Multi-fidelity searches: the search itself runs on a small subsample of the training data (the
+# first rung), then only the best 1/eta of its candidates are evaluated again on every larger rung,
+# up to the full training data
+DEFAULT_ETA = 3
+RANDOM_STATE = 34
+# Share of the time limit of a multi-fidelity TPOT search given to its genetic search on the first rung,
+# the promotions through the other rungs get the rest
+TPOT_FIRST_RUNG_TIME_SHARE = 0.5
+
+
+def parse_rung_schedule(rungs):
+    """
+    Parses a rung schedule given as fractions of the training data ("0.1,0.3,1" or a list), in
+    increasing order. The full training data is added as the last rung if missing.
+    """
+    if isinstance(rungs, str):
+        rungs = [value for value in rungs.replace(' ', '').split(',') if value]
+    fractions = [float(value) for value in rungs]
+    if not fractions or any(not 0 < fraction <= 1 for fraction in fractions):
+        raise ValueError(f"Rung fractions must be in (0, 1], got {rungs}")
+    if any(b <= a for a, b in zip(fractions, fractions[1:])):
+        raise ValueError(f"Rung fractions must be increasing, got {rungs}")
+    if fractions[-1] < 1:
+        fractions.append(1.0)
+    return fractions
+
+
+def stratified_subsample(X, y, fraction, stratify=True, random_state=RANDOM_STATE):
+    """
+    Returns a subsample of fraction of the rows of X, y, stratified on y when possible (classes with a
+    single row in the sample make stratification impossible, a plain random sample is drawn then).
+    """
+    if fraction >= 1:
+        return X, y
+    try:
+        X_sample, _, y_sample, _ = train_test_split(X, y, train_size=fraction, random_state=random_state,
+                                                    stratify=y if stratify else None)
+    except ValueError:
+        X_sample, _, y_sample, _ = train_test_split(X, y, train_size=fraction, random_state=random_state)
+    return X_sample, y_sample
+
+
+def successive_halving(ranked, evaluate, X, y, rungs, eta=DEFAULT_ETA, stratify=True, deadline=None):
+    """
+    Promotes the candidates of the first rung through the following ones.
+
+    ranked holds (loss, candidate, result) for every candidate evaluated on the first rung. On every
+    following rung, the best ceil(n / eta) candidates are evaluated again with evaluate(candidates,
+    X_rung, y_rung), which returns their (loss, candidate, result), possibly for only some of them.
+    Returns the best (loss, candidate, result) of the last rung and a report of the rungs. Once
+    deadline (a time.time() value) has passed, no rung is started: the best of the last one evaluated
+    is returned.
+    """
+    ranked = sorted(ranked, key=lambda entry: entry[0])
+    report = []
+    for fraction in rungs[1:]:
+        if deadline is not None and time.time() >= deadline:
+            print(f"Time limit reached, rungs {rungs[len(report) + 1:]} are skipped")
+            break
+        start = time.time()
+        promoted = ranked[:max(1, math.ceil(len(ranked) / eta))]
+        X_rung, y_rung = stratified_subsample(X, y, fraction, stratify)
+        results = evaluate([candidate for _, candidate, _ in promoted], X_rung, y_rung)
+        if not results:
+            break
+        ranked = sorted(results, key=lambda entry: entry[0])
+        report.append({
+            'fraction': fraction,
+            'samples': len(y_rung),
+            'candidates': len(results),
+            'best_loss': ranked[0][0] if math.isfinite(ranked[0][0]) else None,
+            'elapsed': round(time.time() - start, 3)
+        })
+    return ranked[0], report
+
+
+def _first_rung_report(fraction, samples, candidates, best_loss, elapsed):
+    return {
+        'fraction': fraction,
+        'samples': samples,
+        'candidates': candidates,
+        'best_loss': best_loss,
+        'elapsed': round(elapsed, 3)
+    }
+
+
+def fit_hyperopt_successive_halving(estimator, X, y, rungs, eta=DEFAULT_ETA, stratify=True, parallelism=None,
+                                    time_budget=None, early_stopping_rounds=None, valid_size=.2, result_callback=None):
+    """
+    Fits a HyperoptEstimator in multi-fidelity mode: the Hyperopt search (time_budget and
+    early_stopping_rounds apply to it, and result_callback is called for its trials) runs on the first
+    rung, its successful trials are then promoted through the other rungs, evaluated in parallel with
+    hyperopt-sklearn's cost function.
+    The best candidate of the last rung is refitted on X, y. Returns the report of the rungs.
+    A stopped job skips the other rungs: the best candidate of the first rung is refitted.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    start = time.time()
+    X_rung, y_rung = stratified_subsample(X, y, rungs[0], stratify)
+    fit_parallel(estimator, X_rung, y_rung, parallelism=parallelism, valid_size=valid_size, result_callback=result_callback,
+                 time_budget=time_budget, early_stopping_rounds=early_stopping_rounds, refit=False)
+
+    ranked = []
+    for trial in estimator.trials.trials:
+        if trial['result'].get('status') == STATUS_OK:
+            vals = {label: values[0] for label, values in trial['misc']['vals'].items() if values}
+            ranked.append((trial['result']['loss'], space_eval(estimator.space, vals), None))
+    if not ranked:
+        raise RuntimeError("All candidates failed or timed out on the first rung.")
+    report = [_first_rung_report(rungs[0], len(y_rung), len(ranked), min(loss for loss, _, _ in ranked),
+                                 time.time() - start)]
+    if stop_requested():
+        if estimator.refit:
+            estimator._retrain_best_model_on_full_data(X, y)
+        return report
+
+    def evaluate(configs, X_rung, y_rung):
+        with hyperopt_objective(estimator, X_rung, y_rung, valid_size) as objective, \
+                ThreadPoolExecutor(max_workers=estimator.trials.parallelism) as pool:
+            outcomes = pool.map(lambda config: evaluate_in_child(objective, (config,), estimator.trial_timeout), configs)
+            results = []
+            for config, (rtype, rval) in zip(configs, outcomes):
+                ok = rtype == 'return' and rval.get('status') == STATUS_OK
+                results.append((float(rval['loss']) if ok else float('inf'), config, rval if ok else None))
+        return results
+
+    (loss, _, result), rung_report = successive_halving(ranked, evaluate, X, y, rungs, eta, stratify)
+    if result is None:
+        raise RuntimeError("All candidates failed or timed out on the last rung.")
+    set_best_model(estimator, result)
+    if estimator.refit:
+        estimator._retrain_best_model_on_full_data(X, y)
+    return report + rung_report
+
+
+def fit_tpot_successive_halving(tpot, X, y, rungs, eta=DEFAULT_ETA, stratify=True, evaluation_cache=None):
+    """
+    Fits a TPOT estimator in multi-fidelity mode: the genetic search runs on the first rung, the
+    pipelines it evaluated are then promoted through the other rungs, scored with TPOT's scoring
+    function and cross-validation (from evaluation_cache, a TPOTEvaluationCache, when they were
+    already scored on that rung). The best pipeline of the last rung becomes the fitted pipeline of
+    tpot, refitted on X, y. Returns the report of the rungs. A stopped job skips the other rungs: the
+    best pipeline of the first rung is refitted.
+
+    The time limit of tpot (max_time_mins) bounds the whole search: the genetic search gets
+    TPOT_FIRST_RUNG_TIME_SHARE of it, and no pipeline is scored on a rung once it is spent.
+    """
+    from deap import creator
+    from tpot.export_utils import set_param_recursive
+
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    start = time.time()
+    max_time_mins = tpot.max_time_mins
+    deadline = start + max_time_mins * 60 if max_time_mins else None
+    X_rung, y_rung = stratified_subsample(X, y, rungs[0], stratify)
+    if max_time_mins:
+        tpot.max_time_mins = max_time_mins * TPOT_FIRST_RUNG_TIME_SHARE
+    try:
+        tpot.fit(X_rung, y_rung)
+    finally:
+        tpot.max_time_mins = max_time_mins
+
+    ranked = [(-details['internal_cv_score'], pipeline_string, None)
+              for pipeline_string, details in tpot.evaluated_individuals_.items()
+              if np.isfinite(details.get('internal_cv_score', -np.inf))]
+    if not ranked:
+        raise RuntimeError("All candidates failed or timed out on the first rung.")
+    report = [_first_rung_report(rungs[0], len(y_rung), len(ranked), min(loss for loss, _, _ in ranked),
+                                 time.time() - start)]
+    if stop_requested():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            tpot.fitted_pipeline_.fit(X, y)
+        return report
+    scorer = get_scorer(tpot.scoring_function) if isinstance(tpot.scoring_function, str) else tpot.scoring_function
+
+    def compile_pipeline(pipeline_string):
+        individual = creator.Individual.from_string(pipeline_string, tpot._pset)
+        pipeline = tpot._toolbox.compile(expr=individual)
+        set_param_recursive(pipeline.steps, 'random_state', tpot.random_state)
+        return individual, pipeline
+
+    def evaluate(pipeline_strings, X_rung, y_rung):
+        cache = evaluation_cache.cache_for(X_rung, y_rung) if evaluation_cache is not None else None
+        results = []
+        for pipeline_string in pipeline_strings:
+            if deadline is not None and time.time() >= deadline:
+                break
+            entry = cache.get(pipeline_string) if cache is not None else None
+            if entry is not None:
+                results.append((-float(entry['score']), pipeline_string, None))
+                continue
+            try:
+                individual, pipeline = compile_pipeline(pipeline_string)
+                fit_start = time.time()
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    scores = cross_val_score(pipeline, X_rung, y_rung, cv=tpot.cv, scoring=scorer, n_jobs=tpot.n_jobs)
+                loss = -float(np.mean(scores))
+                if cache is not None and math.isfinite(loss):
+                    cache.put(pipeline_string, score=-loss, operator_count=tpot._operator_count(individual),
+                              fit_seconds=time.time() - fit_start)
+            except Exception:
+                loss = float('inf')
+            results.append((loss if math.isfinite(loss) else float('inf'), pipeline_string, None))
+        return results
+
+    (loss, pipeline_string, _), rung_report = successive_halving(ranked, evaluate, X, y, rungs, eta, stratify,
+                                                                 deadline)
+    if not math.isfinite(loss):
+        raise RuntimeError("All candidate pipelines failed on the last rung.")
+    individual, pipeline = compile_pipeline(pipeline_string)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        pipeline.fit(X, y)
+    tpot._optimized_pipeline = individual
+    tpot._optimized_pipeline_score = -loss
+    tpot.fitted_pipeline_ = pipeline
+    return report + rung_report
@@ -0,0 +1,176 @@
+import json
+import os
+import time
+import uuid
+from importlib import metadata
+
+from utils.tpot_config import constraint_signature
+
+# TPOT searches save their population and the scores of the pipelines they evaluated, per dataset and
+# constraints: data/tpot-checkpoints/<dataset hash>-<intent>[-<first rung fraction>][-<constraints>].json.
+# A warm-started search continues from the checkpoint of its dataset instead of a random population, and
+# does not evaluate again the pipelines already scored.
+CHECKPOINT_FOLDER = 'data/tpot-checkpoints'
+CHECKPOINT_VERSION = 2
+
+# A checkpoint is written at most every TPOT_CHECKPOINT_SECONDS, after a batch of TPOT_CHECKPOINT_BATCH
+# pipelines has been evaluated or a generation has ended, and when the search ends
+CHECKPOINT_SECONDS = float(os.environ.get('TPOT_CHECKPOINT_SECONDS', 30))
+CHECKPOINT_BATCH = int(os.environ.get('TPOT_CHECKPOINT_BATCH', 20))
+
+
+def _tpot_version():
+    try:
+        return metadata.version('tpot')
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def checkpoint_path(dataset_hash, intent, fraction=1.0, folder=CHECKPOINT_FOLDER, signature=''):
+    """
+    Returns the checkpoint of the TPOT searches of a dataset and intent. Multi-fidelity searches
+    evolve on a subsample of the data (fraction), and constrained searches (signature of their
+    constraints) use other operators or scoring: their scores are kept apart.
+    """
+    name = f'{dataset_hash}-{intent}' + (f'-{fraction:g}' if fraction < 1 else '')
+    if signature:
+        name += f'-{signature}'
+    return os.path.join(folder, name + '.json')
+
+
+def search_checkpoint_path(restrictions, folder=CHECKPOINT_FOLDER):
+    """
+    Returns the checkpoint of the TPOT search of a working request, or None if its dataset hash is unknown.
+    """
+    if not restrictions.get('dataset_hash'):
+        return None
+    rungs = restrictions.get('rungs')
+    if isinstance(rungs, str):
+        rungs = [value for value in rungs.replace(' ', '').split(',') if value]
+    fraction = float(rungs[0]) if rungs else 1.0
+    return checkpoint_path(restrictions['dataset_hash'], restrictions.get('intent'), fraction, folder,
+                           constraint_signature(restrictions))
+
+
+def is_warm_start(restrictions):
+    """
+    Checks the 'warmStart' restriction, which continues a TPOT search from the checkpoint of its dataset.
+    """
+    value = restrictions.get('warmStart')
+    return value is True or str(value).lower() in ('1', 'true', 'yes')
+
+
+def load_checkpoint(path):
+    """Returns the checkpoint at path, or None if there is none usable by this TPOT version."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('tpot') != _tpot_version():
+        return None
+    return checkpoint
+
+
+def restore_checkpoint(tpot, checkpoint):
+    """
+    Sets up an unfitted TPOT estimator to continue the evolution of a checkpoint: its population
+    becomes the saved one and its evaluated pipelines are scored from the checkpoint. Pipelines using
+    operators missing from the configuration of tpot are dropped. Returns the restored population size.
+    """
+    from deap import creator
+
+    tpot.warm_start = True
+    tpot._fit_init()
+    population = []
+    for pipeline_string in checkpoint['population']:
+        try:
+            population.append(creator.Individual.from_string(pipeline_string, tpot._pset))
+        except Exception:
+            continue
+    tpot._pop = population
+    tpot.evaluated_individuals_ = {
+        pipeline_string: dict(details, predecessor=tuple(details.get('predecessor', ())))
+        for pipeline_string, details in checkpoint['evaluated_individuals'].items()
+    }
+    return len(population)
+
+
+class TPOTCheckpointer:
+    """
+    Checkpoints a TPOT search while it runs.
+
+    TPOT only hands its evaluated pipelines back at the end of a generation, so the evaluation of a
+    population is split into batches: the scores of every finished batch are kept even if the search
+    is killed before the generation ends.
+    """
+
+    def __init__(self, tpot, path, interval=CHECKPOINT_SECONDS, batch_size=CHECKPOINT_BATCH, generation=0):
+        self.tpot = tpot
+        self.path = path
+        self.interval = interval
+        self.batch_size = batch_size
+        self.generation = generation
+        self.saved_at = 0.0
+        self.saves = 0
+
+        # TPOT looks both up on the instance when fit() starts, so they can be wrapped here
+        self._evaluate_individuals = tpot._evaluate_individuals
+        self._check_periodic_pipeline = tpot._check_periodic_pipeline
+        tpot._evaluate_individuals = self.evaluate_individuals
+        tpot._check_periodic_pipeline = self.check_periodic_pipeline
+        # Keeps the population once fit() returns, to save it
+        tpot.warm_start = True
+
+    def evaluate_individuals(self, population, features, target, sample_weight=None, groups=None):
+        evaluated = []
+        try:
+            for start in range(0, len(population), self.batch_size):
+                evaluated += self._evaluate_individuals(population[start:start + self.batch_size], features, target,
+                                                        sample_weight=sample_weight, groups=groups)
+                self.save_if_due()
+        except KeyboardInterrupt:
+            # TPOT keeps the interrupted batch as its population, the whole population is kept instead
+            self.tpot._pop = population
+            raise
+        return evaluated
+
+    def check_periodic_pipeline(self, gen):
+        self.generation += 1
+        self.save_if_due()
+        self._check_periodic_pipeline(gen)
+
+    def save_if_due(self):
+        if time.time() - self.saved_at >= self.interval:
+            self.save()
+
+    def save(self):
+        """Writes the current population and evaluated pipelines of the search (atomic write)."""
+        evaluated_individuals = getattr(self.tpot, 'evaluated_individuals_', None)
+        if not evaluated_individuals:
+            return
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'tpot': _tpot_version(),
+            'saved_at': time.time(),
+            'generations': self.generation,
+            'population': [str(individual) for individual in self.tpot._pop or []],
+            'evaluated_individuals': evaluated_individuals
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f, default=float)
+        os.replace(tmp_path, self.path)
+        self.saved_at = time.time()
+        self.saves += 1
+
+    def report(self, warm_start, restored):
+        """Returns what the search saved and, when warm-started, restored."""
+        return {
+            'path': self.path,
+            'warm_start': warm_start,
+            'restored_population': restored,
+            'generations': self.generation,
+            'evaluated_pipelines': len(getattr(self.tpot, 'evaluated_individuals_', None) or {}),
+            'saves': self.saves
+        }
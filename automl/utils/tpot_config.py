@@ -0,0 +1,152 @@
+import hashlib
+import importlib
+import json
+
+# TPOT searches follow the constraints of the request like Hyperopt searches do: the operators of the
+# configuration are restricted to the requested algorithm and preprocessing, 'metric' selects the
+# scoring function and 'timeLimit' (seconds) bounds the whole search.
+TPOT_SCORING = {
+    'classification': {'Accuracy': 'accuracy', 'F1': 'f1_micro'},  # F1 is micro-averaged, as for Hyperopt
+    'regression': {}
+}
+DEFAULT_SCORING = {'classification': 'accuracy', 'regression': 'neg_mean_absolute_error'}
+# Name of the metric of a result, after the scoring the search actually used
+METRIC_NAMES = {'accuracy': 'accuracy', 'f1_micro': 'f1', 'neg_mean_absolute_error': 'mae'}
+
+# A single pipeline evaluation never gets more than this, nor more than the whole search
+MAX_EVAL_TIME_MINS = 5.0
+
+CONSTRAINT_FIELDS = ('metric', 'algorithm', 'preprocessing', 'preprocessingAlgorithm')
+
+
+def _import_operator(path):
+    module_name, _, class_name = path.rpartition('.')
+    try:
+        return getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError):
+        return None
+
+
+def _public_path(operator):
+    """Returns the shortest public module path of a scikit-learn class, as TPOT exports it."""
+    parts = operator.__module__.split('.')
+    for end in range(1, len(parts) + 1):
+        module_name = '.'.join(parts[:end])
+        if getattr(importlib.import_module(module_name), operator.__name__, None) is operator:
+            return f'{module_name}.{operator.__name__}'
+    return f'{operator.__module__}.{operator.__name__}'
+
+
+def _is_estimator(operator, intent):
+    from sklearn.base import ClassifierMixin, RegressorMixin
+
+    return issubclass(operator, ClassifierMixin if intent == 'classification' else RegressorMixin)
+
+
+def _template_step(operator):
+    from sklearn.feature_selection import SelectorMixin
+
+    return 'Selector' if issubclass(operator, SelectorMixin) else 'Transformer'
+
+
+def default_operators(intent):
+    """
+    Splits the default TPOT configuration of an intent into its estimators and its preprocessors
+    (operators whose package is not installed are left out, as TPOT does).
+    """
+    from tpot.config import classifier_config_dict, regressor_config_dict
+
+    config = classifier_config_dict if intent == 'classification' else regressor_config_dict
+    estimators, preprocessors = {}, {}
+    for path, params in config.items():
+        operator = _import_operator(path)
+        if operator is None:
+            continue
+        (estimators if _is_estimator(operator, intent) else preprocessors)[path] = (operator, params)
+    return estimators, preprocessors
+
+
+def find_operator(name, operators, type_filter):
+    """
+    Returns the path, class and parameters of the operator of a constraint name such as 'sklearn-SVC':
+    the default one if TPOT has it, else the scikit-learn class of that name with its default parameters.
+    Returns None for unknown names.
+    """
+    from sklearn.utils import all_estimators
+
+    name = (name or '').removeprefix('sklearn-')
+    if not name:
+        return None
+    for path, (operator, params) in operators.items():
+        if operator.__name__ == name:
+            return path, operator, params
+    for estimator_name, operator in all_estimators(type_filter=type_filter):
+        if estimator_name == name:
+            return _public_path(operator), operator, {}
+    return None
+
+
+def constraint_signature(restrictions):
+    """
+    Returns a short hash of the constraints that change the search space or scoring of a TPOT search,
+    or '' when the request has none, so searches under other constraints never share their scores.
+    """
+    constraints = {field: str(restrictions[field]) for field in CONSTRAINT_FIELDS
+                   if restrictions.get(field) not in (None, '')}
+    if not constraints:
+        return ''
+    return hashlib.sha256(json.dumps(constraints, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def tpot_search_settings(restrictions):
+    """
+    Returns the TPOT arguments following the constraints of a request: config_dict and template
+    (None for TPOT's defaults), scoring, max_time_mins and max_eval_time_mins.
+
+    The requested algorithm is the only estimator of the configuration (all default estimators if it is
+    unknown). Without preprocessing, pipelines are that estimator alone; with a requested preprocessing
+    algorithm, they are that preprocessor followed by the estimator.
+    """
+    intent = restrictions.get('intent')
+    estimator_type = 'classifier' if intent == 'classification' else 'regressor'
+    estimators, preprocessors = default_operators(intent)
+
+    config = {path: params for path, (_, params) in estimators.items()}
+    algorithm = find_operator(restrictions.get('algorithm'), estimators, estimator_type)
+    if algorithm is not None:
+        config = {algorithm[0]: algorithm[2]}
+    elif restrictions.get('algorithm'):
+        print(f"Unknown TPOT algorithm {restrictions.get('algorithm')}, searching all estimators")
+
+    template = None
+    if not restrictions.get('preprocessing'):
+        template = estimator_type.capitalize()
+    else:
+        preprocessor = find_operator(restrictions.get('preprocessingAlgorithm'), preprocessors, 'transformer')
+        if preprocessor is not None:
+            config[preprocessor[0]] = preprocessor[2]
+            template = f'{_template_step(preprocessor[1])}-{estimator_type.capitalize()}'
+        else:
+            config.update((path, params) for path, (_, params) in preprocessors.items())
+            if algorithm is None:
+                config = None  # unconstrained: TPOT's full default configuration
+
+    time_limit = restrictions.get('timeLimit')
+    max_time_mins = float(time_limit) / 60 if time_limit not in (None, '') else None
+    return {
+        'config_dict': config,
+        'template': template,
+        'scoring': TPOT_SCORING.get(intent, {}).get(restrictions.get('metric'), DEFAULT_SCORING.get(intent)),
+        'max_time_mins': max_time_mins,
+        'max_eval_time_mins': min(MAX_EVAL_TIME_MINS, max_time_mins) if max_time_mins else MAX_EVAL_TIME_MINS
+    }
+
+
+def describe_settings(settings):
+    """Returns the effective TPOT search settings of a result: its operators, template and limits."""
+    return {
+        'operators': sorted(settings['config_dict']) if settings['config_dict'] is not None else 'default',
+        'template': settings['template'],
+        'scoring': settings['scoring'],
+        'max_time_mins': settings['max_time_mins']
+    }
@@ -0,0 +1,49 @@
+import json
+import os
+import re
+import uuid
+
+# Every upload gets its own workspace, so concurrent users never share files:
+#   data/workspaces/<workspace_id>/uploads       raw upload and workflow request
+#   data/workspaces/<workspace_id>/preprocessed  preprocessed dataset and working_request.json
+#   data/workspaces/<workspace_id>/results       pipelines, images and dataflows of the searches
+WORKSPACES_FOLDER = 'data/workspaces'
+
+WORKSPACE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def workspace_path(workspace_id, *parts):
+    """
+    Returns the path of a file or directory inside a workspace.
+    """
+    return os.path.join(WORKSPACES_FOLDER, workspace_id, *parts)
+
+
+def create_workspace():
+    """
+    Creates a new workspace with its uploads, preprocessed and results directories and returns its id.
+    """
+    workspace_id = uuid.uuid4().hex
+    for directory in ('uploads', 'preprocessed', 'results'):
+        os.makedirs(workspace_path(workspace_id, directory))
+    return workspace_id
+
+
+def workspace_exists(workspace_id):
+    """
+    Checks that the id is well formed (no path traversal) and that the workspace exists.
+    """
+    return bool(workspace_id) and WORKSPACE_ID_PATTERN.match(workspace_id) is not None \
+        and os.path.isdir(workspace_path(workspace_id))
+
+
+def read_working_request(workspace_id):
+    """
+    Reads and returns the configuration data from the 'working_request.json' file of a workspace.
+    """
+    working_request = workspace_path(workspace_id, 'preprocessed', 'working_request.json')
+    if not os.path.exists(working_request):
+        raise FileNotFoundError(f"{working_request} does not exist.")
+    with open(working_request, 'r') as f:
+        config = json.load(f)
+    return config
@@ -1,7 +1,48 @@
+import os
+import threading
 from flask import Flask, request, jsonify
 from utils.query_graphdb import get_intent, get_metric, get_preprocessing, get_algorithm, get_preprocessing_algorithm, get_users, add_new_user, find_user_by_email, add_new_dataset, add_new_workflow
+from utils.query_graphdb import base_url, repository
+from utils import kb_snapshot
+from utils.meta_features import compute_meta_features, meta_feature_index
+import pandas as pd
 app = Flask(__name__)
 
+# Optional binary snapshot (see utils/export_graphdb_repository.py) used to populate an empty repository,
+# restored before the first request is served (so not by the process of the debug reloader), and
+# tried again on the next request if the restore failed
+KB_SNAPSHOT = os.environ.get('KB_SNAPSHOT')
+kb_restore_lock = threading.Lock()
+kb_restored = False
+
+def restore_knowledge_base():
+    """
+    Restores the knowledge base from the KB_SNAPSHOT binary snapshot if the repository is empty.
+    The snapshot is memory-mapped and streamed to GraphDB as Binary RDF. Returns False if the restore failed.
+    """
+    if not KB_SNAPSHOT:
+        return True
+    if not os.path.exists(KB_SNAPSHOT):
+        print(f"Snapshot '{KB_SNAPSHOT}' does not exist.")
+        return True
+    try:
+        if kb_snapshot.repository_is_empty(base_url, repository):
+            with kb_snapshot.load_snapshot(KB_SNAPSHOT) as snapshot:
+                kb_snapshot.restore_snapshot(snapshot, base_url, repository)
+        return True
+    except Exception as e:
+        print(f"Failed to restore knowledge base from snapshot. Error: {str(e)}")
+        return False
+
+@app.before_request
+def restore_knowledge_base_once():
+    global kb_restored
+    if kb_restored:
+        return
+    with kb_restore_lock:
+        if not kb_restored:
+            kb_restored = restore_knowledge_base()
+
 # Dictionary route information
 routes_info = {
     "/get_intent": {
@@ -86,7 +127,24 @@ routes_info = {
         "workflow_name": "string"
     },
     "example_usage": "curl -X POST http://localhost:8002/add_workflow -H \"Content-Type: application/json\" -d '{\"data\": {\"user\": \"example_user\", \"dataset\": \"dataset_name\", \"intent\": \"intent_class\", \"algorithm_constraint\": \"ExampleAlgorithm\", \"hyperparam_constraints\": {\"param1\": \"value1\", \"param2\": \"value2\"}, \"time\":  \"time_value\", \"preprocessor_constraint\": \"ExamplePreprocessor\", \"max_time\": \"max_time_value\", \"pipeline\": {\"preprocs\": [\"ExamplePreprocessor()\"], \"learner\": \"ExampleLearner()\"}, \"metricName\": \"example_metric\", \"metric_value\": \"example metric_value\"}}'"
-}
+},
+    "/add_meta_features": {
+        "parameters": ["dataset", "file"],
+        "description": "Compute and store the meta-features of an uploaded dataset, used to recommend workflows for datasets with similar meta-features.",
+        "response": {
+            "dataset": "string",
+            "meta_features": "object"
+        },
+        "example_usage": "curl -X POST http://localhost:8002/add_meta_features -F \"dataset=dataset_name\" -F \"file=@dataset_name.csv\""
+    },
+    "/get_similar_datasets": {
+        "parameters": ["dataset", "k"],
+        "description": "Get the k datasets with the most similar meta-features.",
+        "response": {
+            "similar_datasets": "array"
+        },
+        "example_usage": "http://localhost:8002/get_similar_datasets?dataset=<dataset>&k=3"
+    }
 
 }
 
@@ -231,5 +289,33 @@ def add_workflow_route():
         return jsonify({"status": "error", "message": f"Failed to add workflow: {new_workflow}"}), 500
 
 
+@app.route('/add_meta_features', methods=['POST'])
+def add_meta_features_route():
+    dataset_name = request.form.get('dataset')
+    file = request.files.get('file')
+
+    if not dataset_name or not file:
+        return jsonify({"status": "error", "message": "Dataset and file are required"}), 400
+
+    try:
+        meta_features = compute_meta_features(pd.read_csv(file))
+        meta_feature_index.add(dataset_name, meta_features)
+        return jsonify({"dataset": dataset_name, "meta_features": meta_features}), 201
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/get_similar_datasets', methods=['GET'])
+def get_similar_datasets_route():
+    dataset = request.args.get('dataset')
+    k = request.args.get('k', default='3')
+    if not dataset:
+        return jsonify({"error": "Missing dataset parameter"}), 400
+    if not k.isdigit() or int(k) < 1:
+        return jsonify({"error": "k must be a positive integer"}), 400
+    k = int(k)
+
+    return jsonify({"similar_datasets": meta_feature_index.nearest(dataset, k)}), 200
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=8002)
@@ -0,0 +1,67 @@
+import argparse
+import gzip
+import os
+import requests
+import kb_snapshot
+
+# GraphDB REST API
+## https://graphdb.ontotext.com/documentation/10.1/using-the-graphdb-rest-api.html
+
+def export_repository(base_url, repo_id, output_file, chunk_size=1024 * 1024):
+    """
+    Streams all explicit statements of a GraphDB repository to a gzip compressed N-Triples file.
+
+    A single CONSTRUCT query is evaluated, so the export is a consistent snapshot of the repository
+    (including workflows added after the initial import). The response is consumed in chunks and
+    never held in memory as a whole.
+
+    Args:
+    - base_url (str): The base URL of the GraphDB server.
+    - repo_id (str): The name of the GraphDB repository.
+    - output_file (str): Path of the .nt.gz file to write.
+    - chunk_size (int): Size in bytes of the chunks read from the response.
+
+    Returns:
+    - int: The number of exported triples.
+    """
+    url = f"{base_url}/repositories/{repo_id}"
+    headers = {
+        "Accept": "application/n-triples"
+    }
+    # infer=false leaves out statements inferred by the ruleset, they are recomputed on import
+    payload = {
+        "query": "CONSTRUCT { ?s ?p ?o } WHERE { ?s ?p ?o }",
+        "infer": "false"
+    }
+
+    n_triples = 0
+    tmp_file = output_file + '.tmp'
+    with requests.post(url, headers=headers, data=payload, stream=True) as response:
+        response.raise_for_status()
+        with gzip.open(tmp_file, 'wb') as out:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                out.write(chunk)
+                n_triples += chunk.count(b'\n')
+    os.replace(tmp_file, output_file)
+
+    print(f"Exported {n_triples} triples from repository {repo_id} to '{output_file}'.")
+    return n_triples
+
+
+# Example usage:
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Export a GraphDB repository to compressed N-Triples and, optionally, a binary snapshot.")
+    parser.add_argument("output_file", type=str, help="Path of the exported .nt.gz file.")
+    parser.add_argument("--snapshot", type=str, default=None, help="Also write a binary snapshot (.kbs) to this path.")
+    parser.add_argument("--chunk-size", type=int, default=1024 * 1024, help="Size in bytes of the streamed chunks.")
+    args = parser.parse_args()
+
+    base_url = "http://localhost:8080"
+    repo_id = "test-repo" # specify your repository name
+
+    export_repository(base_url, repo_id, args.output_file, args.chunk_size)
+
+    if args.snapshot:
+        n_terms, n_triples = kb_snapshot.ntriples_to_snapshot(args.output_file, args.snapshot)
+        print(f"Snapshot with {n_triples} triples and {n_terms} distinct terms saved to '{args.snapshot}'.")
@@ -0,0 +1,253 @@
+import gzip
+import mmap
+import os
+import re
+import struct
+import requests
+
+# Compact binary snapshot of the knowledge base.
+#
+# Layout (little endian):
+#   header   : magic (8 bytes), n_terms (uint64), n_triples (uint64), blob_size (uint64)
+#   offsets  : (n_terms + 1) x uint64, start of every term inside the blob
+#   blob     : all distinct terms in N-Triples syntax, utf-8, concatenated
+#   padding  : zero bytes up to the next multiple of 8
+#   triples  : n_triples x 3 x uint32, term ids of subject, predicate and object
+#
+# Every term is stored once (dictionary encoding), so the file is a fraction of the
+# N-Triples size and can be memory-mapped and decoded lazily. It is restored as RDF4J Binary
+# RDF, which keeps the dictionary encoding: every distinct term is declared once, the triples
+# only refer to the ids of their terms, so GraphDB does not parse any N-Triples text.
+
+SNAPSHOT_MAGIC = b'KBSNAP01'
+HEADER_FORMAT = '<8sQQQ'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+TRIPLE_PATTERN = re.compile(r'^\s*(\S+)\s+(\S+)\s+(.*?)\s*\.\s*$')
+
+# RDF4J Binary RDF (format version 1): big endian integers, strings as their number of UTF-16
+# code units followed by the UTF-16 code units
+BINARY_RDF_MAGIC = b'BRDF'
+BINARY_RDF_VERSION = 1
+STATEMENT, VALUE_DECL, END_OF_DATA = 1, 3, 127
+NULL_VALUE, URI_VALUE, BNODE_VALUE, PLAIN_LITERAL_VALUE, LANG_LITERAL_VALUE, DATATYPE_LITERAL_VALUE, VALUE_REF = range(7)
+BINARY_RDF_CHUNK_BYTES = 1 << 20
+
+ESCAPE_PATTERN = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+ESCAPED_CHARACTERS = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+
+def open_ntriples(file_path):
+    """Opens an N-Triples file for reading text, transparently handling gzip compressed files."""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
+
+def iter_ntriples(lines):
+    """Splits N-Triples lines into (subject, predicate, object) term strings, skipping blank lines and comments."""
+    for line in lines:
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        match = TRIPLE_PATTERN.match(line)
+        if match is None:
+            raise ValueError(f"Invalid N-Triples line: {line.strip()}")
+        yield match.groups()
+
+
+def _unescape(text):
+    """Decodes the escape sequences of an N-Triples IRI or literal."""
+    if '\\' not in text:
+        return text
+    return ESCAPE_PATTERN.sub(lambda m: chr(int(m.group(1) or m.group(2), 16)) if m.group(3) is None
+                              else ESCAPED_CHARACTERS.get(m.group(3), m.group(3)), text)
+
+
+def _binary_string(text):
+    data = text.encode('utf-16-be', 'surrogatepass')
+    return struct.pack('>i', len(data) // 2) + data
+
+
+def binary_rdf_value(term):
+    """Encodes an N-Triples term (IRI, blank node or literal) as a Binary RDF value."""
+    if term.startswith('<'):
+        return bytes([URI_VALUE]) + _binary_string(_unescape(term[1:-1]))
+    if term.startswith('_:'):
+        return bytes([BNODE_VALUE]) + _binary_string(term[2:])
+    if term.startswith('"'):
+        end = term.rindex('"')
+        label, suffix = _binary_string(_unescape(term[1:end])), term[end + 1:]
+        if suffix.startswith('@'):
+            return bytes([LANG_LITERAL_VALUE]) + label + _binary_string(suffix[1:])
+        if suffix.startswith('^^'):
+            return bytes([DATATYPE_LITERAL_VALUE]) + label + _binary_string(_unescape(suffix[3:-1]))
+        return bytes([PLAIN_LITERAL_VALUE]) + label
+    raise ValueError(f"Invalid N-Triples term: {term}")
+
+
+def write_snapshot(triples, snapshot_path):
+    """
+    Dictionary-encodes an iterable of (subject, predicate, object) term strings and writes it as a binary snapshot.
+
+    Args:
+    - triples (iterable): Triples as N-Triples term strings.
+    - snapshot_path (str): Path of the snapshot file to create.
+
+    Returns:
+    - tuple: The number of distinct terms and the number of triples written.
+    """
+    term_ids = {}
+    encoded_triples = bytearray()
+    pack_triple = struct.Struct('<III').pack
+    n_triples = 0
+
+    for triple in triples:
+        ids = []
+        for term in triple:
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(term_ids)
+            ids.append(term_id)
+        encoded_triples += pack_triple(*ids)
+        n_triples += 1
+
+    offsets = [0]
+    blob = bytearray()
+    for term in term_ids:  # dicts keep insertion order, i.e. term id order
+        blob += term.encode('utf-8')
+        offsets.append(len(blob))
+
+    padding = (-(HEADER_SIZE + 8 * len(offsets) + len(blob))) % 8
+
+    tmp_path = snapshot_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, SNAPSHOT_MAGIC, len(term_ids), n_triples, len(blob)))
+        f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+        f.write(blob)
+        f.write(b'\0' * padding)
+        f.write(encoded_triples)
+    os.replace(tmp_path, snapshot_path)
+
+    return len(term_ids), n_triples
+
+
+def ntriples_to_snapshot(ntriples_path, snapshot_path):
+    """Converts a (optionally gzip compressed) N-Triples file into a binary snapshot."""
+    with open_ntriples(ntriples_path) as f:
+        return write_snapshot(iter_ntriples(f), snapshot_path)
+
+
+class KnowledgeBaseSnapshot:
+    """
+    Read-only view over a memory-mapped binary snapshot. Terms are decoded on demand and cached,
+    so loading is constant time regardless of the snapshot size.
+    """
+
+    def __init__(self, snapshot_path):
+        self.path = snapshot_path
+        self._file = open(snapshot_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.n_terms, self.n_triples, blob_size = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"{snapshot_path} is not a knowledge base snapshot.")
+
+        self._view = view = memoryview(self._mmap)
+        offsets_start = HEADER_SIZE
+        blob_start = offsets_start + 8 * (self.n_terms + 1)
+        triples_start = blob_start + blob_size + (-(blob_start + blob_size)) % 8
+
+        self._offsets = view[offsets_start:blob_start].cast('Q')
+        self._blob = view[blob_start:blob_start + blob_size]
+        self._triples = view[triples_start:triples_start + 12 * self.n_triples].cast('I')
+        self._terms = {}
+
+    def __len__(self):
+        return self.n_triples
+
+    def term(self, term_id):
+        """Returns the N-Triples string of the term with the given id."""
+        term = self._terms.get(term_id)
+        if term is None:
+            term = str(self._blob[self._offsets[term_id]:self._offsets[term_id + 1]], 'utf-8')
+            self._terms[term_id] = term
+        return term
+
+    def triples(self):
+        """Yields all triples as (subject, predicate, object) N-Triples term strings."""
+        ids = self._triples
+        for i in range(0, 3 * self.n_triples, 3):
+            yield self.term(ids[i]), self.term(ids[i + 1]), self.term(ids[i + 2])
+
+    def iter_binary_rdf(self, chunk_bytes=BINARY_RDF_CHUNK_BYTES):
+        """
+        Yields the snapshot as an RDF4J Binary RDF document, in chunks of about chunk_bytes bytes: every
+        term is declared once with its id, then every triple refers to the ids of its terms.
+        """
+        chunk = bytearray(BINARY_RDF_MAGIC + struct.pack('>i', BINARY_RDF_VERSION))
+        for term_id in range(self.n_terms):
+            chunk += struct.pack('>bi', VALUE_DECL, term_id) + binary_rdf_value(self.term(term_id))
+            if len(chunk) >= chunk_bytes:
+                yield bytes(chunk)
+                chunk = bytearray()
+
+        pack_statement = struct.Struct('>bbibibib').pack
+        ids = self._triples
+        for i in range(0, 3 * self.n_triples, 3):
+            chunk += pack_statement(STATEMENT, VALUE_REF, ids[i], VALUE_REF, ids[i + 1], VALUE_REF, ids[i + 2], NULL_VALUE)
+            if len(chunk) >= chunk_bytes:
+                yield bytes(chunk)
+                chunk = bytearray()
+        chunk.append(END_OF_DATA)
+        yield bytes(chunk)
+
+    def close(self):
+        for attr in ('_offsets', '_blob', '_triples', '_view'):
+            if hasattr(self, attr):
+                getattr(self, attr).release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_snapshot(snapshot_path):
+    """Memory-maps a binary snapshot and returns a KnowledgeBaseSnapshot."""
+    return KnowledgeBaseSnapshot(snapshot_path)
+
+
+def repository_is_empty(base_url, repo_id):
+    """Returns True if the GraphDB repository holds no explicit statements."""
+    url = f"{base_url}/repositories/{repo_id}"
+    headers = {"Accept": "application/sparql-results+json"}
+    response = requests.get(url, headers=headers, params={"query": "ASK { ?s ?p ?o }", "infer": "false"})
+    response.raise_for_status()
+    return not response.json()["boolean"]
+
+
+def restore_snapshot(snapshot, base_url, repo_id):
+    """
+    Streams the triples of a loaded snapshot into a GraphDB repository as Binary RDF, in a single
+    request: the repository gets all the triples or, if the restore fails, none of them.
+
+    Args:
+    - snapshot (KnowledgeBaseSnapshot): The loaded snapshot.
+    - base_url (str): The base URL of the GraphDB server.
+    - repo_id (str): The name of the GraphDB repository.
+
+    Returns:
+    - int: The number of triples restored.
+    """
+    url = f"{base_url}/repositories/{repo_id}/statements"
+    headers = {"Content-Type": "application/x-binary-rdf"}
+
+    response = requests.post(url, headers=headers, data=snapshot.iter_binary_rdf())
+    response.raise_for_status()
+
+    print(f"Restored {len(snapshot)} triples from {snapshot.path} into repository {repo_id}.")
+    return len(snapshot)
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Meta-features describing what a dataset looks like. Datasets with similar meta-feature
+# vectors are used to recommend workflows for datasets that have never been seen before.
+META_FEATURE_NAMES = ['rows', 'columns', 'categorical_ratio', 'class_entropy', 'skewness', 'missing_ratio']
+
+META_FEATURES_PATH = 'data/meta_features.npz'
+
+
+def compute_meta_features(df):
+    """
+    Computes the meta-feature vector of a dataset in one vectorized pass. The last column is the target.
+
+    Args:
+    - df (DataFrame): The dataset.
+
+    Returns:
+    - dict: The meta-features, keyed by the names in META_FEATURE_NAMES.
+    """
+    n_rows, n_columns = df.shape
+    features = df.iloc[:, :-1]
+    target = df.iloc[:, -1]
+
+    numeric = features.select_dtypes(include='number').to_numpy(dtype=np.float64)
+    n_categorical = features.shape[1] - numeric.shape[1]
+    missing_ratio = float(df.isna().to_numpy().mean()) if df.size else 0.0
+
+    # Mean absolute skewness of the numeric features, ignoring missing values
+    skewness = 0.0
+    if numeric.size:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            centered = numeric - np.nanmean(numeric, axis=0)
+            m2 = np.nanmean(centered ** 2, axis=0)
+            m3 = np.nanmean(centered ** 3, axis=0)
+            skew = np.where(m2 > 0, m3 / m2 ** 1.5, 0.0)
+        skewness = float(np.nanmean(np.abs(skew))) if np.isfinite(skew).any() else 0.0
+
+    # Entropy of the target distribution, continuous targets are binned first
+    target = target.dropna()
+    if pd.api.types.is_numeric_dtype(target) and target.nunique() > 20:
+        counts, _ = np.histogram(target.to_numpy(dtype=np.float64), bins=10)
+    else:
+        counts = target.value_counts().to_numpy()
+    probabilities = counts[counts > 0] / max(counts.sum(), 1)
+    class_entropy = float(-(probabilities * np.log2(probabilities)).sum())
+
+    return {
+        'rows': n_rows,
+        'columns': n_columns,
+        'categorical_ratio': n_categorical / max(features.shape[1], 1),
+        'class_entropy': class_entropy,
+        'skewness': skewness,
+        'missing_ratio': missing_ratio
+    }
+
+
+class MetaFeatureIndex:
+    """
+    k-nearest-neighbour index over dataset meta-feature vectors.
+
+    Vectors are kept in a preallocated NumPy matrix that grows by doubling, so inserts are
+    amortised constant time and a lookup is a single vectorized distance computation.
+    """
+
+    def __init__(self, path=META_FEATURES_PATH, initial_capacity=64):
+        self.path = path
+        self.lock = threading.Lock()
+        self.names = []
+        self.positions = {}
+        self.matrix = np.zeros((initial_capacity, len(META_FEATURE_NAMES)), dtype=np.float64)
+        self.load()
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self):
+        """Loads the persisted vectors, if any."""
+        if not os.path.exists(self.path):
+            return
+        with np.load(self.path) as stored:
+            names = json.loads(str(stored['names']))
+            vectors = stored['vectors']
+        for name, vector in zip(names, vectors):
+            self._insert(name, vector)
+
+    def save(self):
+        """Persists the vectors next to their dataset names."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp.npz'
+        np.savez(tmp_path, names=json.dumps(self.names), vectors=self.matrix[:len(self.names)])
+        os.replace(tmp_path, self.path)
+
+    def _insert(self, name, vector):
+        position = self.positions.get(name)
+        if position is None:
+            position = len(self.names)
+            if position == self.matrix.shape[0]:
+                grown = np.zeros((2 * self.matrix.shape[0], self.matrix.shape[1]), dtype=np.float64)
+                grown[:position] = self.matrix
+                self.matrix = grown
+            self.names.append(name)
+            self.positions[name] = position
+        self.matrix[position] = vector
+
+    def add(self, name, meta_features):
+        """
+        Inserts or replaces the meta-feature vector of a dataset and persists the index.
+
+        Args:
+        - name (str): The dataset identifier.
+        - meta_features (dict): The meta-features as returned by compute_meta_features.
+        """
+        vector = np.array([float(meta_features[key]) for key in META_FEATURE_NAMES], dtype=np.float64)
+        with self.lock:
+            self._insert(name, vector)
+            self.save()
+
+    def get(self, name):
+        """Returns the stored meta-features of a dataset, or None."""
+        position = self.positions.get(name)
+        if position is None:
+            return None
+        return dict(zip(META_FEATURE_NAMES, self.matrix[position].tolist()))
+
+    def nearest(self, name, k=3):
+        """
+        Returns the names of the k datasets whose meta-features are closest to those of the given dataset.
+
+        Args:
+        - name (str): The dataset identifier, it must have been added before.
+        - k (int): The number of neighbours.
+
+        Returns:
+        - list of str: The neighbours ordered by increasing distance, empty if the dataset is unknown.
+        """
+        with self.lock:
+            position = self.positions.get(name)
+            n = len(self.names)
+            if position is None or n < 2 or k < 1:
+                return []
+            vectors = self.matrix[:n].copy()
+            names = list(self.names)
+
+        # Row and column counts span orders of magnitude, compare them on a log scale
+        vectors[:, :2] = np.log1p(vectors[:, :2])
+        std = vectors.std(axis=0)
+        std[std == 0] = 1.0
+        distances = np.linalg.norm((vectors - vectors[position]) / std, axis=1)
+        distances[position] = np.inf
+
+        k = min(k, n - 1)
+        candidates = np.argpartition(distances, k - 1)[:k]
+        return [names[i] for i in candidates[np.argsort(distances[candidates])]]
+
+
+meta_feature_index = MetaFeatureIndex()
@@ -8,6 +8,7 @@ from rdflib.namespace import RDF, RDFS
 import math
 import os
 from utils import save_workflow
+from utils.meta_features import meta_feature_index
 
 # GraphDB REST API
 ## https://graphdb.ontotext.com/documentation/10.1/using-the-graphdb-rest-api.html
@@ -50,6 +51,23 @@ def execute_sparql_query(base_url, repository, query):
         print(f"Failed to execute SPARQL query. Error: {str(e)}")
         raise
 
+def similar_datasets_values(dataset, k=3):
+    """
+    Builds a SPARQL VALUES clause binding ?dataset to the datasets with the most similar meta-features.
+
+    Args:
+    - dataset (str): The dataset identifier.
+    - k (int): The number of similar datasets.
+
+    Returns:
+    - str: The VALUES clause, or None if the dataset has no meta-features or no neighbours.
+    """
+    neighbours = meta_feature_index.nearest(dataset, k)
+    if not neighbours:
+        return None
+    iris = " ".join(f"<http://localhost/8080/intentOntology#{name}>" for name in neighbours)
+    return f"VALUES ?dataset {{ {iris} }}"
+
 def get_intent(user, dataset):
     """
     Retrieves the most used intent associated with a user and dataset.
@@ -111,6 +129,31 @@ def get_intent(user, dataset):
             intent = results["results"]["bindings"][0]["intent"]["value"]
             found = True
     
+    # If still not found, look for the usage of datasets with similar meta-features
+    similar_datasets = None if found else similar_datasets_values(dataset)
+    if similar_datasets:
+        query = f"""
+        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX ml: <http://localhost/8080/intentOntology#>
+
+        SELECT ?intent (COUNT(?intent) AS ?count)
+        WHERE {{
+            {similar_datasets}
+            ?workflow ml:hasInput ?dataset.
+            ?workflow ml:achieves ?task.
+            ?task ml:hasIntent ?intent 
+        }}
+        GROUP BY ?intent
+        ORDER BY DESC(?count)
+        LIMIT 1
+        """
+        
+        results = execute_sparql_query(base_url, repository, query)
+        
+        if results["results"]["bindings"]:
+            intent = results["results"]["bindings"][0]["intent"]["value"]
+            found = True
+    
     # If still not found, look for the most used intent by the user
     if not found:
         query = f"""
@@ -223,6 +266,33 @@ def get_metric(user, dataset, intent):
             metric = results["results"]["bindings"][0]["metric"]["value"]
             found = True
     
+    # If still not found, look for the usage of datasets with similar meta-features
+    similar_datasets = None if found else similar_datasets_values(dataset)
+    if similar_datasets:
+        query = f"""
+        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX ml: <http://localhost/8080/intentOntology#>
+
+        SELECT ?metric (COUNT(?metric) AS ?count)
+        WHERE {{
+            {similar_datasets}
+            ?workflow ml:hasInput ?dataset.
+            ?workflow ml:achieves ?task.
+            ?task ml:hasIntent ml:{intent}.
+            ?task ml:hasRequirement ?eval.
+            ?eval ml:onMetric ?metric 
+        }}
+        GROUP BY ?metric
+        ORDER BY DESC(?count)
+        LIMIT 1
+        """
+        
+        results = execute_sparql_query(base_url, repository, query)
+        
+        if results["results"]["bindings"]:
+            metric = results["results"]["bindings"][0]["metric"]["value"]
+            found = True
+    
     # If still not found, look for the most used metric by the user for the intent
     if not found:
         query = f"""
@@ -529,6 +599,33 @@ def get_algorithm(user, dataset, intent):
             algorithm = results["results"]["bindings"][0]["algorithm"]["value"]
             found = True
     
+    # If still not found, look for the usage of datasets with similar meta-features
+    similar_datasets = None if found else similar_datasets_values(dataset)
+    if similar_datasets:
+        query = f"""
+        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX ml: <http://localhost/8080/intentOntology#>
+
+        SELECT ?algorithm (COUNT(?algorithm) AS ?count)
+        WHERE {{
+            {similar_datasets}
+            ?workflow ml:hasInput ?dataset.
+            ?workflow ml:achieves ?task.
+            ?task ml:hasConstraint ?constraint.
+            ?constraint rdf:type ml:ConstraintAlgorithm.
+            ?constraint ml:on ?algorithm 
+        }}
+        GROUP BY ?algorithm
+        ORDER BY DESC(?count)
+        LIMIT 1
+        """
+        
+        results = execute_sparql_query(base_url, repository, query)
+        
+        if results["results"]["bindings"]:
+            algorithm = results["results"]["bindings"][0]["algorithm"]["value"]
+            found = True
+    
     # If still not found, look for the user's usage of the same intent
     if not found:
         query = f"""
@@ -648,6 +745,33 @@ def get_preprocessing_algorithm(user, dataset, intent):
             algorithm = results["results"]["bindings"][0]["algorithm"]["value"]
             found = True
     
+    # If still not found, look for the usage of datasets with similar meta-features
+    similar_datasets = None if found else similar_datasets_values(dataset)
+    if similar_datasets:
+        query = f"""
+        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX ml: <http://localhost/8080/intentOntology#>
+
+        SELECT ?algorithm (COUNT(?algorithm) AS ?count)
+        WHERE {{
+            {similar_datasets}
+            ?workflow ml:hasInput ?dataset.
+            ?workflow ml:achieves ?task.
+            ?task ml:hasConstraint ?constraint.
+            ?constraint rdf:type ml:ConstraintPreprocessingAlgorithm.
+            ?constraint ml:on ?algorithm 
+        }}
+        GROUP BY ?algorithm
+        ORDER BY DESC(?count)
+        LIMIT 1
+        """
+        
+        results = execute_sparql_query(base_url, repository, query)
+        
+        if results["results"]["bindings"]:
+            algorithm = results["results"]["bindings"][0]["algorithm"]["value"]
+            found = True
+    
     # If still not found, look for the user's usages of the same intent with a preprocessing algorithm
     if not found:
         query = f"""
@@ -26,6 +26,21 @@ def compute_file_hash(file_path):
             sha256.update(byte_block)
     return sha256.hexdigest()
 
+def store_meta_features(dataset_name, workspace_id):
+    """
+    Stores the meta-features of a preprocessed dataset, used to recommend workflows for unseen datasets.
+    They are computed on the preprocessed data, as for every dataset of the knowledge base.
+    """
+    try:
+        preprocessed = requests.get('http://localhost:8003/export_preprocessed', params={'workspace_id': workspace_id})
+        preprocessed.raise_for_status()
+        response = requests.post('http://localhost:8002/add_meta_features',
+                                 data={'dataset': dataset_name.rsplit('.', 1)[0]},
+                                 files={'file': ('preprocessed.csv', preprocessed.content)})
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f'Failed to store meta-features of {dataset_name}: {str(e)}')
+
 
 @main.route('/')
 def index():
@@ -39,7 +54,7 @@ def dashboard():
             
         if step == 'workflow/tpot':
             try:
-                response = requests.get('http://localhost:8003/tpot')
+                response = requests.post('http://localhost:8003/tpot', json={'workspace_id': request.args.get('workspace_id')})
                 response.raise_for_status()
                 return jsonify(response.json()), 200
             except requests.RequestException as e:
@@ -47,7 +62,19 @@ def dashboard():
 
         elif step == 'workflow/hyperopt':
             try:
-                response = requests.get('http://localhost:8003/hyperopt')
+                response = requests.post('http://localhost:8003/hyperopt', json={'workspace_id': request.args.get('workspace_id')})
+                response.raise_for_status()
+                return jsonify(response.json()), 200
+            except requests.RequestException as e:
+                return jsonify({'error': str(e)}), 500
+
+        elif step == 'workflow/job':
+            # Poll the status of a submitted search
+            job_id = request.args.get('job_id')
+            if not job_id:
+                return jsonify({'error': 'No job id provided'}), 400
+            try:
+                response = requests.get(f'http://localhost:8003/jobs/{job_id}')
                 response.raise_for_status()
                 return jsonify(response.json()), 200
             except requests.RequestException as e:
@@ -227,7 +254,10 @@ def dashboard():
                 'hyperparameterValue': data.get('hyperparameterValue'),
                 'algorithm': data.get('algorithm'),
                 'preprocessingAlgorithm': data.get('preprocessingAlgorithm'),
-                'timeLimit': data.get('timeLimit')
+                'timeLimit': data.get('timeLimit'),
+                'timeBudget': data.get('timeBudget'),
+                'rungs': data.get('rungs'),
+                'eta': data.get('eta')
             }
             
             try:
@@ -236,7 +266,9 @@ def dashboard():
                 
                 # Check the response from the other server
                 if response.status_code == 200:
-                    return jsonify({"message": "Workflow data and file sent successfully"}), 200
+                    workspace_id = response.json().get('workspace_id')
+                    store_meta_features(data.get('dataset') or os.path.basename(local_file_path), workspace_id)
+                    return jsonify({"message": "Workflow data and file sent successfully", "workspace_id": workspace_id}), 200
                 else:
                     return jsonify({"message": "Failed to send data to preprocessing server", "error": response.text}), response.status_code
             except requests.RequestException as e: